@@ -1,181 +1,493 @@
 import warnings
 warnings.filterwarnings("ignore", message=".does not have valid feature names.")
 
+import hashlib
 import os
 import re
+import json
+import time
 import traceback
-from urllib.parse import urlparse
+from urllib.parse import quote, urlsplit
 
-import numpy as np
-import requests
-import joblib
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from scipy.sparse import hstack
-from dotenv import load_dotenv
-import openai
 
-# Load environment variables
-load_dotenv()
+import cascade
+import domain_filter
+import fanout
+import fast_inference
+import genai
+from features import extract_features_batch
+import metrics
+import model_bundle
+import scoring_pool
+import upstream
+import verdict_cache
+import vt_queue
+from providers import check_google_safe_browsing
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-VT_API_KEY = os.getenv("VIRUSTOTAL_API_KEY")
-HF_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
-
-# Load model and vectorizer
-model = joblib.load("best_model.pkl")
-vectorizer = joblib.load("vectorizer.pkl")
+# Load and validate the model bundle once; with gunicorn --preload this
+# happens in the master and workers share it after fork
+bundle = model_bundle.load_or_legacy()
+model = bundle.model
+vectorizer = bundle.vectorizer
+print(f"✅ Model bundle {bundle.version} loaded")
 
 THRESHOLD = 0.9
 
+# Small requests score the exported trees directly instead of going through
+# the sklearn wrapper; larger batches stay on the native booster, which has
+# higher throughput once its per-call overhead is amortized.
+FAST_PATH_MAX_ROWS = int(os.getenv("FAST_PATH_MAX_ROWS", 16))
+engine = bundle.engine
+
+# With SCORING_POOL_SOCKET set, scoring_pool.py's processes score the URLs
+# in micro-batches; the bundle loaded here is the fallback if it is down
+# or serves another bundle version
+scoring_client = scoring_pool.from_env(bundle.version)
+
+# With CASCADE=1 the bundle's numeric first stage settles clear-cut URLs;
+# only its uncertain band is vectorized, fully scored and looked up
+cascade_model = cascade.from_env(bundle)
+if cascade_model is not None:
+    print(f"🪜 Cascade on: stage 1 decides scores below {cascade_model.low:.4f} and from {cascade_model.high:.4f}")
+
+# External lookups run concurrently; each gets its own deadline (seconds)
+# measured from the start of the request's fan-out. VirusTotal is not one
+# of them: its scans take too long to wait for, so vt_queue runs them in
+# the background and requests only read the finished verdicts. GenAI is
+# left out too: explainer generates explanations in the background and
+# /analyze/genai delivers them.
+PROVIDERS = {
+    "google_safe_browsing": check_google_safe_browsing,
+}
+PROVIDER_DEADLINES = {
+    "google_safe_browsing": float(os.getenv("GSB_DEADLINE", 3.0)),
+}
+
+# Verdict cache layer for each provider; the ML score is cached as "ml",
+# finished VirusTotal verdicts as "vt" and GenAI explanations as "genai"
+CACHE_LAYERS = {
+    "google_safe_browsing": "gsb",
+}
+
+# ML scores are namespaced by bundle version, so a rollout never serves the old model's scores
+cache = verdict_cache.from_env(namespaces={"ml": bundle.version})
+vt_jobs = vt_queue.VirusTotalQueue(cache)
+explainer = genai.Explainer(cache)
+
+# Browser caching of /analyze verdicts (seconds). A verdict still waiting on
+# VirusTotal, or missing Safe Browsing after a failed lookup, is only kept
+# briefly so the client asks again once the answer may be in.
+VERDICT_MAX_AGE = int(os.getenv("VERDICT_MAX_AGE", 30 * 60))
+PENDING_VERDICT_MAX_AGE = int(os.getenv("PENDING_VERDICT_MAX_AGE", 60))
+
+# /analyze/batch limits: URLs per request, and URLs per predict_proba call
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", 50000))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 1000))
+
 app = Flask(__name__)
 CORS(app)
 
-def extract_features(url):
-    parsed_url = urlparse(url)
-    return [
-        len(url),
-        url.count('.'),
-        url.count('-'),
-        url.count('@'),
-        url.count('?'),
-        url.count('='),
-        int(bool(re.search(r'https?', url))),
-        int(bool(re.search(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', url))),
-        parsed_url.netloc.count('.'),
-        len(parsed_url.netloc)
-    ]
-
-def check_google_safe_browsing(url):
-    api_url = f"https://safebrowsing.googleapis.com/v4/threatMatches:find?key={GOOGLE_API_KEY}"
-    payload = {
-        "client": {"clientId": "your-client-id", "clientVersion": "1.0"},
-        "threatInfo": {
-            "threatTypes": ["MALWARE", "SOCIAL_ENGINEERING"],
-            "platformTypes": ["ANY_PLATFORM"],
-            "threatEntryTypes": ["URL"],
-            "threatEntries": [{"url": url}],
-        },
+def provider_value(result):
+    """Value of a reputation lookup, or None if it failed or missed its deadline."""
+    return result.value if result.status == "ok" else None
+
+def prefilter(urls):
+    """``{url: "allow" | "deny"}`` for the URLs whose domain is on an allow or deny list."""
+    return {url: listed for url in urls if (listed := domain_filter.check(url))}
+
+def listed_verdict(url, listed):
+    """Response body for a URL settled by the domain lists, without scoring or lookups."""
+    threat = listed == "deny"
+    return {
+        "url": str(url),
+        "threat": threat,
+        "malicious_probability": 1.0 if threat else 0.0,
+        "message": "Known malicious domain" if threat else "Known safe domain",
+        "domain_list": listed,
+    }
+
+def score_urls(urls):
+    """Malicious probability for each URL, scored with one ``predict_proba`` call."""
+    t = time.perf_counter()
+    if scoring_client is not None:
+        try:
+            probs = scoring_client.score(urls)
+            metrics.lap("scoring_pool", t)
+            return probs
+        except scoring_pool.PoolError as e:
+            print(f"⚠ {e}; scoring inline")
+            t = time.perf_counter()
+    numeric_features = extract_features_batch(urls)
+    t = metrics.lap("features", t)
+    text_features = vectorizer.transform(urls)
+    t = metrics.lap("vectorize", t)
+    features_combined = fast_inference.combine_features(numeric_features, text_features)
+    scorer = engine if engine is not None and len(urls) <= FAST_PATH_MAX_ROWS else model
+    probs = scorer.predict_proba(features_combined)[:, 1]
+    metrics.lap("predict", t)
+    return probs
+
+def stage_one(urls):
+    """``{url: malicious_prob}`` for the URLs the cascade's first stage decides (none when it is off)."""
+    if cascade_model is None or not urls:
+        return {}
+    t = time.perf_counter()
+    probs, decided = cascade_model.decide(extract_features_batch(urls))
+    metrics.lap("cascade", t)
+    return {url: float(prob) for url, prob, done in zip(urls, probs, decided) if done}
+
+def cascade_verdict(url, malicious_prob, results):
+    """Verdict for a URL decided by the cascade's first stage, which skips the reputation lookups."""
+    return {**verdict(url, malicious_prob, results), "cascade": "numeric"}
+
+def cached_scores(urls):
+    """``{url: malicious_prob}``, scoring only the URLs missing from the cache."""
+    t = time.perf_counter()
+    probs = {url: cache.get("ml", url) for url in urls}
+    missing = [url for url, prob in probs.items() if prob is None]
+    metrics.lap("ml_cache", t)
+    if missing:
+        for url, prob in zip(missing, score_urls(missing)):
+            probs[url] = float(prob)
+            cache.set("ml", url, probs[url])
+    return probs
+
+def explained_score(url):
+    """Score quoted with ``url``'s explanation: the cascade's first stage when it decides, as in /analyze."""
+    decided = stage_one([url])
+    return decided[url] if decided else cached_scores([url])[url]
+
+def split_cached(url, providers):
+    """``(cached, missing)``: cached results for ``url`` and the providers still to call."""
+    cached, missing = {}, {}
+    for name, fn in providers.items():
+        value = cache.get(CACHE_LAYERS[name], url)
+        if value is None:
+            missing[name] = fn
+        else:
+            cached[name] = fanout.ProviderResult(name, "ok", value)
+    return cached, missing
+
+def start_lookups(url, providers):
+    """Fan out the providers with no cached verdict for ``url``."""
+    cached, missing = split_cached(url, providers)
+    return fanout.start(missing, url), cached
+
+def cache_results(url, results):
+    """Cache the successful provider results."""
+    for name, result in results.items():
+        if result.status == "ok":
+            cache.set(CACHE_LAYERS[name], url, result.value)
+
+def virustotal_result(url):
+    """VirusTotal verdict if one has finished; otherwise the URL is queued and the status says why not."""
+    status, value = vt_jobs.status(url)
+    return fanout.ProviderResult("virustotal", "ok" if status == "completed" else status, value)
+
+def genai_result(started, wait=False):
+    """GenAI result from ``explainer.start()``: the explanation if cached (or, with ``wait``,
+    once generated within the time budget), otherwise "pending"."""
+    explanation, generation = started
+    if generation is not None:
+        if not wait:
+            return fanout.ProviderResult("genai", "pending")
+        explanation = generation.wait(explainer.time_budget + 1)
+        if explanation is None:
+            return fanout.ProviderResult("genai", "timeout")
+    return fanout.ProviderResult("genai", "ok", explanation)
+
+def finish_lookups(url, lookups):
+    pending, cached = lookups
+    results = fanout.collect(pending, PROVIDER_DEADLINES)
+    metrics.count_results(results)
+    cache_results(url, results)
+    return {**results, **cached}
+
+def format_genai(genai_output, genai_status, malicious_prob):
+    # Add clarification if high probability
+    if malicious_prob >= THRESHOLD:
+        genai_output = (
+            f"🚨 This URL is classified as malicious with high confidence (≥ 90%).\n\n"
+            + genai_output
+        )
+
+    # Adjust phrasings
+    genai_output = genai_output.replace("appears to be a legitimate", "appears to be not legitimate")
+    genai_output = genai_output.replace("seems to be a legitimate", "seems to be not legitimate")
+    genai_output = genai_output.replace("likely a legitimate", "likely not a legitimate")
+
+    # Clean Hugging Face fallback output
+    if genai_status == "huggingface_fallback":
+        genai_output = re.sub(r"(?i)malicious probability\s*[:=]\s*\d+(\.\d+)?%", "", genai_output).strip()
+        genai_output = re.sub(r"(?i)genai source\s*[:=].*", "", genai_output).strip()
+        genai_output = re.sub(r"(?i)this website is flagged.systems.", "", genai_output).strip()
+
+    return genai_output
+
+def genai_fields(url, malicious_prob, result):
+    """GenAI part of a response body; a pending explanation points at /analyze/genai."""
+    if result.status == "pending":
+        return {
+            "genai_analysis": "",
+            "genai_status": "pending",
+            "genai_source": None,
+            "genai_stream": f"/analyze/genai?url={quote(url, safe='')}",
+        }
+    if result.status != "ok":
+        return {"genai_analysis": "GenAI analysis timed out.", "genai_status": "genai_timeout", "genai_source": None}
+    explanation = result.value
+    return {
+        "genai_analysis": str(format_genai(explanation["text"], explanation["status"], malicious_prob)),
+        "genai_status": explanation["status"],
+        "genai_source": explanation["source"],
+        "genai_truncated": explanation["truncated"],
+    }
+
+def verdict(url, malicious_prob, results):
+    """Build the /analyze response body from the ML score and provider results."""
+    ai_threat = malicious_prob >= THRESHOLD
+    body = {
+        "url": str(url),
+        "threat": bool(ai_threat),
+        "malicious_probability": float(malicious_prob),
+        "message": "Potentially malicious" if ai_threat else "Seems safe",
     }
-    res = requests.post(api_url, json=payload)
-    return res.json() != {}
-
-def check_virustotal(url):
-    headers = {"x-apikey": VT_API_KEY}
-    response = requests.post("https://www.virustotal.com/api/v3/urls", headers=headers, data={"url": url})
-    if response.status_code != 200:
-        return None
-    analysis_id = response.json().get("data", {}).get("id")
-    if not analysis_id:
-        return None
-    report = requests.get(f"https://www.virustotal.com/api/v3/analyses/{analysis_id}", headers=headers)
-    if report.status_code != 200:
-        return None
-    stats = report.json().get("data", {}).get("attributes", {}).get("stats", {})
-    return stats.get("malicious", 0) > 0
+    if "google_safe_browsing" in results:
+        google_threat = provider_value(results["google_safe_browsing"])
+        body["google_safe_browsing"] = bool(google_threat) if google_threat is not None else None
+    if "virustotal" in results:
+        vt = results["virustotal"]
+        vt_threat = provider_value(vt)
+        body["virustotal"] = bool(vt_threat) if vt_threat is not None else None
+        body["virustotal_status"] = "completed" if vt.status == "ok" else vt.status
+    if "genai" in results:
+        body.update(genai_fields(url, malicious_prob, results["genai"]))
+    return body
+
+def analyze_one(url):
+    """The /analyze verdict for one URL."""
+    t = time.perf_counter()
+    listed = domain_filter.check(url)
+    metrics.lap("prefilter", t)
+    if listed:
+        return listed_verdict(url, listed)
+
+    decided = stage_one([url])
+    if decided:
+        return cascade_verdict(url, decided[url], {"genai": genai_result(explainer.start(url))})
+
+    t = time.perf_counter()
+    lookups = start_lookups(url, PROVIDERS)
+    fanout_seconds = time.perf_counter() - t
+    malicious_prob = cached_scores([url])[url]
+    t = time.perf_counter()
+    results = finish_lookups(url, lookups)
+    # Starting and collecting the lookups; scoring overlaps them and is timed separately
+    t = metrics.lap("lookups", t - fanout_seconds)
+    results["virustotal"] = virustotal_result(url)
+    t = metrics.lap("virustotal", t)
+    results["genai"] = genai_result(explainer.start(url))
+    metrics.lap("genai", t)
+    return verdict(url, malicious_prob, results)
+
+def verdict_origin(url):
+    """``scheme://host[:port]`` of ``url``, the key of the extension's verdict cache."""
+    parts = urlsplit(verdict_cache.normalize_url(url))
+    return f"{parts.scheme}://{parts.netloc.rpartition('@')[2]}" if parts.netloc else url
+
+def verdict_etag(body):
+    """ETag over the verdict fields the extension caches per origin.
+
+    The GenAI explanation arrives separately and VirusTotal's queue status
+    changes while the verdict does not, so neither is part of the tag;
+    the URL is reduced to its origin, matching the client's cache key.
+    """
+    fields = {key: value for key, value in body.items()
+              if key != "url" and key != "virustotal_status" and not key.startswith("genai_")}
+    fields["origin"] = verdict_origin(body["url"])
+    return '"' + hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:20] + '"'
+
+def cache_headers(body):
+    """ETag and Cache-Control for an /analyze verdict."""
+    etag = verdict_etag(body)
+    incomplete = body.get("virustotal_status", "completed") != "completed" or (
+        "google_safe_browsing" in body and body["google_safe_browsing"] is None)
+    max_age = PENDING_VERDICT_MAX_AGE if incomplete else VERDICT_MAX_AGE
+    return {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value covers ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def analyze_batch(urls, google_safe_browsing=False, virustotal=False, genai=False):
+    """Score many URLs, yielding one verdict dict per URL in input order.
+
+    URLs are vectorized and scored ``BATCH_CHUNK_SIZE`` at a time, so results
+    for the first chunk are available before later chunks are scored.
+    External lookups are off by default; each enabled one runs through the
+    same fan-out pool and deadlines as /analyze, so lookups that queue past
+    their deadline on a large chunk come back as null. VirusTotal reports
+    finished verdicts and queues the rest, like /analyze. GenAI
+    explanations are waited for, within the GenAI time budget. URLs on the
+    domain allow/deny lists skip all of it, and so do URLs the cascade's
+    first stage decides (GenAI excepted).
+    """
+    providers = {"google_safe_browsing": PROVIDERS["google_safe_browsing"]} if google_safe_browsing else {}
+
+    for offset in range(0, len(urls), BATCH_CHUNK_SIZE):
+        chunk = urls[offset:offset + BATCH_CHUNK_SIZE]
+        unique = list(dict.fromkeys(url for url in chunk if isinstance(url, str) and url))
+        listed = prefilter(unique)
+        unique = [url for url in unique if url not in listed]
+        decided = stage_one(unique)
+        explanations = {url: explainer.start(url) for url in unique} if genai else {}
+        unique = [url for url in unique if url not in decided]
+        lookups = {url: start_lookups(url, providers) for url in unique} if providers else {}
+        probs = cached_scores(unique)
+
+        for url in chunk:
+            if isinstance(url, str) and url in listed:
+                yield listed_verdict(url, listed[url])
+                continue
+            if isinstance(url, str) and url in decided:
+                results = {"genai": genai_result(explanations[url], wait=True)} if genai else {}
+                yield cascade_verdict(url, decided[url], results)
+                continue
+            if not isinstance(url, str) or url not in probs:
+                yield {"url": url, "error": "Invalid URL"}
+                continue
+            results = finish_lookups(url, lookups[url]) if providers else {}
+            if virustotal:
+                results["virustotal"] = virustotal_result(url)
+            if genai:
+                results["genai"] = genai_result(explanations[url], wait=True)
+            yield verdict(url, probs[url], results)
+
+def metrics_text():
+    return metrics.render(bundle.version, cache.stats(), upstream.UPSTREAMS,
+                          {"virustotal_queue": vt_jobs.stats(), "genai": explainer.stats()})
+
+@app.before_request
+def start_timing():
+    metrics.begin()
+
+@app.after_request
+def add_server_timing(response):
+    """Server-Timing header with the request's stage durations (streamed bodies: up to the first byte)."""
+    header = metrics.end(request.url_rule.rule if request.url_rule else "unmatched")
+    if header:
+        response.headers["Server-Timing"] = header
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
 
 @app.route("/")
 def home():
     return "URL Threat Detector API is Live!"
 
-@app.route("/analyze", methods=["POST"])
+@app.route("/analyze", methods=["GET", "POST"])
 def analyze_url():
+    """Verdict for ``url`` (JSON body on POST, query parameter on GET).
+
+    Responses carry an ETag and a Cache-Control max-age, so clients can
+    reuse a verdict and revalidate it; a GET whose If-None-Match still
+    matches gets 304 Not Modified.
+    """
     try:
-        data = request.get_json()
-        url = data.get("url")
+        if request.method == "GET":
+            url = request.args.get("url")
+        else:
+            data = request.get_json()
+            url = data.get("url")
         if not url:
             return jsonify({"error": "No URL provided"}), 400
 
-        numeric_features = np.array([extract_features(url)], dtype=np.float64)
-        text_features = vectorizer.transform([url])
-        features_combined = hstack([numeric_features, text_features])
+        body = analyze_one(url)
+        headers = cache_headers(body)
+        if request.method == "GET" and etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+            return Response(status=304, headers=headers)
+        return jsonify(body), 200, headers
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
-        malicious_prob = model.predict_proba(features_combined)[0][1]
-        ai_threat = malicious_prob >= THRESHOLD
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch_url():
+    """Stream one JSON verdict per line (NDJSON) as each chunk is scored."""
+    data = request.get_json(silent=True) or {}
+    urls = data.get("urls")
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "No URLs provided"}), 400
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({"error": f"Too many URLs (max {MAX_BATCH_URLS})"}), 413
 
-        google_threat = check_google_safe_browsing(url)
-        vt_threat = check_virustotal(url)
+    flags = {name: bool(data.get(name, False)) for name in ("google_safe_browsing", "virustotal", "genai")}
 
-        # Try OpenAI
+    def generate():
         try:
-            ai_response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a cybersecurity assistant."},
-                    {"role": "user", "content": (
-                        f"Analyze this URL: {url}\n\n"
-                        "Please give a detailed threat assessment of the domain and page structure. "
-                        "Check for signs of phishing, malware, fake logins, and suspicious patterns."
-                    )}
-                ]
-            )
-            genai_output = ai_response["choices"][0]["message"]["content"]
-            genai_status = "openai_success"
-
+            for result in analyze_batch(urls, **flags):
+                yield json.dumps(result) + "\n"
         except Exception as e:
-            if "quota" in str(e).lower() or "rate" in str(e).lower():
-                try:
-                    hf_headers = {
-                        "Authorization": f"Bearer {HF_API_KEY}",
-                        "Content-Type": "application/json"
-                    }
-                    hf_prompt = (
-                        f"Analyze the following URL and give a detailed cybersecurity assessment. "
-                        f"Check for phishing, malware, and fake login signs. Explain why it's suspicious if so.\n\nURL: {url}"
-                    )
-                    hf_response = requests.post(
-                        "https://api-inference.huggingface.co/models/google/flan-t5-large",
-                        headers=hf_headers,
-                        json={"inputs": hf_prompt}
-                    )
-                    if hf_response.status_code == 200:
-                        hf_result = hf_response.json()
-                        genai_output = hf_result[0].get("generated_text", "").strip()
-                        genai_status = "huggingface_fallback"
-                    else:
-                        genai_output = "GenAI analysis failed: Hugging Face API error."
-                        genai_status = "huggingface_error"
-                except Exception as hf_error:
-                    genai_output = f"GenAI analysis failed using Hugging Face: {str(hf_error)}"
-                    genai_status = "huggingface_error"
-            else:
-                genai_output = f"GenAI analysis failed: {str(e)}"
-                genai_status = "openai_error"
-
-        # Add clarification if high probability
-        if malicious_prob >= THRESHOLD:
-            genai_output = (
-                f"🚨 This URL is classified as malicious with high confidence (≥ 90%).\n\n"
-                + genai_output
-            )
-
-        # Adjust phrasings
-        genai_output = genai_output.replace("appears to be a legitimate", "appears to be not legitimate")
-        genai_output = genai_output.replace("seems to be a legitimate", "seems to be not legitimate")
-        genai_output = genai_output.replace("likely a legitimate", "likely not a legitimate")
-
-        # Clean Hugging Face fallback output
-        if genai_status == "huggingface_fallback":
-            genai_output = re.sub(r"(?i)malicious probability\s*[:=]\s*\d+(\.\d+)?%", "", genai_output).strip()
-            genai_output = re.sub(r"(?i)genai source\s*[:=].*", "", genai_output).strip()
-            genai_output = re.sub(r"(?i)this website is flagged.systems.", "", genai_output).strip()
-
-        return jsonify({
-            "url": str(url),
-            "threat": bool(ai_threat),
-            "malicious_probability": float(malicious_prob),
-            "message": "Potentially malicious" if ai_threat else "Seems safe",
-            "google_safe_browsing": bool(google_threat) if google_threat is not None else None,
-            "virustotal": bool(vt_threat) if vt_threat is not None else None,
-            "genai_analysis": str(genai_output),
-            "genai_status": genai_status,
-            "genai_source": "OpenAI" if genai_status == "openai_success" else "Hugging Face (Fallback)"
-        })
+            traceback.print_exc()
+            yield json.dumps({"error": f"Internal Server Error: {str(e)}"}) + "\n"
 
-    except Exception as e:
-        traceback.print_exc()
-        return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.route("/analyze/virustotal")
+def virustotal_status():
+    """Poll for the VirusTotal verdict of a URL that /analyze reported as pending."""
+    url = request.args.get("url")
+    if not url:
+        return jsonify({"error": "No URL provided"}), 400
+    return jsonify(vt_jobs.report(url, enqueue=request.args.get("enqueue") != "0"))
+
+def wants_event_stream(args, headers):
+    return args.get("stream") == "1" or "text/event-stream" in headers.get("Accept", "")
+
+@app.route("/analyze/genai")
+def genai_explanation():
+    """GenAI explanation for a URL that /analyze reported as pending.
+
+    Streams server-sent events ("chunk" events with the text as it is
+    generated, then one "done" event with the final fields) when asked for
+    text/event-stream or ``stream=1``; otherwise waits and returns JSON.
+    """
+    url = request.args.get("url")
+    if not url:
+        return jsonify({"error": "No URL provided"}), 400
+    malicious_prob = explained_score(url)
+    started = explainer.start(url)
+    if not wants_event_stream(request.args, request.headers):
+        return jsonify({"url": url, **genai_fields(url, malicious_prob, genai_result(started, wait=True))})
+
+    def events():
+        generation = started[1]
+        if generation is not None:
+            for text in generation.follow(timeout=explainer.time_budget + 1):
+                yield genai.sse("chunk", {"text": text})
+        yield genai.sse("done", {"url": url, **genai_fields(url, malicious_prob, genai_result(started, wait=True))})
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of the stage, upstream, cache and model metrics."""
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/upstream/stats")
+def upstream_stats():
+    return jsonify({**upstream.stats(), "virustotal_queue": vt_jobs.stats(), "genai": explainer.stats()})
 
 
 if __name__ == "_main_":
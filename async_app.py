@@ -0,0 +1,294 @@
+"""asyncio serving mode for the analyze API.
+
+Same routes and the same JSON as app.py, but served by aiohttp. In-flight
+reputation lookups wait on sockets in the event loop instead of each
+holding a sync worker, and every upstream is reached through one pooled
+keep-alive client session per process. Model scoring is CPU-bound, so it
+runs on a small thread pool rather than on the event loop.
+
+    gunicorn async_app:app --worker-class aiohttp.GunicornWebWorker
+
+Scoring, caching and the response format come from app.py, so both
+deployments always give the same answers.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import app as core
+import async_providers
+import domain_filter
+import fanout
+import genai
+import metrics
+import upstream
+
+# Threads running model scoring off the event loop
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", 4))
+
+# VirusTotal comes from app.vt_jobs and GenAI from app.explainer, whose
+# background threads serve both apps
+PROVIDERS = {
+    "google_safe_browsing": async_providers.check_google_safe_browsing,
+}
+
+
+async def call_provider(name, fn, session, url, started):
+    """Run one lookup under its deadline, measured from ``started`` like fanout.collect."""
+    deadline = core.PROVIDER_DEADLINES.get(name, 5.0) - (time.monotonic() - started)
+    try:
+        value = await asyncio.wait_for(fn(session, url), max(deadline, 0))
+        return fanout.ProviderResult(name, "ok", value, elapsed=time.monotonic() - started)
+    except asyncio.TimeoutError:
+        return fanout.ProviderResult(name, "timeout", elapsed=time.monotonic() - started)
+    except Exception as e:
+        return fanout.ProviderResult(name, "error", error=e, elapsed=time.monotonic() - started)
+
+
+async def lookups(session, url, providers):
+    """Cached or freshly fetched results of ``providers`` for ``url``."""
+    cached, missing = core.split_cached(url, providers)
+    started = time.monotonic()
+    fetched = await asyncio.gather(*(call_provider(name, fn, session, url, started)
+                                     for name, fn in missing.items()))
+    results = {result.name: result for result in fetched}
+    metrics.count_results(results)
+    core.cache_results(url, results)
+    return {**results, **cached}
+
+
+async def scores(request, urls):
+    loop = asyncio.get_running_loop()
+    # The request's context goes along, so the scoring stages land in its Server-Timing
+    return await loop.run_in_executor(request.app["scorer"], contextvars.copy_context().run, core.cached_scores, urls)
+
+
+async def genai_result(started, wait=False):
+    """app.genai_result, waiting for the generation off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, core.genai_result, started, wait)
+
+
+async def home(request):
+    return web.Response(text="URL Threat Detector API is Live!", content_type="text/html")
+
+
+async def analyze_one(request, url):
+    """app.analyze_one, with the lookups on the event loop."""
+    t = time.perf_counter()
+    listed = domain_filter.check(url)
+    metrics.lap("prefilter", t)
+    if listed:
+        return core.listed_verdict(url, listed)
+
+    decided = core.stage_one([url])
+    if decided:
+        return core.cascade_verdict(url, decided[url], {"genai": core.genai_result(core.explainer.start(url))})
+
+    pending = asyncio.ensure_future(lookups(request.app["session"], url, PROVIDERS))
+    malicious_prob = (await scores(request, [url]))[url]
+    t = time.perf_counter()
+    results = await pending
+    t = metrics.lap("lookups", t)
+    results["virustotal"] = core.virustotal_result(url)
+    t = metrics.lap("virustotal", t)
+    results["genai"] = core.genai_result(core.explainer.start(url))
+    metrics.lap("genai", t)
+    return core.verdict(url, malicious_prob, results)
+
+
+async def analyze_url(request):
+    """POST a JSON body or GET ?url=, with app.analyze_url's ETag and Cache-Control."""
+    try:
+        if request.method == "GET":
+            url = request.query.get("url")
+        else:
+            data = await request.json()
+            url = data.get("url")
+        if not url:
+            return web.json_response({"error": "No URL provided"}, status=400)
+
+        body = await analyze_one(request, url)
+        headers = core.cache_headers(body)
+        if request.method == "GET" and core.etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+            return web.Response(status=304, headers=headers)
+        return web.json_response(body, headers=headers)
+
+    except Exception as e:
+        traceback.print_exc()
+        return web.json_response({"error": f"Internal Server Error: {str(e)}"}, status=500)
+
+
+async def analyze_batch_url(request):
+    """Stream one JSON verdict per line (NDJSON) as each chunk is scored."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    data = data if isinstance(data, dict) else {}
+    urls = data.get("urls")
+    if not isinstance(urls, list) or not urls:
+        return web.json_response({"error": "No URLs provided"}, status=400)
+    if len(urls) > core.MAX_BATCH_URLS:
+        return web.json_response({"error": f"Too many URLs (max {core.MAX_BATCH_URLS})"}, status=413)
+
+    providers = {name: fn for name, fn in PROVIDERS.items() if data.get(name, False)}
+    explain = bool(data.get("genai", False))
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        for offset in range(0, len(urls), core.BATCH_CHUNK_SIZE):
+            chunk = urls[offset:offset + core.BATCH_CHUNK_SIZE]
+            unique = list(dict.fromkeys(url for url in chunk if isinstance(url, str) and url))
+            listed = core.prefilter(unique)
+            unique = [url for url in unique if url not in listed]
+            decided = core.stage_one(unique)
+            explanations = {url: core.explainer.start(url) for url in unique} if explain else {}
+            unique = [url for url in unique if url not in decided]
+            pending = {url: asyncio.ensure_future(lookups(request.app["session"], url, providers))
+                       for url in unique} if providers else {}
+            probs = await scores(request, unique)
+
+            lines = []
+            for url in chunk:
+                if isinstance(url, str) and url in listed:
+                    lines.append(core.listed_verdict(url, listed[url]))
+                    continue
+                if isinstance(url, str) and url in decided:
+                    results = {"genai": await genai_result(explanations[url], wait=True)} if explain else {}
+                    lines.append(core.cascade_verdict(url, decided[url], results))
+                    continue
+                if not isinstance(url, str) or url not in probs:
+                    lines.append({"url": url, "error": "Invalid URL"})
+                    continue
+                results = await pending[url] if providers else {}
+                if data.get("virustotal", False):
+                    results["virustotal"] = core.virustotal_result(url)
+                if explain:
+                    results["genai"] = await genai_result(explanations[url], wait=True)
+                lines.append(core.verdict(url, probs[url], results))
+            await response.write("".join(json.dumps(line) + "\n" for line in lines).encode())
+    except Exception as e:
+        traceback.print_exc()
+        await response.write((json.dumps({"error": f"Internal Server Error: {str(e)}"}) + "\n").encode())
+    await response.write_eof()
+    return response
+
+
+async def virustotal_status(request):
+    url = request.query.get("url")
+    if not url:
+        return web.json_response({"error": "No URL provided"}, status=400)
+    return web.json_response(core.vt_jobs.report(url, enqueue=request.query.get("enqueue") != "0"))
+
+
+async def genai_explanation(request):
+    """Server-sent events or JSON, like app.genai_explanation."""
+    url = request.query.get("url")
+    if not url:
+        return web.json_response({"error": "No URL provided"}, status=400)
+    decided = core.stage_one([url])
+    malicious_prob = decided[url] if decided else (await scores(request, [url]))[url]
+    started = core.explainer.start(url)
+    if not core.wants_event_stream(request.query, request.headers):
+        result = await genai_result(started, wait=True)
+        return web.json_response({"url": url, **core.genai_fields(url, malicious_prob, result)})
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    generation = started[1]
+    if generation is not None:
+        loop = asyncio.get_running_loop()
+        position = 0
+        while True:
+            chunks, finished = await loop.run_in_executor(None, generation.read, position,
+                                                          core.explainer.time_budget + 1)
+            if not chunks and finished is None:
+                break
+            position += len(chunks)
+            await response.write("".join(genai.sse("chunk", {"text": text}) for text in chunks).encode())
+            if finished is not None and position == len(generation.chunks):
+                break
+    result = await genai_result(started, wait=True)
+    await response.write(genai.sse("done", {"url": url, **core.genai_fields(url, malicious_prob, result)}).encode())
+    await response.write_eof()
+    return response
+
+
+async def cache_stats(request):
+    return web.json_response(core.cache.stats())
+
+
+async def metrics_endpoint(request):
+    if not metrics.ENABLED:
+        return web.json_response({"error": "Metrics are disabled"}, status=404)
+    return web.Response(body=core.metrics_text().encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def upstream_stats(request):
+    return web.json_response({**upstream.stats(), "virustotal_queue": core.vt_jobs.stats(),
+                              "genai": core.explainer.stats()})
+
+
+@web.middleware
+async def cors_preflight(request, handler):
+    if request.method == "OPTIONS" and "Access-Control-Request-Method" in request.headers:
+        return web.Response(headers={
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": request.headers.get("Access-Control-Request-Headers", "*"),
+        })
+    return await handler(request)
+
+
+@web.middleware
+async def server_timing(request, handler):
+    """Time the request like app.add_server_timing; streamed responses have sent their headers already."""
+    metrics.begin()
+    response = await handler(request)
+    resource = request.match_info.route.resource
+    header = metrics.end(resource.canonical if resource is not None else "unmatched")
+    if header and not response.prepared:
+        response.headers["Server-Timing"] = header
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
+async def allow_any_origin(request, response):
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+
+async def upstream_clients(app):
+    """One pooled HTTP session and scoring pool for the lifetime of the worker."""
+    app["session"] = async_providers.make_session()
+    app["scorer"] = ThreadPoolExecutor(max_workers=SCORE_WORKERS)
+    yield
+    await app["session"].close()
+    app["scorer"].shutdown(wait=False)
+
+
+def create_app():
+    app = web.Application(middlewares=[cors_preflight, server_timing])
+    app.cleanup_ctx.append(upstream_clients)
+    app.on_response_prepare.append(allow_any_origin)
+    app.router.add_get("/", home)
+    app.router.add_get("/analyze", analyze_url)
+    app.router.add_post("/analyze", analyze_url)
+    app.router.add_post("/analyze/batch", analyze_batch_url)
+    app.router.add_get("/analyze/virustotal", virustotal_status)
+    app.router.add_get("/analyze/genai", genai_explanation)
+    app.router.add_get("/cache/stats", cache_stats)
+    app.router.add_get("/upstream/stats", upstream_stats)
+    app.router.add_get("/metrics", metrics_endpoint)
+    return app
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    web.run_app(app, port=int(os.environ.get("PORT", 5000)))
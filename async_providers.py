@@ -0,0 +1,35 @@
+"""asyncio versions of the reputation lookups in providers.py.
+
+Same requests, same return values, but made on a shared ``aiohttp``
+session so an in-flight lookup costs a coroutine rather than a thread,
+and connections to each upstream are kept alive and reused.
+"""
+import aiohttp
+
+import local_safe_browsing
+
+from providers import GOOGLE_API_KEY, GSB_API_URL, safe_browsing_payload
+from upstream import POOL_SIZE, UPSTREAMS
+
+
+def make_session():
+    """Pooled keep-alive client session; create it inside the running event loop."""
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=POOL_SIZE, ttl_dns_cache=300, keepalive_timeout=30)
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def check_google_safe_browsing(session, url):
+    store = local_safe_browsing.store()
+    if store is not None:
+        hits = store.lookup(url)
+        if not hits:
+            return False
+        res = await UPSTREAMS["google_safe_browsing"].arequest(
+            session, "POST", f"{local_safe_browsing.FULL_HASHES_URL}?key={GOOGLE_API_KEY}",
+            json=local_safe_browsing.full_hashes_payload(hits, store.client_states()))
+        return local_safe_browsing.confirmed(hits, await res.json(content_type=None))
+
+    res = await UPSTREAMS["google_safe_browsing"].arequest(
+        session, "POST", f"{GSB_API_URL}?key={GOOGLE_API_KEY}", json=safe_browsing_payload(url))
+    return await res.json(content_type=None) != {}
+
@@ -1,78 +1,130 @@
+const API_BASE = "https://threats-analysis.onrender.com";
+
+// 🗄️ Client-side verdict cache, one entry per origin: SPA route changes,
+// reloads and redirects within a site reuse its verdict instead of asking
+// the backend again. An in-memory LRU sits in front of chrome.storage, which
+// keeps entries across service worker restarts. The server's Cache-Control
+// max-age decides how long a verdict stays fresh; an expired entry is
+// revalidated with its ETag.
+const DEFAULT_VERDICT_TTL_MS = 30 * 60 * 1000;
+const MEMORY_CACHE_SIZE = 500;
+const STORAGE_CACHE_SIZE = 5000;
+const STORAGE_PREFIX = "verdict:";
+// Navigation events for a tab within this window collapse into one check
+const DEBOUNCE_MS = 300;
+
+const memoryCache = new Map();   // origin -> { data, etag, expires }, least recently used first
+const inFlight = new Map();      // origin -> Promise of the verdict being fetched
+const debounceTimers = new Map(); // tabId -> timeout id
+
 chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
   if (changeInfo.url) {
     const url = changeInfo.url;
     console.log("🔄 URL changed:", url);
 
+    clearTimeout(debounceTimers.get(tabId));
     if (isGoogleSearch(url)) {
+      debounceTimers.delete(tabId);
       markAsSafe(tabId, url, "Google Search is always safe.");
       return;
     }
+    debounceTimers.set(tabId, setTimeout(() => {
+      debounceTimers.delete(tabId);
+      handleNavigation(tabId, url);
+    }, DEBOUNCE_MS));
+  }
+});
 
-    checkUrlSafety(url).then((data) => {
-      if (data.error) {
-        console.error("⚠ Threat detection failed:", data.error);
-        return;
-      }
+chrome.tabs.onRemoved.addListener((tabId) => {
+  clearTimeout(debounceTimers.get(tabId));
+  debounceTimers.delete(tabId);
+});
 
-      const probability = typeof data.malicious_probability === "number" ? data.malicious_probability : 0;
-      const isDatasetThreat = data.dataset === true;
-      const isThreat = isDatasetThreat || data.threat === true || probability > 50;
+chrome.runtime.onStartup.addListener(pruneStoredVerdicts);
+chrome.runtime.onInstalled.addListener(pruneStoredVerdicts);
 
-      let genaiText = data.genai_analysis || "";
+function handleNavigation(tabId, url) {
+  checkUrlSafety(url).then((data) => {
+    if (data.error) {
+      console.error("⚠ Threat detection failed:", data.error);
+      return;
+    }
 
-      // 🧠 Fix vague or contradictory GenAI outputs
-      if (genaiText.toLowerCase().includes("false") && probability >= 0.9) {
-        genaiText = "⚠ Likely malicious (based on ML and API results)";
-      }
+    const probability = typeof data.malicious_probability === "number" ? data.malicious_probability : 0;
+    const isDatasetThreat = data.dataset === true;
+    const isThreat = isDatasetThreat || data.threat === true || probability > 50;
 
-      const weakGenAI = genaiText.toLowerCase().includes("appears to be a legitimate") ||
-                        genaiText.toLowerCase().includes("always be cautious") ||
-                        genaiText.length < 100;
+    const genaiPending = data.genai_status === "pending";
+    const genaiText = genaiPending ? "" : adjustGenaiText(data.genai_analysis || "", probability);
 
-      if (probability >= 0.95 && weakGenAI) {
-        genaiText =
-          "⚠ This website is flagged as malicious by our systems.\n\n" +
-          "GenAI was unable to provide a reliable analysis, but our ML and API responses strongly indicate this site is unsafe.\n\n" +
-          "Malicious Probability: " + probability.toFixed(2) + "%";
-      }
+    // 🧠 Logging
+    console.log("🔍 Checked URL:", url);
+    console.log("📌 Threat in dataset?", isDatasetThreat);
+    console.log("🚨 Threat?", isThreat);
+    console.log("📊 Malicious Probability:", probability + "%");
+    if (genaiText) console.log("🧠 GenAI Analysis:", genaiText);
 
-      // 🧠 Logging
-      console.log("🔍 Checked URL:", url);
-      console.log("📌 Threat in dataset?", isDatasetThreat);
-      console.log("🚨 Threat?", isThreat);
-      console.log("📊 Malicious Probability:", probability + "%");
-      if (genaiText) console.log("🧠 GenAI Analysis:", genaiText);
+    // 🔔 UI + Icon updates
+    if (!isThreat) {
+      markAsSafe(tabId, url, data.message || "No known threats detected.");
+    } else {
+      markAsThreat(tabId, url);
+    }
 
-      // 🔔 UI + Icon updates
-      if (!isThreat) {
-        markAsSafe(tabId, url, data.message || "No known threats detected.");
+    // 💾 Save threat data to local storage
+    chrome.storage.local.set({
+      threatData: {
+        url: url,
+        message: data.message || "",
+        malicious_probability: probability,
+        threat: isThreat,
+        dataset: isDatasetThreat,
+        genai_analysis: genaiText,
+      },
+    }, () => {
+      if (chrome.runtime.lastError) {
+        console.error("❌ Error saving to storage:", chrome.runtime.lastError);
       } else {
-        markAsThreat(tabId, url);
+        console.log("✅ Threat data saved.");
       }
+    });
 
-      // 💾 Save threat data to local storage
-      chrome.storage.local.set({
-        threatData: {
-          url: data.url || url,
-          message: data.message || "",
-          malicious_probability: probability,
-          threat: isThreat,
-          dataset: isDatasetThreat,
-          genai_analysis: genaiText,
-        },
-      }, () => {
-        if (chrome.runtime.lastError) {
-          console.error("❌ Error saving to storage:", chrome.runtime.lastError);
-        } else {
-          console.log("✅ Threat data saved.");
-        }
+    // 🧠 The verdict does not wait for GenAI; add the explanation once it is ready
+    if (genaiPending && isThreat) {
+      fetchGenaiAnalysis(url).then((genai) => {
+        if (!genai || genai.error) return;
+        chrome.storage.local.get("threatData", ({ threatData }) => {
+          if (!threatData || threatData.url !== url) return;
+          threatData.genai_analysis = adjustGenaiText(genai.genai_analysis || "", probability);
+          chrome.storage.local.set({ threatData });
+          console.log("🧠 GenAI Analysis:", threatData.genai_analysis);
+        });
       });
+    }
 
-    }).catch((error) => {
-      console.error("❌ Error in threat detection:", error);
-    });
+  }).catch((error) => {
+    console.error("❌ Error in threat detection:", error);
+  });
+}
+
+function adjustGenaiText(genaiText, probability) {
+  // 🧠 Fix vague or contradictory GenAI outputs
+  if (genaiText.toLowerCase().includes("false") && probability >= 0.9) {
+    genaiText = "⚠ Likely malicious (based on ML and API results)";
   }
-});
+
+  const weakGenAI = genaiText.toLowerCase().includes("appears to be a legitimate") ||
+                    genaiText.toLowerCase().includes("always be cautious") ||
+                    genaiText.length < 100;
+
+  if (probability >= 0.95 && weakGenAI) {
+    genaiText =
+      "⚠ This website is flagged as malicious by our systems.\n\n" +
+      "GenAI was unable to provide a reliable analysis, but our ML and API responses strongly indicate this site is unsafe.\n\n" +
+      "Malicious Probability: " + probability.toFixed(2) + "%";
+  }
+  return genaiText;
+}
 
 function isGoogleSearch(url) {
   return url.startsWith("https://www.google.com/search?");
@@ -133,19 +185,60 @@ function markAsThreat(tabId, url) {
 }
 
 async function checkUrlSafety(url) {
-  const apiUrl = "https://threats-analysis.onrender.com/analyze";
+  const origin = originOf(url);
+  if (!origin) return (await fetchVerdict(url)).data;
+
+  const cached = memoryGet(origin);
+  if (cached && cached.expires > Date.now()) {
+    console.log("🗄️ Cached verdict for", origin);
+    return cached.data;
+  }
+  // Tabs opening the same site at once share one backend request
+  if (inFlight.has(origin)) return inFlight.get(origin);
+  const lookup = lookupOrigin(origin, url).finally(() => inFlight.delete(origin));
+  inFlight.set(origin, lookup);
+  return lookup;
+}
+
+async function lookupOrigin(origin, url) {
+  const stored = memoryGet(origin) || await storageGet(origin);
+  if (stored && stored.expires > Date.now()) {
+    memorySet(origin, stored);
+    return stored.data;
+  }
+
+  const result = await fetchVerdict(url, stored && stored.etag);
+  if (result.notModified && stored) {
+    console.log("🗄️ Verdict still valid for", origin);
+    cacheVerdict(origin, { ...stored, expires: Date.now() + result.maxAgeMs });
+    return stored.data;
+  }
+  if (!result.data.error) {
+    cacheVerdict(origin, { data: result.data, etag: result.etag, expires: Date.now() + result.maxAgeMs });
+  }
+  return result.data;
+}
+
+async function fetchVerdict(url, etag) {
+  const apiUrl = API_BASE + "/analyze?url=" + encodeURIComponent(url);
 
   try {
+    // The verdict cache above does the caching, so skip the HTTP cache
     const response = await fetch(apiUrl, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ url: url }),
+      headers: etag ? { "If-None-Match": etag } : {},
+      cache: "no-store",
     });
+    const maxAge = /max-age=(\d+)/.exec(response.headers.get("Cache-Control") || "");
+    const maxAgeMs = maxAge ? Number(maxAge[1]) * 1000 : DEFAULT_VERDICT_TTL_MS;
+
+    if (response.status === 304) {
+      return { notModified: true, maxAgeMs };
+    }
 
     if (!response.ok) {
       const errorMsg = `API error (${response.status}): ${response.statusText}`;
       console.error("⚠", errorMsg);
-      return { error: errorMsg };
+      return { data: { error: errorMsg } };
     }
 
     const data = await response.json();
@@ -155,17 +248,96 @@ async function checkUrlSafety(url) {
     if (!("malicious_probability" in data) && !("threat" in data) && !("dataset" in data)) {
       console.warn("⚠ API response missing fields. Marking as safe.");
       return {
-        url: url,
-        malicious_probability: 0,
-        threat: false,
-        dataset: false,
-        message: "No threat found by default",
+        data: {
+          url: url,
+          malicious_probability: 0,
+          threat: false,
+          dataset: false,
+          message: "No threat found by default",
+        },
+        maxAgeMs: DEFAULT_VERDICT_TTL_MS,
       };
     }
 
-    return data;
+    return { data, etag: response.headers.get("ETag"), maxAgeMs };
   } catch (error) {
     console.error("❌ API fetch failed:", error);
-    return { error: "Error connecting to the API" };
+    return { data: { error: "Error connecting to the API" } };
+  }
+}
+
+function originOf(url) {
+  try {
+    const parsed = new URL(url);
+    return parsed.protocol === "http:" || parsed.protocol === "https:" ? parsed.origin : null;
+  } catch (error) {
+    return null;
+  }
+}
+
+function memoryGet(origin) {
+  const entry = memoryCache.get(origin);
+  if (entry) {
+    // Re-insert to mark it most recently used
+    memoryCache.delete(origin);
+    memoryCache.set(origin, entry);
+  }
+  return entry;
+}
+
+function memorySet(origin, entry) {
+  memoryCache.delete(origin);
+  memoryCache.set(origin, entry);
+  if (memoryCache.size > MEMORY_CACHE_SIZE) {
+    memoryCache.delete(memoryCache.keys().next().value);
+  }
+}
+
+function storageGet(origin) {
+  const key = STORAGE_PREFIX + origin;
+  return new Promise((resolve) => {
+    chrome.storage.local.get(key, (items) => resolve(items[key] || null));
+  });
+}
+
+let writesSincePrune = 0;
+
+function cacheVerdict(origin, entry) {
+  memorySet(origin, entry);
+  chrome.storage.local.set({ [STORAGE_PREFIX + origin]: entry });
+  if (++writesSincePrune >= 100) pruneStoredVerdicts();
+}
+
+function pruneStoredVerdicts() {
+  writesSincePrune = 0;
+  chrome.storage.local.get(null, (items) => {
+    // Entries expired for over a day are dropped; past that, the oldest go first
+    const cutoff = Date.now() - 24 * 60 * 60 * 1000;
+    const entries = Object.entries(items)
+      .filter(([key]) => key.startsWith(STORAGE_PREFIX))
+      .sort(([, a], [, b]) => b.expires - a.expires);
+    const stale = entries
+      .filter(([, entry], index) => index >= STORAGE_CACHE_SIZE || entry.expires < cutoff)
+      .map(([key]) => key);
+    if (stale.length) {
+      chrome.storage.local.remove(stale);
+      console.log(`🧹 Removed ${stale.length} cached verdicts.`);
+    }
+  });
+}
+
+async function fetchGenaiAnalysis(url) {
+  const apiUrl = API_BASE + "/analyze/genai?url=" + encodeURIComponent(url);
+
+  try {
+    const response = await fetch(apiUrl);
+    if (!response.ok) {
+      console.error("⚠", `GenAI API error (${response.status}): ${response.statusText}`);
+      return null;
+    }
+    return await response.json();
+  } catch (error) {
+    console.error("❌ GenAI fetch failed:", error);
+    return null;
   }
 }
@@ -0,0 +1,286 @@
+"""Offline benchmark suite for the detector, written as JSON to compare commits.
+
+    python benchmark.py --out bench.json
+    python benchmark.py --out new.json --compare bench.json
+
+Every suite runs on the same seeded synthetic corpus (synthetic_urls.py),
+in this process, with no network access:
+
+- features: extract_features_batch
+- vectorize: the bundle's vectorizer
+- score: combine_features + predict_proba, one row at a time (the /analyze
+  fast path) and in batches of 1000
+- analyze: POST /analyze through the Flask test client, every upstream
+  answered by loadtest.py's stubs after a fixed delay; cold (new URLs) and
+  cached (repeated URLs)
+- batch: POST /analyze/batch with ML scoring only
+- train: feature cache build and one tournament candidate fit
+
+Timed sections run --repeats times after a warm-up, and the JSON keeps the
+median and every run. ``--compare`` prints the change against an older
+report and marks regressions beyond --tolerance. Throughput keys end in
+``_per_s`` (higher is better) and latency keys in ``_ms`` (lower is better).
+Run it from a directory holding the model bundle (or legacy pickles).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+from synthetic_urls import generate_urls, write_csv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUITES = ("features", "vectorize", "score", "analyze", "batch", "train")
+
+
+def timed(fn, repeats):
+    """Seconds per call of ``fn`` over ``repeats`` runs, after one warm-up call."""
+    fn()
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def throughput(name, items, runs):
+    """``{name}_per_s`` from the median run, plus every run's rate."""
+    return {f"{name}_per_s": items / statistics.median(runs), "runs_per_s": [items / s for s in runs]}
+
+
+def latencies(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            "mean_ms": float(ms.mean()), "requests_per_s": len(ms) / (ms.sum() / 1000)}
+
+
+def bench_features(urls, repeats):
+    from features import extract_features_batch
+    return throughput("urls", len(urls), timed(lambda: extract_features_batch(urls), repeats))
+
+
+def bench_vectorize(urls, repeats, bundle):
+    return throughput("urls", len(urls), timed(lambda: bundle.vectorizer.transform(urls), repeats))
+
+
+def bench_score(urls, repeats, bundle, rows=2000, batch=1000):
+    import fast_inference
+    from features import extract_features_batch
+
+    numeric, tfidf = extract_features_batch(urls), bundle.vectorizer.transform(urls)
+    single = bundle.engine if bundle.engine is not None else bundle.model
+    singles = []
+    for i in range(min(rows, len(urls))):
+        started = time.perf_counter()
+        single.predict_proba(fast_inference.combine_features(numeric[i:i + 1], tfidf[i]))
+        singles.append(time.perf_counter() - started)
+
+    def batches():
+        for start in range(0, len(urls), batch):
+            features = fast_inference.combine_features(numeric[start:start + batch], tfidf[start:start + batch])
+            bundle.model.predict_proba(features)
+
+    return {"single_row": latencies(singles), "batch": throughput("urls", len(urls), timed(batches, repeats)),
+            "batch_size": batch}
+
+
+def start_stubs(port, gsb_ms, vt_ms, openai_ms):
+    """loadtest.py's upstream stubs in a child process; points providers.py at them."""
+    import loadtest
+    stub = multiprocessing.Process(target=loadtest.run_stub, args=(port, gsb_ms, vt_ms, openai_ms), daemon=True)
+    stub.start()
+    base = f"http://127.0.0.1:{port}"
+    os.environ.update(GSB_API_URL=f"{base}/gsb", VT_API_URL=f"{base}/vt", OPENAI_API_BASE=f"{base}/openai",
+                      OPENAI_API_KEY="stub", GOOGLE_API_KEY="stub", VIRUSTOTAL_API_KEY="stub")
+    started = time.monotonic()
+    while time.monotonic() - started < 30:
+        try:
+            requests.post(f"{base}/gsb", json={}, timeout=1)
+            return stub
+        except requests.RequestException:
+            time.sleep(0.1)
+    stub.terminate()
+    raise RuntimeError(f"upstream stubs did not come up on port {port}")
+
+
+def bench_analyze(urls, requests_count, client):
+    """Latency of /analyze for new URLs, then for the same URLs again (verdict cache hits)."""
+    def run(batch):
+        seconds = []
+        for url in batch:
+            started = time.perf_counter()
+            response = client.post("/analyze", json={"url": url})
+            seconds.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"/analyze answered {response.status_code}: {response.get_data(as_text=True)}")
+        return seconds
+
+    batch = urls[:requests_count]
+    run(urls[-20:])
+    return {"cold": latencies(run(batch)), "cached": latencies(run(batch))}
+
+
+def bench_batch(urls, repeats, client, app):
+    def run():
+        app.cache.clear()
+        response = client.post("/analyze/batch", json={"urls": urls})
+        lines = response.get_data(as_text=True).count("\n")
+        if lines != len(urls):
+            raise RuntimeError(f"/analyze/batch returned {lines} lines for {len(urls)} URLs")
+    return throughput("urls", len(urls), timed(run, repeats))
+
+
+def bench_train(rows, seed, candidate):
+    import feature_cache
+    import tournament
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "corpus.csv")
+        write_csv(csv_path, rows, seed=seed)
+        started = time.perf_counter()
+        cache_path, labels, _, feature_names = feature_cache.load_or_build(csv_path, os.path.join(tmp, "cache"))
+        build_seconds = time.perf_counter() - started
+
+        library, params = tournament.CANDIDATES[candidate]
+        X = feature_cache.load_matrix(cache_path)
+        started = time.perf_counter()
+        tournament.fit(tournament.make_model(library, params, os.cpu_count() or 1), library, X, labels, feature_names)
+        fit_seconds = time.perf_counter() - started
+    return {"rows": rows, "candidate": candidate, "feature_build_rows_per_s": rows / build_seconds,
+            "fit_rows_per_s": rows / fit_seconds, "feature_build_seconds": build_seconds, "fit_seconds": fit_seconds}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Run the selected suites and return the report dict."""
+    urls, _ = generate_urls(args.urls, seed=args.seed)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "results": {},
+    }
+    results = report["results"]
+    suites = args.suites or SUITES
+
+    if "features" in suites:
+        results["features"] = bench_features(urls, args.repeats)
+        print(f"🔧 features: {results['features']['urls_per_s']:,.0f} URLs/s")
+
+    if {"vectorize", "score"} & set(suites):
+        import model_bundle
+        bundle = model_bundle.load_or_legacy()
+        report["model_version"] = bundle.version
+        if "vectorize" in suites:
+            results["vectorize"] = bench_vectorize(urls, args.repeats, bundle)
+            print(f"📊 vectorize: {results['vectorize']['urls_per_s']:,.0f} URLs/s")
+        if "score" in suites:
+            results["score"] = bench_score(urls, args.repeats, bundle)
+            print(f"🧠 score: single row p50 {results['score']['single_row']['p50_ms']:.3f} ms, "
+                  f"batches {results['score']['batch']['urls_per_s']:,.0f} URLs/s")
+
+    if {"analyze", "batch"} & set(suites):
+        stub = start_stubs(args.stub_port, args.gsb_ms, args.vt_ms, args.openai_ms)
+        try:
+            # Imported only now, so providers.py reads the stub addresses
+            import app
+            client = app.app.test_client()
+            if "analyze" in suites:
+                results["analyze"] = bench_analyze(urls, args.requests, client)
+                results["analyze"]["upstream_ms"] = {"gsb": args.gsb_ms, "vt": args.vt_ms, "openai": args.openai_ms}
+                print(f"🌐 analyze: cold p50 {results['analyze']['cold']['p50_ms']:.1f} ms "
+                      f"p99 {results['analyze']['cold']['p99_ms']:.1f} ms, "
+                      f"cached p50 {results['analyze']['cached']['p50_ms']:.2f} ms")
+            if "batch" in suites:
+                results["batch"] = bench_batch(urls, args.repeats, client, app)
+                print(f"📦 batch: {results['batch']['urls_per_s']:,.0f} URLs/s")
+        finally:
+            stub.terminate()
+
+    if "train" in suites:
+        results["train"] = bench_train(args.train_rows, args.seed, args.candidate)
+        print(f"🏋️ train: features {results['train']['feature_build_rows_per_s']:,.0f} rows/s, "
+              f"{args.candidate} fit {results['train']['fit_rows_per_s']:,.0f} rows/s")
+    return report
+
+
+def flatten(results, prefix=""):
+    """``{"suite.key": number}`` for every throughput and latency figure."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and (key.endswith("_per_s") or key.endswith("_ms")):
+            flat[name] = value
+    return flat
+
+
+def compare(report, baseline, tolerance):
+    """``[(metric, old, new, change, regressed)]`` for the metrics both reports have."""
+    old, new = flatten(baseline["results"]), flatten(report["results"])
+    rows = []
+    for metric in sorted(old.keys() & new.keys()):
+        if not old[metric]:
+            continue
+        change = new[metric] / old[metric] - 1
+        # Latencies regress when they grow, throughputs when they shrink
+        worse = change if metric.endswith("_ms") else -change
+        rows.append((metric, old[metric], new[metric], change, worse > tolerance))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the detector, written as JSON.")
+    parser.add_argument("--out", default="benchmark.json", help="Where to write the JSON report")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, help="Suites to run (default: all)")
+    parser.add_argument("--urls", type=int, default=50_000, help="Synthetic URLs for the throughput suites")
+    parser.add_argument("--requests", type=int, default=500, help="/analyze requests per pass")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per throughput figure")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    parser.add_argument("--candidate", default="xgb_default", help="Tournament candidate timed by the train suite")
+    parser.add_argument("--stub-port", type=int, default=8099)
+    parser.add_argument("--gsb-ms", type=float, default=20)
+    parser.add_argument("--vt-ms", type=float, default=20)
+    parser.add_argument("--openai-ms", type=float, default=200)
+    parser.add_argument("--compare", metavar="BASELINE", help="Older report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"💾 Report written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.tolerance)
+        print(f"\n📈 Against {args.compare} (commit {(baseline.get('commit') or 'unknown')[:10]})")
+        for metric, old, new, change, regressed in rows:
+            print(f"{'❌' if regressed else '  '} {metric:<40} {old:>14,.3f} {new:>14,.3f} {change:>+8.1%}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
@@ -0,0 +1,122 @@
+"""Build the domain allow/deny index read by domain_filter.py.
+
+    python build_domain_index.py --allow tranco.csv --deny hosts.txt blocklist.txt
+
+Each list file holds one domain per line. Hosts-file lines
+("0.0.0.0 example.com") and ranked CSV lines ("1,example.com") work too.
+Allow entries that are public or shared-hosting suffixes (github.io,
+blogspot.com, ...; see domain_filter.SHARED_SUFFIXES and
+PUBLIC_SUFFIX_LIST) are dropped with a warning: they would vouch for
+every tenant's site.
+Only the lists that are given are rebuilt, and workers pick up the new
+arrays without a restart.
+
+    python build_domain_index.py --benchmark 1000000
+
+builds a synthetic index of that many entries in a temporary directory and
+reports lookups/sec and memory per million entries.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import domain_filter
+
+TLDS = ["com", "net", "org", "io", "co.uk", "de", "ru", "xyz", "info", "com.br"]
+
+
+def read_domains(paths):
+    domains = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            domains.extend(d for d in map(domain_filter.normalize_entry, f) if d)
+    return domains
+
+
+def build(root, allow=None, deny=None):
+    """Hash and write the given lists; returns ``{list: entries}``."""
+    arrays = {}
+    for name, paths in (("allow", allow), ("deny", deny)):
+        if paths:
+            domains = read_domains(paths)
+            if name == "allow":
+                suffixes = [d for d in domains if domain_filter.public_suffix_labels(d) >= len(d.split("."))]
+                if suffixes:
+                    print(f"⚠ Skipping {len(suffixes):,} public-suffix allow entries, e.g. {suffixes[0]}")
+                    skipped = set(suffixes)
+                    domains = [d for d in domains if d not in skipped]
+            arrays[name] = domain_filter.hash_domains(domains)
+    domain_filter.write_lists(root, arrays)
+    return {name: len(hashes) for name, hashes in arrays.items()}
+
+
+def rss_mb():
+    """Current resident set size (Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def synthetic_domains(n, seed):
+    rng = np.random.default_rng(seed)
+    names = rng.integers(0, 36 ** 8, size=n)
+    tlds = rng.integers(0, len(TLDS), size=n)
+    return [f"{np.base_repr(name, 36).lower()}.{TLDS[tld]}" for name, tld in zip(names, tlds)]
+
+
+def benchmark(entries, lookups=200_000):
+    """Build an index of ``entries`` synthetic domains and time lookups that hit and miss."""
+    listed = synthetic_domains(entries, seed=0)
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        hashes = domain_filter.hash_domains(listed)
+        half = len(hashes) // 2
+        domain_filter.write_lists(root, {"allow": hashes[:half], "deny": hashes[half:]})
+        build_s = time.perf_counter() - started
+
+        before = rss_mb()
+        index = domain_filter.DomainIndex(root, reload_interval=3600)
+        for hashes_ in index.lists.values():
+            hashes_.sum()  # fault every page in, as a busy worker would
+        mapped_mb = rss_mb() - before
+
+        rng = np.random.default_rng(1)
+        hits = [f"https://www.{listed[i]}/login?id=1" for i in rng.integers(0, entries, size=lookups // 2)]
+        misses = [f"https://www.{d}/login?id=1" for d in synthetic_domains(lookups // 2, seed=2)]
+        urls = hits + misses
+        started = time.perf_counter()
+        found = sum(index.check(url) is not None for url in urls)
+        lookup_s = time.perf_counter() - started
+
+    return {
+        "entries": entries,
+        "build_s": build_s,
+        "index_mb_per_million": hashes.nbytes / 2 ** 20 / entries * 1e6,
+        "rss_mb_per_million": mapped_mb / entries * 1e6,
+        "lookups_per_s": len(urls) / lookup_s,
+        "us_per_lookup": lookup_s / len(urls) * 1e6,
+        "hit_rate": found / len(urls),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the domain allow/deny index.")
+    parser.add_argument("--db", default=domain_filter.DB_DIR or "domain_lists_db", help="Index directory (DOMAIN_LISTS_DB)")
+    parser.add_argument("--allow", nargs="+", metavar="FILE", help="Allowlist files")
+    parser.add_argument("--deny", nargs="+", metavar="FILE", help="Denylist files")
+    parser.add_argument("--benchmark", type=int, metavar="ENTRIES", help="Benchmark a synthetic index of this size")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark(args.benchmark)
+        print(f"📊 {result['entries']:,} entries built in {result['build_s']:.1f}s")
+        print(f"   index {result['index_mb_per_million']:.1f} MB / RSS {result['rss_mb_per_million']:.1f} MB per million entries")
+        print(f"   {result['lookups_per_s']:,.0f} lookups/s ({result['us_per_lookup']:.1f} µs each, "
+              f"{result['hit_rate']:.0%} listed)")
+    elif args.allow or args.deny:
+        counts = build(args.db, allow=args.allow, deny=args.deny)
+        print(f"✅ Domain index written to {args.db}: " + ", ".join(f"{n} {c:,}" for n, c in counts.items()))
+    else:
+        parser.error("give --allow and/or --deny lists, or --benchmark")
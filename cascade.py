@@ -0,0 +1,260 @@
+"""Two-tier cascade: a small numeric model settles the obvious URLs first.
+
+Stage 1 is a small boosted model over the features.extract_features
+values alone, calibrated with isotonic regression on rows it did not
+train on, so its score estimates the probability that a URL is malicious.
+A URL scoring below ``low``, or at or above ``high``, is decided there.
+Only the band in between pays for the TF-IDF vectorizer and the full model
+(stage 2), and, in app.py, for the reputation lookups.
+
+train_model.py fits stage 1 after the full model. It then picks the band
+on hold-out rows that neither model trained on:
+
+- ``low`` is as high as possible while losing at most MAX_RECALL_LOSS of
+  the malicious URLs that stage 2 catches at THRESHOLD, and never above
+  MAX_LOW: stage 1 only clears URLs it finds more likely benign than not
+- ``high`` is as low as possible, never below THRESHOLD, while adding at
+  most MAX_FP_GAIN false positives
+
+Both defaults are 0, so recall is equal to stage 2's on those rows. Stage
+2 keeps its raw scores: THRESHOLD and the bundle probes are defined on
+them. The band is calibrated against stage 2 instead.
+
+The bundle stores stage 1 next to the full model. CASCADE=1 turns the
+cascade on in app.py, and CASCADE_LOW / CASCADE_HIGH override the band.
+
+    python cascade.py --csv balanced_dataset.csv
+
+reports the fraction short-circuited, and the recall and throughput of
+the cascade against the full model alone.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import fast_inference
+from features import extract_features_batch
+
+ENABLED = os.getenv("CASCADE", "0") == "1"
+LOW = os.getenv("CASCADE_LOW")
+HIGH = os.getenv("CASCADE_HIGH")
+
+MAX_RECALL_LOSS = float(os.getenv("CASCADE_MAX_RECALL_LOSS", 0.0))
+MAX_FP_GAIN = float(os.getenv("CASCADE_MAX_FP_GAIN", 0.0))
+MAX_LOW = float(os.getenv("CASCADE_MAX_LOW", 0.5))
+# Rows used to fit and calibrate stage 1 (taken from each side of the hold-out split)
+SAMPLE_ROWS = int(os.getenv("CASCADE_SAMPLE_ROWS", 500_000))
+STAGE_ONE_PARAMS = {"n_estimators": 60, "max_depth": 4, "learning_rate": 0.2, "random_state": 42}
+
+
+class Cascade:
+    """Calibrated stage-1 tree engine and the band of scores it leaves to stage 2."""
+
+    ARRAYS = ("calibration_x", "calibration_y")
+
+    def __init__(self, engine, calibration_x, calibration_y, low=0.0, high=1.0):
+        self.engine = engine
+        self.calibration_x = np.asarray(calibration_x, dtype=np.float64)
+        self.calibration_y = np.asarray(calibration_y, dtype=np.float64)
+        self.low = float(low)
+        self.high = float(high)
+
+    def stage_one(self, numeric):
+        """Calibrated malicious probability from the numeric features alone."""
+        raw = self.engine.predict_proba(numeric)[:, 1]
+        return np.interp(raw, self.calibration_x, self.calibration_y)
+
+    def decide(self, numeric):
+        """``(probabilities, decided)``: stage-1 scores and which rows fall outside the band."""
+        probs = self.stage_one(numeric)
+        return probs, (probs < self.low) | (probs >= self.high)
+
+    def arrays(self):
+        """Files to bundle: the engine's trees and the calibration curve."""
+        arrays = {f"trees/{name}": getattr(self.engine, name) for name in fast_inference.TreeEnsemble.ARRAYS}
+        arrays.update({name: getattr(self, name) for name in self.ARRAYS})
+        return arrays
+
+    def meta(self):
+        return {"low": self.low, "high": self.high, "engine": self.engine.meta()}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        engine = fast_inference.TreeEnsemble(
+            **{name: arrays[f"trees/{name}"] for name in fast_inference.TreeEnsemble.ARRAYS}, **meta["engine"])
+        return cls(engine, arrays["calibration_x"], arrays["calibration_y"], meta["low"], meta["high"])
+
+
+def from_env(bundle):
+    """``bundle``'s cascade with CASCADE_LOW / CASCADE_HIGH applied; None if CASCADE is off or it has none."""
+    if not ENABLED:
+        return None
+    if bundle.cascade is None:
+        print(f"⚠ CASCADE=1 but bundle {bundle.version} has no cascade stage; scoring every URL in full")
+        return None
+    cascade = bundle.cascade
+    if LOW is not None or HIGH is not None:
+        cascade = Cascade(cascade.engine, cascade.calibration_x, cascade.calibration_y,
+                          float(LOW) if LOW is not None else cascade.low,
+                          float(HIGH) if HIGH is not None else cascade.high)
+    return cascade
+
+
+def choose_band(p1, p2, labels, threshold, max_recall_loss=MAX_RECALL_LOSS, max_fp_gain=MAX_FP_GAIN,
+                max_low=MAX_LOW):
+    """``(low, high)`` for stage-1 scores ``p1``, given stage-2 scores ``p2`` on the same rows."""
+    caught = p2 >= threshold
+    # Malicious URLs stage 2 flags; any with p1 < low would be lost
+    lost_if_benign = np.sort(p1[caught & (labels == 1)])
+    allowed = int(max_recall_loss * (labels == 1).sum())
+    low = lost_if_benign[allowed] if len(lost_if_benign) > allowed else threshold
+    # Benign URLs stage 2 clears; any with p1 >= high would become false positives
+    fp_if_malicious = np.sort(p1[~caught & (labels == 0)])[::-1]
+    allowed = int(max_fp_gain * (labels == 0).sum())
+    high = np.nextafter(fp_if_malicious[allowed], np.inf) if len(fp_if_malicious) > allowed else threshold
+    return float(min(low, max_low, threshold)), float(max(high, threshold))
+
+
+def rates(probs, labels, threshold):
+    flagged = probs >= threshold
+    positives, negatives = (labels == 1).sum(), (labels == 0).sum()
+    tp, fp = int((flagged & (labels == 1)).sum()), int((flagged & (labels == 0)).sum())
+    return {"recall": tp / positives if positives else 0.0, "fpr": fp / negatives if negatives else 0.0,
+            "precision": tp / (tp + fp) if tp + fp else 0.0}
+
+
+def combine(cascade, p1, p2):
+    """Cascade scores: stage 1 where it decides, stage 2 elsewhere."""
+    decided = (p1 < cascade.low) | (p1 >= cascade.high)
+    return np.where(decided, p1, p2), decided
+
+
+def fit(urls, labels, model, vectorizer, threshold, sample_rows=SAMPLE_ROWS, seed=42, weights=None, groups=None,
+        split=None):
+    """Fit and calibrate stage 1, then choose its band against ``model``. Returns ``(Cascade, report)``.
+
+    Rows come from tournament.split, so stage 2 is judged on the hold-out
+    rows it did not train on (when it came out of the tournament).
+    ``split`` overrides it with ``(train_idx, holdout_idx)``, for a model
+    trained on another split (streaming_train.cascade_sample).
+    ``weights`` and ``groups`` are compact_corpus.py's columns, if any.
+    """
+    from sklearn.isotonic import IsotonicRegression
+    from sklearn.model_selection import train_test_split
+    from xgboost import XGBClassifier
+
+    import tournament
+
+    labels = np.asarray(labels)
+    if weights is None:
+        weights = np.ones(len(labels))
+    train_idx, holdout_idx = split if split is not None else tournament.split(labels, groups)
+    rng = np.random.default_rng(seed)
+    if len(train_idx) > sample_rows:
+        train_idx = rng.choice(train_idx, sample_rows, replace=False)
+    if len(holdout_idx) > sample_rows:
+        holdout_idx = rng.choice(holdout_idx, sample_rows, replace=False)
+    fit_idx, calibration_idx = train_test_split(train_idx, test_size=0.25, random_state=seed,
+                                                stratify=labels[train_idx])
+    select_idx, report_idx = train_test_split(holdout_idx, test_size=0.5, random_state=seed,
+                                              stratify=labels[holdout_idx])
+
+    def numeric(idx):
+        return extract_features_batch([urls[i] for i in idx])
+
+    # Trained on CSR like the full model, so zeros count as missing the same way in the tree engine
+    stage = XGBClassifier(n_jobs=os.cpu_count() or 1, **STAGE_ONE_PARAMS)
+    stage.fit(csr_matrix(numeric(fit_idx)), labels[fit_idx], sample_weight=weights[fit_idx])
+    engine = fast_inference.TreeEnsemble.from_model(stage)
+    raw = engine.predict_proba(numeric(calibration_idx))[:, 1]
+    isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip").fit(
+        raw, labels[calibration_idx], sample_weight=weights[calibration_idx])
+    cascade = Cascade(engine, isotonic.X_thresholds_, isotonic.y_thresholds_)
+
+    def scores(idx):
+        batch = [urls[i] for i in idx]
+        full = fast_inference.combine_features(extract_features_batch(batch), vectorizer.transform(batch))
+        return cascade.stage_one(numeric(idx)), model.predict_proba(full)[:, 1]
+
+    p1, p2 = scores(select_idx)
+    cascade.low, cascade.high = choose_band(p1, p2, labels[select_idx], threshold)
+
+    p1, p2 = scores(report_idx)
+    combined, decided = combine(cascade, p1, p2)
+    report = {
+        "rows": {"fit": len(fit_idx), "calibration": len(calibration_idx), "band": len(select_idx),
+                 "report": len(report_idx)},
+        "low": cascade.low,
+        "high": cascade.high,
+        "short_circuited": float(decided.mean()),
+        "full": rates(p2, labels[report_idx], threshold),
+        "cascade": rates(combined, labels[report_idx], threshold),
+    }
+    return cascade, report
+
+
+def print_fit(report):
+    print(f"🪜 Cascade band [{report['low']:.4f}, {report['high']:.4f}): "
+          f"{report['short_circuited']:.1%} of {report['rows']['report']:,} hold-out URLs decided by stage 1")
+    for name in ("full", "cascade"):
+        r = report[name]
+        print(f"   {name:<8} recall {r['recall']:.4f}  precision {r['precision']:.4f}  fpr {r['fpr']:.4f}")
+
+
+def evaluate(bundle, urls, labels, threshold, cascade=None):
+    """Short-circuit rate, recall and throughput of the cascade against ``bundle``'s full model."""
+    cascade = cascade or bundle.cascade
+    labels = np.asarray(labels)
+
+    started = time.perf_counter()
+    full = bundle.model.predict_proba(bundle.transform(urls))[:, 1]
+    full_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    probs, decided = cascade.decide(extract_features_batch(urls))
+    band = np.flatnonzero(~decided)
+    if len(band):
+        probs[band] = bundle.model.predict_proba(bundle.transform([urls[i] for i in band]))[:, 1]
+    cascade_seconds = time.perf_counter() - started
+
+    return {
+        "urls": len(urls),
+        "low": cascade.low,
+        "high": cascade.high,
+        "short_circuited": float(decided.mean()),
+        "full": {**rates(full, labels, threshold), "urls_per_s": len(urls) / full_seconds},
+        "cascade": {**rates(probs, labels, threshold), "urls_per_s": len(urls) / cascade_seconds},
+        "speedup": full_seconds / cascade_seconds,
+    }
+
+
+if __name__ == "__main__":
+    import feature_cache
+    import model_bundle
+    from predict import THRESHOLD
+
+    parser = argparse.ArgumentParser(description="Compare cascade scoring with the full model on a labeled CSV.")
+    parser.add_argument("--csv", default="balanced_dataset.csv", help="Labeled CSV with url,label columns")
+    parser.add_argument("--low", type=float, help="Override the bundle's lower band edge")
+    parser.add_argument("--high", type=float, help="Override the bundle's upper band edge")
+    args = parser.parse_args()
+
+    bundle = model_bundle.load_or_legacy()
+    if bundle.cascade is None:
+        parser.error(f"bundle {bundle.version} has no cascade stage; retrain with train_model.py")
+    cascade = Cascade(bundle.cascade.engine, bundle.cascade.calibration_x, bundle.cascade.calibration_y,
+                      bundle.cascade.low if args.low is None else args.low,
+                      bundle.cascade.high if args.high is None else args.high)
+    urls, labels = feature_cache.load_dataset(args.csv)
+    result = evaluate(bundle, urls, labels, THRESHOLD, cascade)
+
+    print(f"🪜 Band [{result['low']:.4f}, {result['high']:.4f}): {result['short_circuited']:.1%} of "
+          f"{result['urls']:,} URLs decided by stage 1")
+    for name in ("full", "cascade"):
+        r = result[name]
+        print(f"   {name:<8} recall {r['recall']:.4f}  precision {r['precision']:.4f}  fpr {r['fpr']:.4f}  "
+              f"{r['urls_per_s']:,.0f} URLs/s")
+    print(f"🚀 Speedup: {result['speedup']:.2f}x")
@@ -0,0 +1,265 @@
+"""Compact the training corpus: drop duplicate URLs and collapse near-duplicates.
+
+Phishing feeds repeat the same kit URL with a new query string or a random
+path token. Every copy costs feature extraction, TF-IDF and boosting time,
+and a random split puts copies on both sides of the hold-out. This stage
+writes a smaller CSV for train_model.py:
+
+1. Canonicalize each URL: lowercase scheme and host, no default port or
+   fragment (verdict_cache.normalize_url), tracking parameters dropped
+   and the remaining query parameters sorted. Identical canonical URLs
+   are one entry.
+2. Tokenize the canonical URLs into lowercase alphanumeric runs, with
+   digit runs folded to "0", so ``id=5458`` and ``id=9118`` agree. MinHash
+   signatures (NUM_PERM hashes) are bucketed by LSH into BANDS bands.
+   URLs that share a bucket and whose token sets have a Jaccard
+   similarity of at least SIMILARITY are joined into one group.
+3. Keep one row per group and label: the group's first URL with that
+   label. Its ``rows`` column counts the rows it stands for.
+
+Each kept row gets a ``weight``, normalized to a mean of 1. With
+--weighting class (the default), each label keeps the share of total
+weight it had in the input, however unevenly its rows collapsed. With
+--weighting group, a row weighs as much as the rows it replaced. The
+``group`` column marks near-duplicates. tournament.split and the
+cross-validation folds keep each group on one side, so copies no longer
+leak into the hold-out. train_model.py uses both columns when it trains
+on the compacted CSV:
+
+    python compact_corpus.py --csv balanced_dataset.csv --out compact_dataset.csv --measure
+    python train_model.py --data compact_dataset.csv
+
+--measure builds the feature cache and fits one tournament candidate on
+both CSVs, and reports the training time and peak memory saved.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import resource
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from verdict_cache import normalize_url
+
+SIMILARITY = float(os.getenv("COMPACT_SIMILARITY", 0.8))
+NUM_PERM = 64
+BANDS = 16
+# Unique URLs hashed per step; each step holds NUM_PERM hashes per token
+CHUNK_ROWS = 10_000
+
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "mc_cid", "mc_eid", "yclid", "_ga"}
+
+TOKEN = re.compile(r"[a-z0-9]+")
+DIGITS = re.compile(r"[0-9]+")
+
+
+def canonicalize(url):
+    """``url`` normalized for exact deduplication."""
+    url = normalize_url(url)
+    try:
+        scheme, netloc, path, query, _ = urlsplit(url)
+    except ValueError:
+        return url
+    params = [(key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+              if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(params)), ""))
+
+
+def tokens(url):
+    """Token set of a canonical URL, scheme left out and digit runs folded to "0"."""
+    url = url.split("://", 1)[-1].lower()
+    return {DIGITS.sub("0", token) for token in TOKEN.findall(url)} or {""}
+
+
+def signatures(token_sets, num_perm=NUM_PERM, seed=42):
+    """``(len(token_sets), num_perm)`` uint32 MinHash signatures.
+
+    Each token's CRC-32 is hashed with multiply-shift hashing,
+    ``(a * crc + b) >> 32`` in 64-bit arithmetic, so signatures do not
+    depend on the order rows or tokens come in.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+    result = np.empty((len(token_sets), num_perm), dtype=np.uint32)
+    for start in range(0, len(token_sets), CHUNK_ROWS):
+        chunk = token_sets[start:start + CHUNK_ROWS]
+        ids = np.fromiter((zlib.crc32(token.encode()) for row in chunk for token in row), dtype=np.uint64)
+        offsets = np.cumsum([0] + [len(row) for row in chunk[:-1]])
+        hashes = (a[:, None] * ids[None, :] + b[:, None]) >> np.uint64(32)
+        result[start:start + len(chunk)] = np.minimum.reduceat(hashes, offsets, axis=1).T
+    return result
+
+
+def near_duplicate_groups(token_sets, sigs, bands=BANDS, similarity=SIMILARITY):
+    """Group number of each row: rows sharing an LSH bucket whose token sets are ``similarity`` alike."""
+    n, num_perm = sigs.shape
+    width = num_perm // bands
+    pairs = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(sigs[:, band * width:(band + 1) * width]).view(np.dtype((np.void, 4 * width)))
+        _, first, inverse = np.unique(keys.ravel(), return_index=True, return_inverse=True)
+        # Each row is checked against the first row in its bucket, not every pair
+        leader = first[inverse.ravel()]
+        candidates = np.flatnonzero(leader != np.arange(n))
+        pairs.append(np.stack([candidates, leader[candidates]], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    # Confirmed on the exact Jaccard similarity; the signature estimate is too noisy at
+    # NUM_PERM hashes and lets groups chain through pairs just below the cut-off
+    confirmed = np.fromiter((len(token_sets[i] & token_sets[j]) >= similarity * len(token_sets[i] | token_sets[j])
+                             for i, j in pairs), dtype=bool, count=len(pairs))
+    rows, linked = pairs[confirmed].T
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, linked)), shape=(n, n))
+    _, groups = connected_components(graph, directed=False)
+    return groups
+
+
+def compact(urls, labels, sources=None, similarity=SIMILARITY, weighting="class"):
+    """``(DataFrame, stats)``: one row per near-duplicate group and label, in input order.
+
+    Columns are url, label, weight, group and rows, plus source when
+    ``sources`` is given.
+    """
+    labels = np.asarray(labels)
+    codes, canonical = pd.factorize(pd.Series([canonicalize(url) for url in urls]))
+    token_sets = [tokens(url) for url in canonical]
+    groups = near_duplicate_groups(token_sets, signatures(token_sets), similarity=similarity)[codes]
+
+    frame = pd.DataFrame({"row": np.arange(len(urls)), "group": groups, "label": labels})
+    kept = frame.groupby(["group", "label"], sort=False)["row"].agg(["min", "size"]).reset_index()
+    kept = kept.sort_values("min", kind="stable")
+    first = kept["min"].to_numpy()
+    result = pd.DataFrame({"url": [urls[i] for i in first], "label": labels[first]})
+
+    total_counts = pd.Series(labels).value_counts()
+    kept_counts = result["label"].value_counts()
+    if weighting == "class":
+        share = total_counts / len(labels) / (kept_counts / len(result))
+        weights = result["label"].map(share).to_numpy(dtype=float)
+    else:
+        weights = kept["size"].to_numpy() * len(result) / len(labels)
+    result["weight"] = np.round(weights, 6)
+    # Renumbered in order of first appearance among the kept rows
+    result["group"] = pd.factorize(kept["group"])[0]
+    result["rows"] = kept["size"].to_numpy()
+    if sources is not None:
+        result["source"] = np.asarray(sources, dtype=object)[first]
+
+    stats = {
+        "rows": len(urls),
+        "canonical": len(canonical),
+        "groups": int(result["group"].nunique()),
+        "kept": len(result),
+        "labels": {int(label): int(count) for label, count in total_counts.sort_index().items()},
+        "kept_labels": {int(label): int(count) for label, count in kept_counts.sort_index().items()},
+        "weighted_share": {int(label): float(share) for label, share in
+                           (result.groupby("label")["weight"].sum() / result["weight"].sum()).items()},
+    }
+    return result, stats
+
+
+def peak_rss_mb():
+    """Peak RSS of this process. Linux's VmHWM, unlike ru_maxrss, starts afresh after exec, so a
+    spawned worker does not report its parent's peak."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def training_cost(csv_path, candidate="xgb_default"):
+    """Seconds and memory to build the feature cache and fit ``candidate`` on ``csv_path``.
+
+    Runs in its own process (see measure) so the peak RSS is this run's alone.
+    """
+    import feature_cache
+    import tournament
+
+    urls, labels = feature_cache.load_dataset(csv_path)
+    weights, _ = feature_cache.load_weights(csv_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache")
+        started = time.perf_counter()
+        feature_cache.build(urls, path)
+        build_seconds = time.perf_counter() - started
+
+        with open(os.path.join(path, "meta.json")) as f:
+            feature_names = json.load(f)["feature_names"]
+        matrix_mb = sum(os.path.getsize(os.path.join(path, f"{name}.npy"))
+                        for name in ("data", "indices", "indptr")) / 2**20
+        library, params = tournament.CANDIDATES[candidate]
+        started = time.perf_counter()
+        tournament.fit(tournament.make_model(library, params, os.cpu_count() or 1), library,
+                       feature_cache.load_matrix(path), labels, feature_names, weights)
+        fit_seconds = time.perf_counter() - started
+    return {"rows": len(urls), "feature_seconds": build_seconds, "fit_seconds": fit_seconds,
+            "matrix_mb": matrix_mb, "peak_mb": peak_rss_mb()}
+
+
+def measure(csv_path, compact_path, candidate="xgb_default"):
+    """``{"full": cost, "compact": cost}``, each measured in a fresh worker process."""
+    # Spawned, not forked, so the worker does not start with this process's memory
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        return {name: pool.submit(training_cost, path, candidate).result()
+                for name, path in (("full", csv_path), ("compact", compact_path))}
+
+
+def print_stats(stats):
+    print(f"🗜️ {stats['rows']:,} rows -> {stats['canonical']:,} canonical URLs -> {stats['groups']:,} groups; "
+          f"kept {stats['kept']:,} rows ({stats['kept'] / stats['rows']:.1%})")
+    for label, count in stats["labels"].items():
+        kept = stats["kept_labels"].get(label, 0)
+        print(f"   label {label}: {count:,} -> {kept:,} rows, {stats['weighted_share'].get(label, 0.0):.1%} of "
+              f"the weight ({count / stats['rows']:.1%} of the input rows)")
+
+
+def print_costs(costs):
+    full, small = costs["full"], costs["compact"]
+    for key, label in (("feature_seconds", "feature build s"), ("fit_seconds", "fit s"),
+                       ("matrix_mb", "feature matrix MB"), ("peak_mb", "peak RSS MB")):
+        print(f"   {label:<18} {full[key]:>10,.1f} -> {small[key]:>10,.1f}  ({small[key] / full[key] - 1:+.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate a labeled URL CSV and collapse near-duplicates.")
+    parser.add_argument("--csv", default="balanced_dataset.csv", help="Labeled CSV with url,label (and optionally source)")
+    parser.add_argument("--out", default="compact_dataset.csv", help="Where to write the compacted CSV")
+    parser.add_argument("--similarity", type=float, default=SIMILARITY,
+                        help="Estimated Jaccard similarity at which URLs are near-duplicates")
+    parser.add_argument("--weighting", choices=("class", "group"), default="class",
+                        help="class: keep each label's share of the weight; group: weigh rows by group size")
+    parser.add_argument("--measure", action="store_true",
+                        help="Also time the feature build and a model fit on both CSVs")
+    parser.add_argument("--candidate", default="xgb_default", help="Tournament candidate fitted by --measure")
+    args = parser.parse_args()
+
+    columns = pd.read_csv(args.csv, nrows=0).columns
+    data = pd.read_csv(args.csv, usecols=[c for c in ("url", "label", "source") if c in columns])
+    data = data.dropna(subset=["url"])
+    started = time.perf_counter()
+    result, stats = compact(data["url"].astype(str).tolist(), data["label"].to_numpy(),
+                            data["source"].tolist() if "source" in data else None,
+                            args.similarity, args.weighting)
+    print_stats(stats)
+    result.to_csv(args.out, index=False)
+    print(f"💾 Compacted corpus written to {args.out} in {time.perf_counter() - started:.1f}s")
+
+    if args.measure:
+        print(f"⏱️ Training cost ({args.candidate}):")
+        print_costs(measure(args.csv, args.out, args.candidate))
@@ -0,0 +1,76 @@
+"""Fixtures shared by the Flask and aiohttp app tests.
+
+app.py loads its model bundle and configures its providers at import, so
+the environment is set here, before any test module imports it: a tiny
+bundle in a temporary directory, the canned GenAI provider, and upstream
+URLs that refuse connections so no test reaches the internet.
+"""
+import importlib
+import os
+import tempfile
+
+import pytest
+
+BUNDLE_ROOT = tempfile.mkdtemp(prefix="test-bundle-")
+os.environ["MODEL_BUNDLE"] = BUNDLE_ROOT
+os.environ["GENAI_PROVIDERS"] = "stub"
+os.environ["GENAI_STUB_DELAY"] = "0"
+os.environ["GSB_API_URL"] = "http://127.0.0.1:9/gsb"
+os.environ["VT_API_URL"] = "http://127.0.0.1:9/vt"
+os.environ.pop("SCORING_POOL_SOCKET", None)
+os.environ.pop("DOMAIN_LISTS_DB", None)
+os.environ.pop("VERDICT_CACHE_DB", None)
+
+
+def save_tiny_bundle(root, cascade_stage=False):
+    """Train a 20-tree model on synthetic URLs and save it as ``root``'s CURRENT bundle."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from xgboost import XGBClassifier
+
+    import cascade
+    import fast_inference
+    import model_bundle
+    from features import FEATURE_NAMES, extract_features_batch
+    from synthetic_urls import generate_urls
+
+    urls, labels = generate_urls(2000, seed=11, phishing_ratio=0.3)
+    vectorizer = TfidfVectorizer(max_features=200).fit(urls)
+    X = fast_inference.combine_features(extract_features_batch(urls), vectorizer.transform(urls))
+    model = XGBClassifier(n_estimators=20, max_depth=4).fit(X, labels)
+    stage = cascade.fit(urls, labels, model, vectorizer, 0.9)[0] if cascade_stage else None
+    feature_names = FEATURE_NAMES + vectorizer.get_feature_names_out().tolist()
+    return model_bundle.save(model, vectorizer, feature_names, root=root, cascade=stage)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """The Flask app module, serving a tiny bundle with a cascade stage (off unless a test turns it on)."""
+    save_tiny_bundle(BUNDLE_ROOT, cascade_stage=True)
+    return importlib.import_module("app")
+
+
+@pytest.fixture
+def cascade_decides_everything(app_module, monkeypatch):
+    """Turn the cascade on with a band no score falls in, and fail any full-model scoring."""
+    import cascade
+    stage = cascade.Cascade(app_module.bundle.cascade.engine, [0.0, 1.0], [0.0, 1.0], low=2.0, high=3.0)
+    monkeypatch.setattr(app_module, "cascade_model", stage)
+
+    def full_model(urls):
+        if urls:
+            raise AssertionError(f"full model scored {urls}")
+        return {}
+    monkeypatch.setattr(app_module, "cached_scores", full_model)
+
+
+@pytest.fixture
+def domain_lists(tmp_path, monkeypatch):
+    """Allow good.example and deny evil.example through the process-wide domain index."""
+    import build_domain_index
+    import domain_filter
+    (tmp_path / "allow.txt").write_text("good.example\n")
+    (tmp_path / "deny.txt").write_text("evil.example\n")
+    root = str(tmp_path / "domain-lists")
+    build_domain_index.build(root, allow=[str(tmp_path / "allow.txt")], deny=[str(tmp_path / "deny.txt")])
+    monkeypatch.setattr(domain_filter, "DB_DIR", root)
+    monkeypatch.setattr(domain_filter, "_index", None)
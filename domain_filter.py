@@ -0,0 +1,248 @@
+"""Domain allow/deny lists checked before any feature extraction.
+
+build_domain_index.py turns allow and deny lists (plain domains, hosts
+files or ranked CSVs such as Tranco, millions of lines) into DOMAIN_LISTS_DB:
+
+- state.json: per list its array file, entry count and build time
+- <list>.<n>.npy: sorted uint64 hashes of the listed domains, 8 bytes per
+  entry, memory-mapped by every worker
+
+A URL's host is checked with each of its label suffixes
+(a.b.example.com, b.example.com, example.com, com), one hash and one
+binary search each. The cost grows with the number of labels in the host,
+not with the list size. A deny entry covers the domain and all its
+subdomains. An allow entry only covers hosts inside its own registrable
+domain (public suffix plus one label). An allow entry for github.io,
+blogspot.com or another shared-hosting suffix therefore never clears
+anyone's x.github.io site, only entries at or below x.github.io do. The
+most specific match wins, and deny wins a tie.
+
+Public suffixes come from PUBLIC_SUFFIX_LIST (a copy of
+https://publicsuffix.org/list/public_suffix_list.dat) when it is set,
+plus the built-in SHARED_SUFFIXES, which are always applied.
+
+The builder swaps in new arrays by rewriting state.json. Workers notice
+on their next check, map the new files and replace the old ones with a
+single assignment, so a reload never blocks a lookup.
+"""
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DB_DIR = os.getenv("DOMAIN_LISTS_DB", "")
+# Seconds between checks for a newer state.json written by the builder
+RELOAD_INTERVAL = float(os.getenv("DOMAIN_LISTS_RELOAD_INTERVAL", 5))
+
+LISTS = ("allow", "deny")
+MAX_LABELS = 10
+
+PUBLIC_SUFFIX_LIST = os.getenv("PUBLIC_SUFFIX_LIST", "")
+# Suffixes under which anyone can get a host: free and shared hosting,
+# dynamic DNS and multi-label country suffixes. Used with or without
+# PUBLIC_SUFFIX_LIST, so allowlists never cover tenants of these.
+SHARED_SUFFIXES = frozenset({
+    "github.io", "gitlab.io", "blogspot.com", "000webhostapp.com", "herokuapp.com", "netlify.app",
+    "vercel.app", "pages.dev", "workers.dev", "web.app", "firebaseapp.com", "appspot.com",
+    "azurewebsites.net", "cloudfront.net", "s3.amazonaws.com", "wixsite.com", "weebly.com", "wordpress.com",
+    "glitch.me", "repl.co", "ngrok.io", "ngrok-free.app", "surge.sh", "onrender.com", "fly.dev",
+    "duckdns.org", "no-ip.org", "ddns.net", "myshopify.com", "webflow.io", "translate.goog",
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "com.au", "net.au", "org.au", "co.jp", "ne.jp", "or.jp",
+    "com.br", "net.br", "co.in", "co.nz", "co.za", "com.cn", "com.mx", "com.tr", "com.ar", "co.kr",
+})
+
+
+def domain_hash(domain):
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), "little")
+
+
+def host_of(url):
+    """Lower-case host of ``url`` without port or trailing dot ("" if there is none)."""
+    try:
+        host = urlsplit(url if "://" in url else "http://" + url).hostname or ""
+    except ValueError:
+        return ""
+    return host.rstrip(".")
+
+
+def suffixes(host):
+    """``host`` and its parent domains, most specific first."""
+    labels = host.split(".")[-MAX_LABELS:]
+    return [".".join(labels[i:]) for i in range(len(labels))]
+
+
+_suffix_rules = None
+
+
+def suffix_rules():
+    """``(rules, wildcards, exceptions)`` from PUBLIC_SUFFIX_LIST and SHARED_SUFFIXES, loaded once."""
+    global _suffix_rules
+    if _suffix_rules is None:
+        rules, wildcards, exceptions = set(SHARED_SUFFIXES), set(), set()
+        if PUBLIC_SUFFIX_LIST:
+            with open(PUBLIC_SUFFIX_LIST, encoding="utf-8") as f:
+                for line in f:
+                    rule = line.split("//", 1)[0].strip().lower()
+                    if rule.startswith("!"):
+                        exceptions.add(rule[1:])
+                    elif rule.startswith("*."):
+                        wildcards.add(rule[2:])
+                    elif rule:
+                        rules.add(rule)
+        _suffix_rules = (rules, wildcards, exceptions)
+    return _suffix_rules
+
+
+def public_suffix_labels(host):
+    """Number of labels in ``host``'s public suffix (1, the TLD, when no rule matches)."""
+    rules, wildcards, exceptions = suffix_rules()
+    labels = host.split(".")
+    for i in range(len(labels)):
+        candidate = ".".join(labels[i:])
+        if candidate in exceptions:
+            return len(labels) - i - 1
+        if candidate in rules:
+            return len(labels) - i
+        if i > 0 and candidate in wildcards:
+            return len(labels) - i + 1
+    return 1
+
+
+def normalize_entry(line):
+    """Domain from a list line: "example.com", "0.0.0.0 example.com" or "1,example.com"; None to skip."""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    domain = line.replace(",", " ").split()[-1].lower().rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+    domain = domain.lstrip(".")
+    if not domain or domain in ("localhost", "0.0.0.0", "127.0.0.1"):
+        return None
+    return domain
+
+
+def read_state(root):
+    try:
+        with open(os.path.join(root, "state.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"updated": 0, "lists": {}}
+
+
+def write_lists(root, arrays):
+    """Write ``{list: sorted uint64 hashes}`` and switch state.json to them atomically."""
+    os.makedirs(root, exist_ok=True)
+    state = read_state(root)
+    old_files = []
+    for name, hashes in arrays.items():
+        entry = state["lists"].setdefault(name, {})
+        generation = entry.get("generation", 0) + 1
+        filename = f"{name}.{generation}.npy"
+        np.save(os.path.join(root, filename), np.asarray(hashes, dtype=np.uint64))
+        if entry.get("file"):
+            old_files.append(entry["file"])
+        entry.update(file=filename, generation=generation, count=int(len(hashes)))
+    state["updated"] = time.time()
+    tmp = os.path.join(root, f"state.json.tmp{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, os.path.join(root, "state.json"))
+    # Workers that still map an old file keep it until they reload
+    for filename in old_files:
+        try:
+            os.remove(os.path.join(root, filename))
+        except FileNotFoundError:
+            pass
+
+
+def hash_domains(domains):
+    return np.unique(np.fromiter((domain_hash(d) for d in domains), dtype=np.uint64))
+
+
+class DomainIndex:
+    """Read side of DOMAIN_LISTS_DB: memory-mapped hash arrays, reloaded when the builder swaps them."""
+
+    def __init__(self, root, reload_interval=RELOAD_INTERVAL):
+        self.root = root
+        self.reload_interval = reload_interval
+        self._stamp = None
+        self._checked = 0.0
+        self.lists = {}
+        self.reload()
+
+    def reload(self):
+        path = os.path.join(self.root, "state.json")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        lists = {}
+        for name, entry in read_state(self.root)["lists"].items():
+            if entry.get("file"):
+                lists[name] = np.load(os.path.join(self.root, entry["file"]), mmap_mode="r").view(np.ndarray)
+        # One assignment: a lookup sees either the old lists or the new ones
+        self.lists = lists
+        self._stamp = stamp
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked >= self.reload_interval:
+            self._checked = now
+            self.reload()
+
+    def check_host(self, host):
+        """"allow", "deny" or None for ``host``."""
+        if not host:
+            return None
+        self._maybe_reload()
+        lists = self.lists
+        if not lists:
+            return None
+        keys = np.array([domain_hash(s) for s in suffixes(host)], dtype=np.uint64)
+        # Allow entries only count down to the registrable domain, not the public suffix above it
+        registrable = len(keys) - public_suffix_labels(host) - 1
+        best, best_depth = None, len(keys)
+        for name in LISTS:
+            hashes = lists.get(name)
+            if hashes is None or not len(hashes):
+                continue
+            found = hashes.take(hashes.searchsorted(keys), mode="clip") == keys
+            if name == "allow":
+                found[max(registrable + 1, 0):] = False
+            # Lower depth is more specific; "deny" comes last, so it wins a tie
+            if found.any() and found.argmax() <= best_depth:
+                best, best_depth = name, found.argmax()
+        return best
+
+    def check(self, url):
+        return self.check_host(host_of(url))
+
+    def stats(self):
+        lists = self.lists
+        return {name: {"entries": int(len(hashes)), "bytes": int(hashes.nbytes)} for name, hashes in lists.items()}
+
+
+_index = None
+
+
+def index():
+    """The process-wide index for DOMAIN_LISTS_DB, or None when the lists are off."""
+    global _index
+    if not DB_DIR:
+        return None
+    if _index is None:
+        _index = DomainIndex(DB_DIR)
+    return _index
+
+
+def check(url):
+    """"allow", "deny" or None for ``url`` against the process-wide index."""
+    domain_index = index()
+    return domain_index.check(url) if domain_index is not None else None
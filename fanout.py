@@ -0,0 +1,69 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Shared pool for the external reputation lookups. Each /analyze request
+# submits one task per provider, so size it for the expected concurrency.
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", 32))
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+class ProviderResult:
+    """Outcome of one provider call: ``status`` is "ok", "timeout" or "error"."""
+
+    __slots__ = ("name", "status", "value", "error", "elapsed")
+
+    def __init__(self, name, status, value=None, error=None, elapsed=0.0):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"ProviderResult({self.name!r}, {self.status!r}, {self.value!r}, elapsed={self.elapsed:.3f})"
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, time.perf_counter() - start
+
+
+def start(calls, *args):
+    """Submit every provider in ``calls`` (name -> callable) at once.
+
+    Returns the pending fan-out; pass it to :func:`collect` to wait for the
+    results. Splitting the two lets the caller do its own work (ML scoring)
+    while the providers are in flight.
+    """
+    return time.monotonic(), {name: _executor.submit(_timed, fn, *args) for name, fn in calls.items()}
+
+
+def collect(pending, deadlines, default_deadline=5.0):
+    """Wait for a fan-out started by :func:`start`.
+
+    ``deadlines`` maps provider name to seconds measured from the moment the
+    fan-out started, so total wall time is bounded by the largest deadline
+    rather than the sum of them. Providers that miss their deadline are
+    reported as "timeout"; their threads finish in the background and the
+    late result is discarded.
+    """
+    started, futures = pending
+    results = {}
+    for name, future in futures.items():
+        remaining = started + deadlines.get(name, default_deadline) - time.monotonic()
+        try:
+            value, elapsed = future.result(timeout=max(remaining, 0))
+            results[name] = ProviderResult(name, "ok", value, elapsed=elapsed)
+        except FutureTimeoutError:
+            results[name] = ProviderResult(name, "timeout", elapsed=time.monotonic() - started)
+        except Exception as e:
+            results[name] = ProviderResult(name, "error", error=e, elapsed=time.monotonic() - started)
+    return results
+
+
+def fan_out(calls, *args, deadlines=None, default_deadline=5.0):
+    """Run every provider concurrently and return ``{name: ProviderResult}``."""
+    return collect(start(calls, *args), deadlines or {}, default_deadline)
@@ -0,0 +1,325 @@
+"""Array-backed scoring for the saved XGBoost / LightGBM model.
+
+``TreeEnsemble.from_model`` flattens every tree of the trained booster into
+a handful of NumPy arrays. ``predict_proba`` then walks all trees at once,
+one tree level per step, straight from a CSR row. There is no DataFrame,
+COO matrix or DMatrix in the way, which removes most of the per-call
+overhead of the sklearn wrappers for single-row requests.
+"""
+import json
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+# LightGBM treats |x| <= kZeroThreshold as zero for missing_type "Zero"
+ZERO_THRESHOLD = 1e-35
+
+# Rows densified at a time by predict_proba
+CHUNK_ROWS = 1024
+
+
+def combine_features(numeric, tfidf):
+    """CSR matrix of ``[numeric | tfidf]`` built straight from the arrays.
+
+    Same result as ``scipy.sparse.hstack(..., format="csr")`` (zeros in the
+    numeric block are not stored), without its per-call COO round trip.
+    """
+    tfidf = tfidf.tocsr()
+    n, width = numeric.shape
+    num_rows, num_cols = np.nonzero(numeric)
+    tfidf_rows = np.repeat(np.arange(n), np.diff(tfidf.indptr))
+    order = np.argsort(np.concatenate([num_rows, tfidf_rows]), kind="stable")
+    data = np.concatenate([numeric[num_rows, num_cols], tfidf.data])[order]
+    indices = np.concatenate([num_cols, tfidf.indices + width])[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(num_rows, minlength=n) + np.diff(tfidf.indptr), out=indptr[1:])
+    return csr_matrix((data, indices, indptr), shape=(n, width + tfidf.shape[1]))
+
+
+class BoosterClassifier:
+    """sklearn-style ``predict_proba`` around a native XGBoost/LightGBM Booster.
+
+    Streaming training produces native boosters rather than the sklearn
+    wrappers; this is what it pickles as best_model.pkl.
+    """
+
+    def __init__(self, booster):
+        self.booster = booster
+        self.classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        if issparse(X) and X.format != "csr":
+            X = X.tocsr()
+        if type(self.booster).__module__.startswith("xgboost"):
+            positive = self.booster.inplace_predict(X)
+        else:
+            positive = self.booster.predict(X)
+        positive = np.asarray(positive, dtype=np.float64)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+
+class TreeEnsemble:
+    """Flattened binary tree ensemble.
+
+    Nodes of all trees share global arrays; a leaf is a node whose children
+    point back at itself.
+    """
+
+    ARRAYS = ("roots", "feature", "threshold", "left", "right", "default_left",
+              "missing_zero", "missing_nan", "value")
+
+    def __init__(self, roots, feature, threshold, left, right, default_left,
+                 missing_zero, missing_nan, value, base_margin=0.0, sigmoid=1.0,
+                 strict=False, num_features=0, kind=""):
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing_zero = np.asarray(missing_zero, dtype=bool)
+        self.missing_nan = np.asarray(missing_nan, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.base_margin = float(base_margin)
+        self.sigmoid = float(sigmoid)
+        # XGBoost goes left on x < threshold (in float32); LightGBM on x <= threshold
+        self.strict = bool(strict)
+        self.num_features = int(num_features)
+        self.kind = kind
+        self.dtype = self.threshold.dtype
+        self.is_leaf = self.left == np.arange(len(self.left))
+        zero_missing = self.missing_zero[~self.is_leaf]
+        self._zero_missing = "all" if zero_missing.all() else "some" if zero_missing.any() else "none"
+        self.max_depth = self._depth()
+        self.classes_ = np.array([0, 1])
+
+    def _depth(self):
+        depth, frontier = 0, self.roots
+        while True:
+            internal = frontier[self.left[frontier] != frontier]
+            if not len(internal):
+                return depth
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+            depth += 1
+
+    # ------------------------------------------------------------------ export
+
+    @classmethod
+    def from_model(cls, model):
+        """Build from an XGBClassifier / LGBMClassifier or their native boosters."""
+        if isinstance(model, BoosterClassifier):
+            model = model.booster
+        module = type(model).__module__
+        if module.startswith("xgboost"):
+            booster = model.get_booster() if hasattr(model, "get_booster") else model
+            return cls._from_xgboost(booster)
+        if module.startswith("lightgbm"):
+            booster = model.booster_ if hasattr(model, "booster_") else model
+            return cls._from_lightgbm(booster)
+        raise TypeError(f"Unsupported model type: {type(model).__name__}")
+
+    @classmethod
+    def _from_xgboost(cls, booster):
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        objective = learner["objective"]["name"]
+        if objective != "binary:logistic":
+            raise ValueError(f"Unsupported XGBoost objective: {objective}")
+        gbm = learner["gradient_booster"]
+        if gbm.get("name") != "gbtree":
+            raise ValueError(f"Unsupported XGBoost booster: {gbm.get('name')}")
+
+        arrays = {name: [] for name in cls.ARRAYS}
+        offset = 0
+        for tree in gbm["model"]["trees"]:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+            left = np.array(tree["left_children"], dtype=np.int64)
+            right = np.array(tree["right_children"], dtype=np.int64)
+            ids = np.arange(len(left))
+            leaf = left == -1
+            arrays["roots"].append([offset])
+            arrays["feature"].append(np.where(leaf, 0, tree["split_indices"]))
+            arrays["threshold"].append(np.where(leaf, 0, tree["split_conditions"]))
+            arrays["left"].append(np.where(leaf, ids, left) + offset)
+            arrays["right"].append(np.where(leaf, ids, right) + offset)
+            arrays["default_left"].append(tree["default_left"])
+            # Sparse input: entries that are not stored (zeros) are missing
+            arrays["missing_zero"].append(~leaf)
+            arrays["missing_nan"].append(~leaf)
+            arrays["value"].append(np.where(leaf, tree["split_conditions"], 0))
+            offset += len(left)
+
+        params = learner["learner_model_param"]
+        base_score = float(params["base_score"])
+        flat = {name: np.concatenate(parts) for name, parts in arrays.items()}
+        flat["threshold"] = flat["threshold"].astype(np.float32)
+        return cls(**flat, base_margin=np.log(base_score / (1 - base_score)), strict=True,
+                   num_features=int(params["num_feature"]), kind="xgboost")
+
+    @classmethod
+    def _from_lightgbm(cls, booster):
+        dump = booster.dump_model()
+        if dump["num_tree_per_iteration"] != 1 or not dump["objective"].startswith("binary"):
+            raise ValueError(f"Unsupported LightGBM objective: {dump['objective']}")
+        sigmoid = 1.0
+        for part in dump["objective"].split():
+            if part.startswith("sigmoid:"):
+                sigmoid = float(part.split(":", 1)[1])
+
+        arrays = {name: [] for name in cls.ARRAYS}
+
+        def add(node):
+            index = len(arrays["feature"])
+            for name in cls.ARRAYS[1:]:
+                arrays[name].append(0)
+            if "leaf_value" in node:
+                arrays["left"][index] = arrays["right"][index] = index
+                arrays["value"][index] = node["leaf_value"]
+                return index
+            if node["decision_type"] != "<=":
+                raise ValueError("Categorical splits are not supported")
+            arrays["feature"][index] = node["split_feature"]
+            arrays["threshold"][index] = node["threshold"]
+            arrays["default_left"][index] = node["default_left"]
+            arrays["missing_zero"][index] = node["missing_type"] == "Zero"
+            arrays["missing_nan"][index] = node["missing_type"] == "NaN"
+            arrays["left"][index] = add(node["left_child"])
+            arrays["right"][index] = add(node["right_child"])
+            return index
+
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+        roots = [add(tree["tree_structure"]) for tree in dump["tree_info"]]
+        arrays = {name: np.array(values) for name, values in arrays.items() if name != "roots"}
+        arrays["threshold"] = arrays["threshold"].astype(np.float64)
+        return cls(roots=roots, **arrays, sigmoid=sigmoid, strict=False,
+                   num_features=dump["max_feature_idx"] + 1, kind="lightgbm")
+
+    # ----------------------------------------------------------------- scoring
+
+    def _margins(self, X):
+        # Walk (row, node) pairs level by level, dropping pairs as soon as
+        # they reach a leaf, so shallow trees stop costing work early.
+        n, width = X.shape
+        flat = X.ravel()
+        rows = np.repeat(np.arange(n), len(self.roots))
+        nodes = np.tile(self.roots, n)
+        margins = np.full(n, self.base_margin)
+        has_nan = np.isnan(flat).any()
+        while True:
+            leaf = self.is_leaf[nodes]
+            if leaf.any():
+                margins += np.bincount(rows[leaf], weights=self.value[nodes[leaf]], minlength=n)
+                rows, nodes = rows[~leaf], nodes[~leaf]
+            if not len(nodes):
+                return margins
+            x = flat[rows * width + self.feature[nodes]]
+            if has_nan:
+                nan = np.isnan(x)
+                x = np.where(nan & ~self.missing_nan[nodes], 0, x)
+                missing = nan & self.missing_nan[nodes]
+            else:
+                missing = None
+            if self._zero_missing == "all":
+                zero = np.abs(x) <= ZERO_THRESHOLD
+                missing = zero if missing is None else missing | zero
+            elif self._zero_missing == "some":
+                zero = (np.abs(x) <= ZERO_THRESHOLD) & self.missing_zero[nodes]
+                missing = zero if missing is None else missing | zero
+            threshold = self.threshold[nodes]
+            go_left = x < threshold if self.strict else x <= threshold
+            if missing is not None:
+                go_left = np.where(missing, self.default_left[nodes], go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+    def predict_proba(self, X):
+        """``(n, 2)`` class probabilities, like the sklearn wrappers."""
+        if not issparse(X):
+            X = csr_matrix(np.atleast_2d(X))
+        elif X.format != "csr":
+            X = X.tocsr()
+        margins = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            dense = X[start:start + CHUNK_ROWS].toarray().astype(self.dtype, copy=False)
+            margins[start:start + CHUNK_ROWS] = self._margins(dense)
+        positive = 1.0 / (1.0 + np.exp(-self.sigmoid * margins))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] > threshold).astype(int)
+
+    # ------------------------------------------------------------- persistence
+
+    def meta(self):
+        """Scalar settings that, with ARRAYS, rebuild the ensemble via ``TreeEnsemble(**arrays, **meta)``."""
+        return {"base_margin": self.base_margin, "sigmoid": self.sigmoid, "strict": self.strict,
+                "num_features": self.num_features, "kind": self.kind}
+
+    def save(self, path):
+        np.savez(path, meta=json.dumps(self.meta()), **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        with np.load(path, mmap_mode=mmap_mode) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(**{name: data[name] for name in cls.ARRAYS}, **meta)
+
+
+# ✅ Latency benchmark against the joblib/sklearn path:
+#    python fast_inference.py [best_model.pkl] [vectorizer.pkl]
+if __name__ == "__main__":
+    import joblib
+    from scipy.sparse import hstack
+
+    from features import extract_features_batch
+    from synthetic_urls import generate_urls
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "best_model.pkl"
+    vectorizer_path = sys.argv[2] if len(sys.argv) > 2 else "vectorizer.pkl"
+    model = joblib.load(model_path)
+    vectorizer = joblib.load(vectorizer_path)
+
+    start = time.perf_counter()
+    engine = TreeEnsemble.from_model(model)
+    print(f"✅ Exported {engine.kind} model: {len(engine.roots)} trees, {len(engine.feature)} nodes, "
+          f"depth {engine.max_depth} in {time.perf_counter() - start:.2f}s")
+
+    urls, _ = generate_urls(20_000, seed=7)
+    numeric = extract_features_batch(urls)
+    tfidf = vectorizer.transform(urls)
+    X_csr = hstack([numeric, tfidf], format="csr")
+
+    expected = model.predict_proba(hstack([numeric, tfidf]))[:, 1]
+    actual = engine.predict_proba(combine_features(numeric, tfidf))[:, 1]
+    print(f"🔍 Max |Δp| over {len(urls):,} rows: {np.abs(expected - actual).max():.2e}")
+
+    def latencies(score, rows):
+        times = []
+        for i in range(rows):
+            start = time.perf_counter()
+            score(i)
+            times.append(time.perf_counter() - start)
+        return np.percentile(times, [50, 99]) * 1e6
+
+    # Current serving path: hstack to COO, then the sklearn wrapper
+    def current_single(i):
+        return model.predict_proba(hstack([numeric[i:i + 1], tfidf_rows[i]]))[0][1]
+
+    def fast_single(i):
+        return engine.predict_proba(combine_features(numeric[i:i + 1], tfidf_rows[i]))[0][1]
+
+    tfidf_rows = [tfidf[i] for i in range(2000)]
+    for name, score in (("current", current_single), ("fast", fast_single)):
+        p50, p99 = latencies(score, 2000)
+        print(f"⏱  {name:8s} single row: p50 {p50:8.1f} µs  p99 {p99:8.1f} µs")
+
+    for name, score in (("current", lambda: model.predict_proba(hstack([numeric, tfidf]))),
+                        ("fast", lambda: engine.predict_proba(combine_features(numeric, tfidf)))):
+        start = time.perf_counter()
+        score()
+        elapsed = time.perf_counter() - start
+        print(f"🚀 {name:8s} batch of {len(urls):,}: {len(urls) / elapsed:,.0f} rows/s")
@@ -0,0 +1,106 @@
+"""On-disk cache of the training feature matrix.
+
+The cache key hashes the URL column (plus the feature set), not the
+labels, so relabelling rows reuses the cached matrix. Arrays are stored as
+plain .npy files and opened memory-mapped, so every training process
+reading the same cache shares one copy through the page cache.
+"""
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from fast_inference import combine_features
+from features import FEATURE_NAMES, extract_features_batch
+
+CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "feature_cache")
+
+
+def dataset_key(urls, max_features=2000):
+    """Hash of the URL column and feature configuration."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"features": FEATURE_NAMES, "max_features": max_features}).encode())
+    for url in urls:
+        digest.update(url.encode("utf-8", "surrogatepass"))
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def load_dataset(csv_path):
+    """URLs and labels from a CSV or a label store (``.db``); labels are always re-read, never cached."""
+    if csv_path.endswith(".db"):
+        from label_store import LabelStore
+        store = LabelStore(csv_path)
+        urls, labels, _ = store.snapshot()
+        store.close()
+        return urls, labels
+    data = pd.read_csv(csv_path, usecols=["url", "label"])
+    data = data.dropna(subset=["url"])
+    return data["url"].astype(str).tolist(), data["label"].to_numpy()
+
+
+def load_weights(csv_path):
+    """``(weights, groups)`` from the weight and group columns compact_corpus.py writes; None for each missing."""
+    if csv_path.endswith(".db"):
+        return None, None
+    columns = [name for name in ("weight", "group") if name in pd.read_csv(csv_path, nrows=0).columns]
+    if not columns:
+        return None, None
+    data = pd.read_csv(csv_path, usecols=["url", *columns])
+    data = data.dropna(subset=["url"])
+    return (data["weight"].to_numpy(dtype=np.float64) if "weight" in data else None,
+            data["group"].to_numpy(dtype=np.int64) if "group" in data else None)
+
+
+def load_matrix(path, mmap_mode="r"):
+    """CSR feature matrix from a cache entry directory, memory-mapped by default."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+              for name in ("data", "indices", "indptr")]
+    return csr_matrix(tuple(arrays), shape=tuple(meta["shape"]))
+
+
+def build(urls, path, max_features=2000):
+    """Extract features for ``urls`` and write them to ``path``."""
+    print("🔧 Extracting features...")
+    numeric = extract_features_batch(urls)
+    vectorizer = TfidfVectorizer(max_features=max_features)
+    tfidf = vectorizer.fit_transform(urls)
+    print(f"🔢 Numeric Features Shape: {numeric.shape}")
+    print(f"📊 TF-IDF Features Shape: {tfidf.shape}")
+    X = combine_features(numeric, tfidf)
+
+    # Written under a temporary name so an interrupted build is never picked up
+    tmp_path = path + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name in ("data", "indices", "indptr"):
+        np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(X, name))
+    joblib.dump(vectorizer, os.path.join(tmp_path, "vectorizer.pkl"))
+    feature_names = FEATURE_NAMES + vectorizer.get_feature_names_out().tolist()
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"shape": X.shape, "feature_names": feature_names}, f)
+    os.replace(tmp_path, path)
+
+
+def load_or_build(csv_path, cache_dir=CACHE_DIR, max_features=2000):
+    """Return ``(path, labels, vectorizer, feature_names)`` for ``csv_path``.
+
+    Features are only extracted when no cache entry matches the URL column.
+    """
+    urls, labels = load_dataset(csv_path)
+    path = os.path.join(cache_dir, dataset_key(urls, max_features))
+    if os.path.exists(os.path.join(path, "meta.json")):
+        print(f"♻️  Reusing feature cache {path}")
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        build(urls, path, max_features)
+    with open(os.path.join(path, "meta.json")) as f:
+        feature_names = json.load(f)["feature_names"]
+    vectorizer = joblib.load(os.path.join(path, "vectorizer.pkl"))
+    return path, labels, vectorizer, feature_names
@@ -0,0 +1,189 @@
+"""Numeric URL features shared by training, evaluation and serving.
+
+``extract_features`` scores one URL; ``extract_features_batch`` computes the
+same 10 features for a whole column of URLs with NumPy instead of a Python
+loop. Both must stay in step with each other and with FEATURE_NAMES.
+"""
+import codecs
+import re
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+FEATURE_NAMES = [
+    "url_length", "num_dots", "num_hyphens", "num_at", "num_question",
+    "num_equals", "https_presence", "ip_presence", "subdomain_count", "domain_length",
+]
+
+# The deployed model was trained with the unbounded \d+ pattern
+IP_PATTERN = re.compile(r'\d+\.\d+\.\d+\.\d+')
+
+# URLs per NumPy pass in extract_features_batch; bounds peak memory
+CHUNK_SIZE = 20_000
+
+# Below this many URLs the per-URL loop beats the NumPy setup cost
+SMALL_BATCH = 48
+
+_SCHEME_CHARS = np.zeros(256, dtype=bool)
+_SCHEME_CHARS[[ord(c) for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+-."]] = True
+
+_COUNTED_CHARS = np.zeros(256, dtype=np.uint8)
+_COUNTED_CHARS[[ord(c) for c in ".-@?="]] = np.arange(1, 6)
+
+codecs.register_error("features.nul", lambda err: ("\x00" * (err.end - err.start), err.end))
+
+
+def extract_features(url):
+    netloc = urlparse(url).netloc
+    return [
+        len(url),  # URL length
+        url.count('.'),  # Number of dots
+        url.count('-'),  # Number of hyphens
+        url.count('@'),  # Number of '@' symbols
+        url.count('?'),  # Number of query parameters
+        url.count('='),  # Number of '=' in URL
+        int('http' in url),  # HTTPS presence (same as re.search(r'https?', url))
+        int(IP_PATTERN.search(url) is not None),  # IP Address presence
+        netloc.count('.'),  # Subdomain count
+        len(netloc)  # Domain length
+    ]
+
+
+def _window_counts(mask, starts, ends):
+    """Number of True entries of ``mask`` in each ``[starts, ends)`` window."""
+    positions = np.flatnonzero(mask)
+    return np.searchsorted(positions, np.maximum(ends, starts)) - np.searchsorted(positions, starts)
+
+
+def _first_at_or_after(positions, at, limit):
+    """First entry of sorted ``positions`` >= ``at``, or ``limit`` if none is below it."""
+    idx = np.searchsorted(positions, at)
+    found = np.append(positions, np.iinfo(np.int64).max)[idx]
+    return np.minimum(found, limit)
+
+
+def _extract_chunk(urls):
+    n = len(urls)
+    lengths = np.fromiter(map(len, urls), dtype=np.int64, count=n)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    # One byte per character; non-ASCII characters become NUL, which sends
+    # their rows to the scalar fallback below.
+    buf = np.frombuffer("".join(urls).encode("ascii", "features.nul"), dtype=np.uint8)
+    size = len(buf)
+
+    out = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float64)
+    out[:, 0] = lengths
+
+    # '.', '-', '@', '?' and '=' counts in a single pass over the buffer
+    codes = _COUNTED_CHARS[buf]
+    positions = np.flatnonzero(codes)
+    rows = np.searchsorted(ends, positions, side="right")
+    counts = np.bincount(rows * 6 + codes[positions], minlength=n * 6).reshape(n, 6)
+    out[:, 1:6] = counts[:, 1:]
+    dots = positions[codes[positions] == 1]
+
+    # 'http' substring, without matching across two concatenated URLs
+    if size >= 4:
+        http = (buf[:-3] == ord("h")) & (buf[1:-2] == ord("t")) & (buf[2:-1] == ord("t")) & (buf[3:] == ord("p"))
+        out[:, 6] = _window_counts(http, starts, ends - 3) > 0
+
+    # Rows urlparse or \d may treat differently from plain ASCII: non-ASCII
+    # text, whitespace/control characters (stripped by urlparse) and IPv6
+    # brackets. They are rare, so those rows go through the scalar path.
+    special = (buf <= 0x20) | (buf == ord("[")) | (buf == ord("]"))
+    fallback = _window_counts(special, starts, ends) > 0
+
+    # IP presence: three consecutive digit runs each followed by '.' and
+    # another digit run within the same URL.
+    row_start = np.zeros(size + 1, dtype=bool)
+    row_start[starts] = True
+    digit = (buf >= ord("0")) & (buf <= ord("9"))
+    prev_digit = np.concatenate(([False], digit[:-1])) & ~row_start[:-1]
+    next_start = np.concatenate((row_start[1:-1], [True])) if size else row_start[:0]
+    next_digit = np.concatenate((digit[1:], [False])) & ~next_start
+    run_starts = np.flatnonzero(digit & ~prev_digit)
+    run_ends = np.flatnonzero(digit & ~next_digit) + 1
+    if len(run_starts) >= 3:
+        row_of_run = np.searchsorted(ends, run_starts, side="right")
+        row_end = ends[row_of_run]
+        after = np.minimum(run_ends, size - 1)
+        after_next = np.minimum(run_ends + 1, size - 1)
+        linked = (run_ends + 1 < row_end) & (buf[after] == ord(".")) & digit[after_next]
+        ip_runs = np.flatnonzero(linked[:-2] & linked[1:-1] & linked[2:])
+        out[row_of_run[ip_runs], 7] = 1
+
+    # Netloc: optional "scheme:" (first ':' preceded only by scheme chars,
+    # starting with a letter) followed by '//', up to the first '/', '?' or '#'.
+    colons = np.flatnonzero(buf == ord(":"))
+    first_colon = _first_at_or_after(colons, starts, ends)
+    is_scheme_char = _SCHEME_CHARS[buf]
+    first_char = buf[np.minimum(starts, size - 1)] if size else starts
+    first_alpha = ((first_char | 0x20) >= ord("a")) & ((first_char | 0x20) <= ord("z"))
+    has_scheme = (
+        (first_colon < ends) & (first_colon > starts) & first_alpha
+        & (_window_counts(~is_scheme_char, starts, first_colon) == 0)
+    )
+    rest = np.where(has_scheme, first_colon + 1, starts)
+    slashes = (rest + 1 < ends)
+    if size:
+        slashes &= (buf[np.minimum(rest, size - 1)] == ord("/")) & (buf[np.minimum(rest + 1, size - 1)] == ord("/"))
+    delims = np.flatnonzero((buf == ord("/")) | (buf == ord("?")) | (buf == ord("#")))
+    host_start = rest + 2
+    host_end = _first_at_or_after(delims, host_start, ends)
+    host_end = np.where(slashes, host_end, host_start)
+    host_dots = np.searchsorted(dots, host_end) - np.searchsorted(dots, host_start)
+    out[:, 8] = np.where(slashes, host_dots, 0)
+    out[:, 9] = np.where(slashes, host_end - host_start, 0)
+
+    for i in np.flatnonzero(fallback):
+        out[i] = extract_features(urls[i])
+    return out
+
+
+def extract_features_batch(urls, chunk_size=CHUNK_SIZE):
+    """Feature matrix (float64, one row per URL) for a list, array or pandas Series of URLs."""
+    urls = list(urls)
+    if len(urls) < SMALL_BATCH:
+        return np.array([extract_features(url) for url in urls], dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+    out = np.empty((len(urls), len(FEATURE_NAMES)), dtype=np.float64)
+    for start in range(0, len(urls), chunk_size):
+        out[start:start + chunk_size] = _extract_chunk(urls[start:start + chunk_size])
+    return out
+
+
+# ✅ Benchmark against the per-URL loop: python features.py [num_urls]
+if __name__ == "__main__":
+    from synthetic_urls import generate_urls
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    urls, _ = generate_urls(n, seed=42)
+    print(f"🌍 Generated {n:,} synthetic URLs")
+
+    # The per-URL loop previously copied into train_model.py and predict.py
+    def legacy_extract_features(url):
+        return [
+            len(url), url.count('.'), url.count('-'), url.count('@'), url.count('?'), url.count('='),
+            int(bool(re.search(r'https?', url))),
+            int(bool(re.search(r'\d+\.\d+\.\d+\.\d+', url))),
+            urlparse(url).netloc.count('.'),
+            len(urlparse(url).netloc)
+        ]
+
+    start = time.perf_counter()
+    expected = np.array([legacy_extract_features(url) for url in urls], dtype=np.float64)
+    loop_time = time.perf_counter() - start
+    print(f"🐢 Per-URL loop: {loop_time:.2f}s ({n / loop_time:,.0f} URLs/s)")
+
+    start = time.perf_counter()
+    actual = extract_features_batch(urls)
+    batch_time = time.perf_counter() - start
+    print(f"🚀 Vectorized:   {batch_time:.2f}s ({n / batch_time:,.0f} URLs/s)")
+
+    mismatched = np.flatnonzero((expected != actual).any(axis=1))
+    print(f"✅ Speedup: {loop_time / batch_time:.1f}x, mismatched rows: {len(mismatched)}")
+    if len(mismatched):
+        print("❌ First mismatch:", urls[mismatched[0]], expected[mismatched[0]], actual[mismatched[0]])
+        sys.exit(1)
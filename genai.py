@@ -0,0 +1,256 @@
+"""GenAI explanations, generated off the request path.
+
+/analyze answers with the ML verdict straight away. It only starts the
+explanation, and ``GET /analyze/genai`` delivers it. That endpoint streams
+the text as server-sent events while it is generated, or returns JSON once
+it is done.
+
+- Providers are tried in GENAI_PROVIDERS order. The next one takes over
+  when a provider fails before producing any text.
+- Every explanation is bounded by GENAI_MAX_TOKENS and GENAI_TIME_BUDGET.
+  An explanation cut off by either is kept and marked truncated.
+- Concurrent requests for the same URL share one generation.
+- Finished explanations go into the verdict cache's "genai" layer. The key
+  is the URL, or just the site with GENAI_CACHE_KEY=domain, so a repeat hit
+  costs nothing.
+
+A provider is any object with ``name``, ``status`` and ``source``
+attributes and a ``stream(url, max_tokens, timeout)`` method yielding text,
+then TRUNCATED if ``max_tokens`` cut the text off.
+"stub" is a canned provider for tests and load tests.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import openai
+
+import upstream
+from providers import HF_API_KEY, HF_API_URL, huggingface_prompt, openai_messages
+from upstream import UPSTREAMS, UpstreamError
+
+GENAI_PROVIDERS = os.getenv("GENAI_PROVIDERS", "openai,huggingface")
+# Completion tokens per explanation (the stub counts words)
+GENAI_MAX_TOKENS = int(os.getenv("GENAI_MAX_TOKENS", 400))
+# Seconds from the start of a generation until whatever text exists is final
+GENAI_TIME_BUDGET = float(os.getenv("GENAI_TIME_BUDGET", 20.0))
+# "url" or "domain"
+GENAI_CACHE_KEY = os.getenv("GENAI_CACHE_KEY", "url")
+# Generations running at once per process
+GENAI_WORKERS = int(os.getenv("GENAI_WORKERS", 8))
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+# Yielded by a provider's stream after the last text when the token cap was hit
+TRUNCATED = object()
+
+
+class OpenAIProvider:
+    name = "openai"
+    status = "openai_success"
+    source = "OpenAI"
+
+    def stream(self, url, max_tokens, timeout):
+        # The read timeout applies between streamed chunks, not to the whole answer
+        chunks = openai.ChatCompletion.create(model=OPENAI_MODEL, messages=openai_messages(url),
+                                              max_tokens=max_tokens, stream=True,
+                                              request_timeout=(upstream.CONNECT_TIMEOUT, timeout))
+        for chunk in chunks:
+            choice = chunk["choices"][0]
+            text = choice.get("delta", {}).get("content")
+            if text:
+                yield text
+            if choice.get("finish_reason") == "length":
+                yield TRUNCATED
+
+
+class HuggingFaceProvider:
+    name = "huggingface"
+    status = "huggingface_fallback"
+    source = "Hugging Face (Fallback)"
+
+    def stream(self, url, max_tokens, timeout):
+        response = UPSTREAMS["huggingface"].post(
+            HF_API_URL,
+            headers={"Authorization": f"Bearer {HF_API_KEY}", "Content-Type": "application/json"},
+            json={"inputs": huggingface_prompt(url), "parameters": {"max_new_tokens": max_tokens}},
+            timeout=(upstream.CONNECT_TIMEOUT, timeout),
+        )
+        if response.status_code != 200:
+            raise UpstreamError("Hugging Face API error.")
+        yield response.json()[0].get("generated_text", "").strip()
+
+
+class StubProvider:
+    """Canned explanation streamed a word at a time; no network."""
+    name = "stub"
+    status = "stub_success"
+    source = "Stub"
+
+    def __init__(self, text=None, delay=float(os.getenv("GENAI_STUB_DELAY", 0.01)), error=None):
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def stream(self, url, max_tokens, timeout):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        words = (self.text or f"No obvious threat indicators found in {url}.").split(" ")
+        for i, word in enumerate(words[:max_tokens]):
+            time.sleep(self.delay)
+            yield word if i == 0 else " " + word
+        if len(words) > max_tokens:
+            yield TRUNCATED
+
+
+PROVIDER_TYPES = {
+    "openai": OpenAIProvider,
+    "huggingface": HuggingFaceProvider,
+    "stub": StubProvider,
+}
+
+
+def providers_from_env(names=GENAI_PROVIDERS):
+    return [PROVIDER_TYPES[name.strip()]() for name in names.split(",") if name.strip()]
+
+
+def sse(event, data):
+    """One server-sent event carrying ``data`` as JSON."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Generation:
+    """One explanation being generated; any number of readers can follow it."""
+
+    def __init__(self, url):
+        self.url = url
+        self.chunks = []
+        self.result = None
+        self._cond = threading.Condition()
+
+    def add(self, text):
+        with self._cond:
+            self.chunks.append(text)
+            self._cond.notify_all()
+
+    def finish(self, result):
+        with self._cond:
+            self.result = result
+            self._cond.notify_all()
+
+    def read(self, position, timeout=None):
+        """``(chunks after position, result)``, waiting up to ``timeout`` while there is neither."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.chunks) > position or self.result is not None, timeout)
+            return self.chunks[position:], self.result
+
+    def follow(self, timeout=None):
+        """Yield the text from the start as it arrives, until the generation finishes."""
+        position = 0
+        while True:
+            chunks, result = self.read(position, timeout)
+            if not chunks and result is None:
+                return
+            position += len(chunks)
+            yield from chunks
+            if result is not None and position == len(self.chunks):
+                return
+
+    def wait(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self.result is not None, timeout)
+            return self.result
+
+
+class Explainer:
+    """Generates explanations in the background and caches them in ``cache`` under ``layer``."""
+
+    def __init__(self, cache, providers=None, max_tokens=GENAI_MAX_TOKENS, time_budget=GENAI_TIME_BUDGET,
+                 cache_key=GENAI_CACHE_KEY, layer="genai", workers=GENAI_WORKERS):
+        self.cache = cache
+        self.providers = providers_from_env() if providers is None else providers
+        self.max_tokens = max_tokens
+        self.time_budget = time_budget
+        self.by_domain = cache_key == "domain"
+        self.layer = layer
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="genai")
+        self.hits = 0
+        self.started = 0
+        self.joined = 0
+
+    def key(self, url):
+        if not self.by_domain:
+            return url
+        parts = urlsplit(url if "://" in url else "http://" + url)
+        return f"{parts.scheme}://{parts.hostname or ''}/"
+
+    def start(self, url):
+        """``(explanation, None)`` from the cache, or ``(None, generation)`` with it running."""
+        key = self.key(url)
+        explanation = self.cache.get(self.layer, key)
+        with self._lock:
+            if explanation is not None:
+                self.hits += 1
+                return explanation, None
+            generation = self._inflight.get(key)
+            if generation is not None:
+                self.joined += 1
+                return None, generation
+            generation = self._inflight[key] = Generation(url)
+            self.started += 1
+        self._executor.submit(self._run, key, generation)
+        return None, generation
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "started": self.started, "joined": self.joined,
+                    "in_flight": len(self._inflight)}
+
+    def _run(self, key, generation):
+        try:
+            explanation = self._generate(generation)
+        except Exception as e:
+            explanation = {"text": f"GenAI analysis failed: {e}", "status": "genai_error",
+                           "source": None, "truncated": False}
+        if explanation["source"] is not None:
+            self.cache.set(self.layer, key, explanation)
+        with self._lock:
+            self._inflight.pop(key, None)
+        generation.finish(explanation)
+
+    def _generate(self, generation):
+        deadline = time.monotonic() + self.time_budget
+        error, failed = None, None
+        for provider in self.providers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            truncated = False
+            try:
+                for text in provider.stream(generation.url, self.max_tokens, remaining):
+                    if text is TRUNCATED:
+                        truncated = True
+                        continue
+                    generation.add(text)
+                    if time.monotonic() >= deadline:
+                        truncated = True
+                        break
+            except Exception as e:
+                if not generation.chunks:
+                    error, failed = e, provider
+                    continue
+                # Keep what arrived before the stream broke
+                truncated = True
+            return {"text": "".join(generation.chunks), "status": provider.status,
+                    "source": provider.source, "truncated": truncated}
+
+        if time.monotonic() >= deadline:
+            return {"text": "GenAI analysis timed out.", "status": "genai_timeout", "source": None, "truncated": False}
+        return {"text": f"GenAI analysis failed: {error}", "status": f"{failed.name}_error" if failed else "genai_error",
+                "source": None, "truncated": False}
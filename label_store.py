@@ -0,0 +1,162 @@
+"""Append-only store of labeled URLs, backed by SQLite.
+
+Every ingested label that changes what we know about a URL is appended to
+``observations`` with an increasing sequence number; nothing is rewritten.
+``current`` holds the latest label per URL, keyed on a 64-bit hash of the
+URL, and is the persistent index that lets an ingest touch only the rows
+of the new feed. When a URL is labeled twice, the observation with the
+newer ``observed_at`` wins (ties go to the later ingest).
+
+Training reads a snapshot inside one read transaction. With WAL mode that
+is a consistent view even while another process is ingesting.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+DB_PATH = os.getenv("LABEL_STORE_DB", "labels.db")
+
+# Feed "type" values counted as malicious (label 1); anything else is safe
+MALICIOUS_TYPES = ("phishing", "malware", "defacement")
+
+INGEST_CHUNK_SIZE = 100_000
+
+
+def url_hash(url):
+    """Signed 64-bit BLAKE2b hash of ``url``, the key of the ``current`` table."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8", "surrogatepass"), digest_size=8).digest(),
+                          "little", signed=True)
+
+
+def feed_labels(chunk):
+    """0/1 labels for a feed chunk with either a ``label`` or a ``type`` column."""
+    if "label" in chunk.columns:
+        return chunk["label"].astype(int)
+    return chunk["type"].isin(MALICIOUS_TYPES).astype(int)
+
+
+class LabelStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, url_hash INTEGER NOT NULL, url TEXT NOT NULL, "
+            "label INTEGER NOT NULL, source TEXT NOT NULL, observed_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS current ("
+            "url_hash INTEGER PRIMARY KEY, url TEXT NOT NULL, label INTEGER NOT NULL, "
+            "seq INTEGER NOT NULL, observed_at REAL NOT NULL);"
+        )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM current").fetchone()[0]
+
+    def version(self):
+        """Sequence number of the latest observation; identifies a snapshot."""
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM observations").fetchone()[0]
+
+    def ingest(self, urls, labels, source, observed_at=None):
+        """Merge one batch of labeled URLs; returns ``(new_urls, relabeled)``.
+
+        Only URLs that are new, or whose label differs from a not-newer
+        current label, are written. A repeated label writes nothing but
+        still moves the URL's ``observed_at`` forward, so an older
+        conflicting label arriving later cannot override it.
+        """
+        observed_at = time.time() if observed_at is None else observed_at
+        rows = [(url_hash(url), url, int(label)) for url, label in zip(urls, labels)]
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS staging ("
+                         "url_hash INTEGER PRIMARY KEY, url TEXT NOT NULL, label INTEGER NOT NULL)")
+            conn.execute("DELETE FROM staging")
+            # Within one batch the last occurrence of a URL wins, like drop_duplicates(keep="last")
+            conn.executemany("INSERT OR REPLACE INTO staging VALUES (?, ?, ?)", rows)
+            start_seq = self.version()
+            new_urls = conn.execute(
+                "SELECT COUNT(*) FROM staging s LEFT JOIN current c USING (url_hash) WHERE c.url_hash IS NULL"
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO observations (url_hash, url, label, source, observed_at) "
+                "SELECT s.url_hash, s.url, s.label, ?, ? FROM staging s LEFT JOIN current c USING (url_hash) "
+                "WHERE c.url_hash IS NULL OR (s.label != c.label AND ? >= c.observed_at)",
+                (source, observed_at, observed_at),
+            )
+            conn.execute(
+                "INSERT INTO current (url_hash, url, label, seq, observed_at) "
+                "SELECT url_hash, url, label, seq, observed_at FROM observations WHERE seq > ? "
+                "ON CONFLICT (url_hash) DO UPDATE SET "
+                "label = excluded.label, seq = excluded.seq, observed_at = excluded.observed_at",
+                (start_seq,),
+            )
+            conn.execute(
+                "UPDATE current SET observed_at = MAX(observed_at, ?) WHERE seq <= ? AND url_hash IN "
+                "(SELECT s.url_hash FROM staging s JOIN current c USING (url_hash) WHERE s.label = c.label)",
+                (observed_at, start_seq),
+            )
+            written = self.version() - start_seq
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return new_urls, written - new_urls
+
+    def ingest_csv(self, csv_path, source=None, observed_at=None, chunksize=INGEST_CHUNK_SIZE):
+        """Stream a feed CSV (``url`` plus ``label`` or ``type``) into the store."""
+        source = source or os.path.basename(csv_path)
+        observed_at = time.time() if observed_at is None else observed_at
+        new_urls = relabeled = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.dropna(subset=["url"])
+            added, changed = self.ingest(chunk["url"].astype(str), feed_labels(chunk), source, observed_at)
+            new_urls += added
+            relabeled += changed
+        return new_urls, relabeled
+
+    def snapshot(self):
+        """``(urls, labels, version)`` of the current labels as one consistent view, in URL order."""
+        conn = self.conn
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute("SELECT url, label FROM current ORDER BY url_hash").fetchall()
+            version = self.version()
+        finally:
+            conn.execute("COMMIT")
+        urls = [url for url, _ in rows]
+        labels = np.fromiter((label for _, label in rows), dtype=np.int64, count=len(rows))
+        return urls, labels, version
+
+    def export_csv(self, csv_path, chunksize=INGEST_CHUNK_SIZE):
+        """Write a snapshot as ``url,label`` CSV (atomically replacing ``csv_path``).
+
+        Rows are streamed ``chunksize`` at a time, so the export does not
+        hold the store in memory.
+        """
+        tmp_path = csv_path + ".tmp"
+        conn = self.conn
+        conn.execute("BEGIN")
+        try:
+            version = self.version()
+            cursor = conn.execute("SELECT url, label FROM current ORDER BY url_hash")
+            header = True
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows and not header:
+                    break
+                pd.DataFrame(rows, columns=["url", "label"]).to_csv(tmp_path, index=False, header=header,
+                                                                    mode="w" if header else "a")
+                header = False
+        finally:
+            conn.execute("COMMIT")
+        os.replace(tmp_path, csv_path)
+        return version
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,187 @@
+"""Load test the sync (Flask) and async (aiohttp) deployments of /analyze.
+
+Starts stub upstreams that answer like Safe Browsing, VirusTotal and OpenAI
+after a fixed delay, runs each deployment under gunicorn pointed at them,
+and drives both with the same number of concurrent clients. Every request
+uses a new URL so the verdict cache never answers for the upstreams.
+
+    python loadtest.py --concurrency 64 --duration 20
+
+Run it from a directory holding the model bundle (or legacy pickles).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_stub(port, gsb_ms, vt_ms, openai_ms):
+    """Upstream stand-ins answering with the shapes providers.py reads."""
+    async def delayed(ms, body):
+        await asyncio.sleep(ms / 1000)
+        return web.json_response(body)
+
+    async def safe_browsing(request):
+        return await delayed(gsb_ms, {})
+
+    async def vt_submit(request):
+        return await delayed(vt_ms, {"data": {"id": "stub-analysis"}})
+
+    async def vt_report(request):
+        return await delayed(vt_ms, {"data": {"attributes": {"stats": {"malicious": 0}}}})
+
+    async def chat(request):
+        if not (await request.json()).get("stream"):
+            return await delayed(openai_ms, {
+                "id": "stub", "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "No obvious threat."}}],
+            })
+        # Streamed completions: the same total delay, spread over the chunks
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = ["No", " obvious", " threat."]
+        for word in words:
+            await asyncio.sleep(openai_ms / 1000 / len(words))
+            chunk = {"id": "stub", "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    stub = web.Application()
+    stub.router.add_post("/gsb", safe_browsing)
+    stub.router.add_post("/vt/urls", vt_submit)
+    stub.router.add_get("/vt/analyses/{id}", vt_report)
+    stub.router.add_post("/openai/chat/completions", chat)
+    web.run_app(stub, port=port, print=None, access_log=None)
+
+
+def deployments(args):
+    gunicorn = [sys.executable, "-m", "gunicorn", "--preload", "--timeout", "60"]
+    return {
+        "sync": gunicorn + ["-w", str(args.sync_workers), "app:app"],
+        "async": gunicorn + ["-w", str(args.async_workers), "-k", "aiohttp.GunicornWebWorker", "async_app:app"],
+    }
+
+
+async def wait_until_up(base, timeout=180):
+    started = time.monotonic()
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() - started < timeout:
+            try:
+                async with session.get(base + "/") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {base} did not come up within {timeout}s")
+
+
+async def drive(base, name, concurrency, duration, warmup):
+    """Post unique URLs from ``concurrency`` clients; latencies and errors of requests finishing in the window."""
+    latencies, errors = [], 0
+    start = time.monotonic()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+
+    async def client(session, n):
+        nonlocal errors
+        i = 0
+        while time.monotonic() < stop_at:
+            sent = time.monotonic()
+            url = f"http://{name}-{n}-{i}.loadtest.example/login?session={i}"
+            try:
+                async with session.post(base + "/analyze", json={"url": url}) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            done = time.monotonic()
+            if measure_from <= done <= stop_at:
+                if ok:
+                    latencies.append(done - sent)
+                else:
+                    errors += 1
+            i += 1
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(client(session, n) for n in range(concurrency)))
+    return np.array(latencies), errors
+
+
+def run(name, command, args, env):
+    base = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(command + ["-b", f"127.0.0.1:{args.port}"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_until_up(base))
+        print(f"🚀 {name}: {' '.join(command[2:])}")
+        latencies, errors = asyncio.run(drive(base, name, args.concurrency, args.duration, args.warmup))
+    finally:
+        server.terminate()
+        server.wait()
+    if not len(latencies):
+        return {"rps": 0.0, "p50": float("nan"), "p99": float("nan"), "errors": errors}
+    return {
+        "rps": len(latencies) / args.duration,
+        "p50": np.percentile(latencies, 50) * 1000,
+        "p99": np.percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per deployment")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--async-workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-port", type=int, default=8099)
+    parser.add_argument("--gsb-ms", type=float, default=50)
+    parser.add_argument("--vt-ms", type=float, default=150, help="per VirusTotal call (two per lookup)")
+    parser.add_argument("--openai-ms", type=float, default=800)
+    parser.add_argument("--only", choices=["sync", "async"])
+    args = parser.parse_args()
+
+    stub_base = f"http://127.0.0.1:{args.stub_port}"
+    stub = multiprocessing.Process(target=run_stub, daemon=True,
+                                   args=(args.stub_port, args.gsb_ms, args.vt_ms, args.openai_ms))
+    stub.start()
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])),
+        GSB_API_URL=f"{stub_base}/gsb",
+        VT_API_URL=f"{stub_base}/vt",
+        OPENAI_API_BASE=f"{stub_base}/openai",
+        OPENAI_API_KEY="stub",
+        GOOGLE_API_KEY="stub",
+        VIRUSTOTAL_API_KEY="stub",
+    )
+
+    results = {}
+    try:
+        for name, command in deployments(args).items():
+            if args.only in (None, name):
+                results[name] = run(name, command, args, env)
+    finally:
+        stub.terminate()
+
+    print(f"\n📊 {args.concurrency} concurrent clients, {args.duration:g}s each, upstream delays "
+          f"GSB {args.gsb_ms:g}ms / VT 2x{args.vt_ms:g}ms / OpenAI {args.openai_ms:g}ms")
+    print(f"{'deployment':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['rps']:>10.1f}{r['p50']:>10.0f}{r['p99']:>10.0f}{r['errors']:>8}")
@@ -0,0 +1,372 @@
+"""Local Safe Browsing threat lists (Update API v4 model).
+
+update_safe_browsing.py keeps hash-prefix copies of the Safe Browsing lists
+on disk in SAFE_BROWSING_DB. A URL is checked like this:
+
+1. canonicalize the URL and expand it into host-suffix/path-prefix
+   expressions (up to 30)
+2. SHA-256 each expression and look its first 4 bytes up in each list's
+   sorted uint32 array, which is memory-mapped (a binary search per list)
+3. only when a prefix matches, ask ``fullHashes:find`` to confirm
+
+Almost every URL stops at step 2, with no network call. The arrays are
+rewritten and swapped in by the updater, and readers pick up a new
+state.json on their next check.
+
+Layout of SAFE_BROWSING_DB:
+
+- state.json: per list the client state, array files, prefix count and
+  the time it last verified. ``updated`` at the top is the oldest of those
+  over THREAT_LISTS, 0 while any of them has never verified, so the store
+  only counts as fresh when every list is.
+- <list>.<n>.npy: the first 4 bytes of every prefix as uint32, in the
+  API's lexicographic order. Duplicates are kept so the API's removal
+  indices stay valid.
+- <list>.<n>.long.npz: the lists also hold some longer prefixes (5 to 32
+  bytes). Their positions and full bytes are kept here, so the checksum
+  covers the real prefixes and a 4-byte hit on a long prefix only counts
+  when the whole prefix matches.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+DB_DIR = os.getenv("SAFE_BROWSING_DB", "")
+# Local lists older than this are not trusted; checks fall back to threatMatches:find
+MAX_AGE = float(os.getenv("SAFE_BROWSING_MAX_AGE", 2 * 3600))
+# Seconds between checks for a newer state.json written by the updater
+RELOAD_INTERVAL = float(os.getenv("SAFE_BROWSING_RELOAD_INTERVAL", 5))
+
+FULL_HASHES_URL = os.getenv("GSB_FULL_HASHES_URL", "https://safebrowsing.googleapis.com/v4/fullHashes:find")
+UPDATE_URL = os.getenv("GSB_UPDATE_URL", "https://safebrowsing.googleapis.com/v4/threatListUpdates:fetch")
+
+CLIENT = {"clientId": "your-client-id", "clientVersion": "1.0"}
+THREAT_LISTS = [
+    ("MALWARE", "ANY_PLATFORM", "URL"),
+    ("SOCIAL_ENGINEERING", "ANY_PLATFORM", "URL"),
+]
+PREFIX_SIZE = 4
+
+_ESCAPE = re.compile(rb"%([0-9A-Fa-f]{2})")
+_UNSAFE = re.compile(rb"[\x00-\x20\x7f-\xff#%]")
+_PORT = re.compile(rb":\d*$")
+
+
+def list_name(threat_type, platform_type, entry_type):
+    return f"{threat_type}/{platform_type}/{entry_type}"
+
+
+# -- canonicalization ------------------------------------------------------
+
+def _unescape(value):
+    """Percent-unescape repeatedly until nothing changes."""
+    while b"%" in value:
+        unescaped = _ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), value)
+        if unescaped == value:
+            return value
+        value = unescaped
+    return value
+
+
+def _escape(value):
+    return _UNSAFE.sub(lambda m: b"%%%02X" % m.group()[0], value)
+
+
+def _parse_ip(host):
+    """Dotted-quad form of an inet_aton-style IPv4 host (octal, hex, short forms), or None."""
+    parts = host.split(b".")
+    if not 1 <= len(parts) <= 4:
+        return None
+    numbers = []
+    for part in parts:
+        try:
+            if part[:2].lower() == b"0x":
+                numbers.append(int(part[2:] or b"0", 16))
+            elif len(part) > 1 and part.startswith(b"0"):
+                numbers.append(int(part, 8))
+            else:
+                numbers.append(int(part, 10))
+        except ValueError:
+            return None
+    # The last part fills whatever bytes the earlier ones did not
+    tail_bytes = 5 - len(numbers)
+    if any(n > 255 for n in numbers[:-1]) or numbers[-1] >= 256 ** tail_bytes:
+        return None
+    value = 0
+    for n in numbers[:-1]:
+        value = value << 8 | n
+    value = value << 8 * tail_bytes | numbers[-1]
+    return b".".join(str(value >> shift & 255).encode() for shift in (24, 16, 8, 0))
+
+
+def _canonical_path(path):
+    segments = []
+    for segment in path.split(b"/"):
+        if segment in (b"", b"."):
+            continue
+        if segment == b"..":
+            if segments:
+                segments.pop()
+            continue
+        segments.append(segment)
+    canonical = b"/" + b"/".join(segments)
+    if segments and path.endswith((b"/", b"/.", b"/..")):
+        canonical += b"/"
+    return canonical
+
+
+def split_url(url):
+    """``(scheme, host, path, query)`` of the canonical form of ``url`` (str or bytes).
+
+    ``query`` is None when the URL has no "?" at all. Follows the Safe
+    Browsing canonicalization rules: strip tab/CR/LF and the fragment,
+    unescape fully, normalize the host (dots, case, IP forms) and the path
+    (dot segments, repeated slashes), then escape again.
+    """
+    if isinstance(url, str):
+        url = url.encode("utf-8")
+    url = url.strip(b" ").translate(None, b"\t\r\n")
+    url = url.split(b"#", 1)[0]
+    url = _unescape(url)
+
+    scheme, sep, rest = url.partition(b"://")
+    if not sep:
+        scheme, rest = b"http", url
+    rest, _, query = rest.partition(b"?") if b"?" in rest else (rest, None, None)
+    host, slash, path = rest.partition(b"/")
+    host = _PORT.sub(b"", host.rpartition(b"@")[2])
+    host = re.sub(rb"\.\.+", b".", host.strip(b".")).lower()
+    host = _parse_ip(host) or host
+
+    return (
+        scheme.lower().decode("latin-1"),
+        _escape(host).decode("ascii"),
+        _escape(_canonical_path(slash + path)).decode("ascii"),
+        _escape(query).decode("ascii") if query is not None else None,
+    )
+
+
+def canonicalize(url):
+    scheme, host, path, query = split_url(url)
+    return f"{scheme}://{host}{path}" + (f"?{query}" if query is not None else "")
+
+
+def expressions(url):
+    """The host-suffix/path-prefix expressions Safe Browsing checks for ``url``, most specific first."""
+    _, host, path, query = split_url(url)
+    hosts = [host]
+    if _parse_ip(host.encode()) is None:
+        components = host.split(".")[-5:]
+        hosts += [".".join(components[i:]) for i in range(len(components) - 1) if ".".join(components[i:]) != host]
+    hosts = hosts[:5]
+
+    paths = [path + f"?{query}"] if query is not None else []
+    paths.append(path)
+    directories = path.split("/")[1:-1]
+    paths += ["/" + "".join(f"{d}/" for d in directories[:i]) for i in range(min(len(directories), 3) + 1)]
+    paths = list(dict.fromkeys(paths))[:6]
+
+    return [h + p for h in hosts for p in paths]
+
+
+def full_hash(expression):
+    return hashlib.sha256(expression.encode("ascii")).digest()
+
+
+def prefix_keys(hashes):
+    return np.array([int.from_bytes(h[:PREFIX_SIZE], "big") for h in hashes], dtype=np.uint32)
+
+
+def prefixes_from_raw(raw, prefix_size):
+    """``(keys, full)`` from an API ``rawHashes`` blob: uint32 keys of each prefix's first
+    4 bytes, and the prefixes themselves as bytes when they are longer (else None)."""
+    rows = np.frombuffer(raw, dtype=np.uint8).reshape(-1, prefix_size)
+    keys = np.ascontiguousarray(rows[:, :PREFIX_SIZE]).view(">u4").ravel().astype(np.uint32)
+    return keys, [row.tobytes() for row in rows] if prefix_size > PREFIX_SIZE else None
+
+
+def checksum(prefixes, long=None):
+    """Update API checksum: SHA-256 over the sorted raw prefixes.
+
+    ``prefixes`` holds the 4-byte keys; ``long`` maps positions to the full
+    bytes of the longer prefixes there.
+    """
+    digest = hashlib.sha256()
+    start = 0
+    for position in sorted(long or {}):
+        digest.update(prefixes[start:position].astype(">u4").tobytes())
+        digest.update(long[position])
+        start = position + 1
+    digest.update(prefixes[start:].astype(">u4").tobytes())
+    return base64.b64encode(digest.digest()).decode()
+
+
+# -- on-disk store ---------------------------------------------------------
+
+def read_state(root):
+    try:
+        with open(os.path.join(root, "state.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"updated": 0, "lists": {}}
+
+
+def write_lists(root, state, arrays):
+    """Write ``{name: (prefixes, long)}`` for the lists that verified and switch state.json to them atomically."""
+    os.makedirs(root, exist_ok=True)
+    now = time.time()
+    old_files = []
+    for name, (prefixes, long) in arrays.items():
+        entry = state["lists"].setdefault(name, {"state": ""})
+        generation = entry.get("generation", 0) + 1
+        base = f"{name.replace('/', '-')}.{generation}"
+        np.save(os.path.join(root, f"{base}.npy"), np.asarray(prefixes, dtype=np.uint32))
+        long_file = None
+        if long:
+            long_file = f"{base}.long.npz"
+            positions = sorted(long)
+            np.savez(os.path.join(root, long_file), positions=np.array(positions, dtype=np.int64),
+                     lengths=np.array([len(long[p]) for p in positions], dtype=np.uint8),
+                     data=np.frombuffer(b"".join(long[p] for p in positions), dtype=np.uint8))
+        old_files += [entry[key] for key in ("file", "long_file") if entry.get(key)]
+        entry.update(file=f"{base}.npy", long_file=long_file, generation=generation, count=int(len(prefixes)),
+                     updated=now)
+    state["updated"] = min(state["lists"].get(list_name(*spec), {}).get("updated", 0) for spec in THREAT_LISTS)
+    tmp = os.path.join(root, f"state.json.tmp{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, os.path.join(root, "state.json"))
+    # Readers that still map an old file keep it until they reload
+    for filename in old_files:
+        try:
+            os.remove(os.path.join(root, filename))
+        except FileNotFoundError:
+            pass
+
+
+def load_prefixes(root, entry, mmap_mode="r"):
+    if not entry.get("file"):
+        return np.empty(0, dtype=np.uint32)
+    prefixes = np.load(os.path.join(root, entry["file"]), mmap_mode=mmap_mode)
+    # A plain ndarray view of the mapping skips np.memmap's per-operation overhead
+    return prefixes.view(np.ndarray)
+
+
+def load_long(root, entry):
+    """``{position: full prefix bytes}`` of the list's prefixes longer than 4 bytes."""
+    if not entry.get("long_file"):
+        return {}
+    with np.load(os.path.join(root, entry["long_file"])) as data:
+        ends = np.cumsum(data["lengths"], dtype=np.int64)
+        blob = data["data"].tobytes()
+        return {int(p): blob[end - length:end] for p, length, end in zip(data["positions"], data["lengths"], ends)}
+
+
+class PrefixStore:
+    """Read side of SAFE_BROWSING_DB: memory-mapped prefix arrays, reloaded when the updater swaps them."""
+
+    def __init__(self, root, max_age=MAX_AGE, reload_interval=RELOAD_INTERVAL):
+        self.root = root
+        self.max_age = max_age
+        self.reload_interval = reload_interval
+        self._stamp = None
+        self._checked = 0.0
+        self.state = {"updated": 0, "lists": {}}
+        self.lists = {}
+        self.long = {}
+        self.reload()
+
+    def reload(self):
+        path = os.path.join(self.root, "state.json")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        state = read_state(self.root)
+        self.lists = {name: load_prefixes(self.root, entry) for name, entry in state["lists"].items()}
+        self.long = {name: load_long(self.root, entry) for name, entry in state["lists"].items()}
+        self.state = state
+        self._stamp = stamp
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked >= self.reload_interval:
+            self._checked = now
+            self.reload()
+
+    @property
+    def fresh(self):
+        self._maybe_reload()
+        return bool(self.lists) and time.time() - self.state["updated"] <= self.max_age
+
+    def client_states(self):
+        return [entry["state"] for entry in self.state["lists"].values() if entry.get("state")]
+
+    def lookup(self, url):
+        """``{expression_full_hash: [list names]}`` for expressions whose prefix is listed."""
+        self._maybe_reload()
+        hashes = [full_hash(e) for e in expressions(url)]
+        keys = prefix_keys(hashes)
+        hits = {}
+        for name, prefixes in self.lists.items():
+            if not len(prefixes):
+                continue
+            index = np.searchsorted(prefixes, keys)
+            found = prefixes[np.minimum(index, len(prefixes) - 1)] == keys
+            long = self.long.get(name)
+            for i in np.flatnonzero(found):
+                if long and not self._matches(prefixes, long, index[i], keys[i], hashes[i]):
+                    continue
+                hits.setdefault(hashes[i], []).append(name)
+        return hits
+
+    @staticmethod
+    def _matches(prefixes, long, start, key, full):
+        """Whether a prefix from position ``start`` on, with 4-byte ``key``, is a prefix of hash ``full``."""
+        end = start + int(np.searchsorted(prefixes[start:], key, side="right"))
+        return any(position not in long or full.startswith(long[position]) for position in range(start, end))
+
+
+# -- remote confirmation ---------------------------------------------------
+
+def full_hashes_payload(hits, client_states):
+    """``fullHashes:find`` request for the prefixes behind ``hits``."""
+    prefixes = sorted({h[:PREFIX_SIZE] for h in hits})
+    names = sorted({name for lists in hits.values() for name in lists})
+    return {
+        "client": CLIENT,
+        "clientStates": client_states,
+        "threatInfo": {
+            "threatTypes": sorted({name.split("/")[0] for name in names}),
+            "platformTypes": sorted({name.split("/")[1] for name in names}),
+            "threatEntryTypes": sorted({name.split("/")[2] for name in names}),
+            "threatEntries": [{"hash": base64.b64encode(p).decode()} for p in prefixes],
+        },
+    }
+
+
+def confirmed(hits, response):
+    """True if the ``fullHashes:find`` response lists the full hash of one of our expressions."""
+    listed = {base64.b64decode(match["threat"]["hash"]) for match in response.get("matches", [])}
+    return any(h in listed for h in hits)
+
+
+_store = None
+
+
+def store():
+    """The process-wide store for SAFE_BROWSING_DB, or None when local lists are off or stale."""
+    global _store
+    if not DB_DIR:
+        return None
+    if _store is None:
+        _store = PrefixStore(DB_DIR)
+    return _store if _store.fresh else None
@@ -0,0 +1,233 @@
+"""Versioned model bundle: model, vocabulary and feature schema in one place.
+
+train_model.py writes each trained model as ``<root>/<version>/`` and then
+points ``<root>/CURRENT`` at it, so a reader never sees a half-written
+bundle and older versions stay around for rollback. A bundle holds:
+
+- manifest.json: version, feature schema, vectorizer settings, a SHA-256
+  per file and probe URLs with the probabilities the model gave them
+- model.pkl: the trained classifier (used for large batches)
+- vocabulary.json, idf.npy: the TF-IDF vocabulary and weights
+- trees/*.npy: the exported fast_inference.TreeEnsemble arrays, opened
+  memory-mapped so every worker on a host shares the same pages
+- cascade/: the optional stage-1 model of cascade.py (trees, calibration
+  curve; its band and probe scores are in the manifest)
+
+``load`` checks everything once, at startup: file checksums, that the
+schema matches features.FEATURE_NAMES and the vocabulary, and that the
+model and tree engine reproduce the probe probabilities. A mismatched set
+of files therefore fails at boot instead of at request time.
+"""
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import cascade as cascade_stage
+import fast_inference
+import url_vectorizer
+from features import FEATURE_NAMES, extract_features_batch
+
+BUNDLE_DIR = os.getenv("MODEL_BUNDLE", "model_bundle")
+
+FORMAT = 1
+
+# TfidfVectorizer settings carried in the manifest; anything callable
+# (custom tokenizer, preprocessor, analyzer) cannot be bundled
+VECTORIZER_PARAMS = ("lowercase", "strip_accents", "token_pattern", "ngram_range", "analyzer", "binary",
+                     "norm", "use_idf", "smooth_idf", "sublinear_tf", "max_features")
+
+PROBE_URLS = [
+    "https://www.google.com/",
+    "http://192.168.10.7:8080/secure/login.php?session=8f3k2",
+    "paypal.com.verify-account.xyz/webscr?cmd=_login",
+    "https://en.wikipedia.org/wiki/Main_Page",
+    "http://apple.com@signin-apple-id.top/confirm/billing",
+]
+PROBE_TOLERANCE = 1e-6
+
+
+class BundleError(ValueError):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    def __init__(self, model, vectorizer, feature_names, engine, manifest, cascade=None):
+        self.model = model
+        # Serving transforms URLs with the equivalent, faster UrlVectorizer
+        self.vectorizer = url_vectorizer.accelerate(vectorizer)
+        self.feature_names = feature_names
+        self.engine = engine
+        self.cascade = cascade
+        self.manifest = manifest
+        self.version = manifest["version"]
+
+    def transform(self, urls):
+        """CSR feature matrix for ``urls`` in the bundle's schema."""
+        return fast_inference.combine_features(extract_features_batch(urls), self.vectorizer.transform(urls))
+
+    def validate(self):
+        """Check the schema and that the model and engine reproduce the probe scores."""
+        manifest = self.manifest
+        if self.feature_names[:len(FEATURE_NAMES)] != FEATURE_NAMES:
+            raise BundleError(f"bundle {self.version}: numeric features differ from features.FEATURE_NAMES")
+        vocabulary = self.vectorizer.get_feature_names_out().tolist()
+        if self.feature_names[len(FEATURE_NAMES):] != vocabulary:
+            raise BundleError(f"bundle {self.version}: feature names do not match the vocabulary")
+        expected_width = getattr(self.model, "n_features_in_", len(self.feature_names))
+        if expected_width != len(self.feature_names):
+            raise BundleError(f"bundle {self.version}: model expects {expected_width} features, "
+                              f"schema has {len(self.feature_names)}")
+        if self.engine is not None and self.engine.num_features > len(self.feature_names):
+            raise BundleError(f"bundle {self.version}: tree engine uses features beyond the schema")
+
+        X = self.transform(manifest["probe"]["urls"])
+        expected = np.array(manifest["probe"]["proba"])
+        scorers = [("model", self.model)] + ([("engine", self.engine)] if self.engine is not None else [])
+        for name, scorer in scorers:
+            delta = np.abs(scorer.predict_proba(X)[:, 1] - expected).max()
+            if delta > PROBE_TOLERANCE:
+                raise BundleError(f"bundle {self.version}: {name} probe scores differ by {delta:.2e}")
+        if self.cascade is not None:
+            probs = self.cascade.stage_one(extract_features_batch(manifest["probe"]["urls"]))
+            delta = np.abs(probs - np.array(manifest["cascade"]["probe"])).max()
+            if delta > PROBE_TOLERANCE:
+                raise BundleError(f"bundle {self.version}: cascade probe scores differ by {delta:.2e}")
+        return self
+
+
+def save(model, vectorizer, feature_names, root=BUNDLE_DIR, cascade=None):
+    """Write a new bundle version under ``root`` and make it CURRENT. Returns its manifest.
+
+    ``cascade`` is an optional cascade.Cascade stored alongside the model.
+    """
+    params = vectorizer.get_params()
+    if any(callable(params[name]) for name in ("tokenizer", "preprocessor", "analyzer")):
+        raise BundleError("vectorizers with a custom tokenizer, preprocessor or analyzer cannot be bundled")
+    try:
+        engine = fast_inference.TreeEnsemble.from_model(model)
+    except (TypeError, ValueError) as e:
+        print(f"⚠ Bundle saved without fast inference trees: {e}")
+        engine = None
+
+    created = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    path = os.path.join(root, f"{created}.tmp{os.getpid()}")
+    os.makedirs(os.path.join(path, "trees"))
+    joblib.dump(model, os.path.join(path, "model.pkl"))
+    with open(os.path.join(path, "vocabulary.json"), "w") as f:
+        json.dump(vectorizer.get_feature_names_out().tolist(), f)
+    np.save(os.path.join(path, "idf.npy"), vectorizer.idf_)
+    if engine is not None:
+        for name in engine.ARRAYS:
+            np.save(os.path.join(path, "trees", f"{name}.npy"), getattr(engine, name))
+    if cascade is not None:
+        os.makedirs(os.path.join(path, "cascade", "trees"))
+        for name, array in cascade.arrays().items():
+            np.save(os.path.join(path, "cascade", f"{name}.npy"), array)
+
+    files = sorted(
+        os.path.relpath(os.path.join(folder, name), path)
+        for folder, _, names in os.walk(path) for name in names
+    )
+    checksums = {name: _sha256(os.path.join(path, name)) for name in files}
+    version = f"{created}-{hashlib.sha256(json.dumps(checksums, sort_keys=True).encode()).hexdigest()[:8]}"
+    X = fast_inference.combine_features(extract_features_batch(PROBE_URLS), vectorizer.transform(PROBE_URLS))
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "created": created,
+        "model_type": f"{type(model).__module__}.{type(model).__name__}",
+        "feature_names": list(feature_names),
+        "vectorizer": {name: params[name] for name in VECTORIZER_PARAMS},
+        "engine": engine.meta() if engine is not None else None,
+        "files": checksums,
+        "probe": {"urls": PROBE_URLS, "proba": model.predict_proba(X)[:, 1].tolist()},
+        "cascade": None if cascade is None else {
+            **cascade.meta(),
+            "probe": cascade.stage_one(extract_features_batch(PROBE_URLS)).tolist(),
+        },
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    os.replace(path, os.path.join(root, version))
+    current_tmp = os.path.join(root, f"CURRENT.tmp{os.getpid()}")
+    with open(current_tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(current_tmp, os.path.join(root, "CURRENT"))
+    return manifest
+
+
+def current_version(root=BUNDLE_DIR):
+    with open(os.path.join(root, "CURRENT")) as f:
+        return f.read().strip()
+
+
+def load(root=BUNDLE_DIR, version=None, mmap_mode="r"):
+    """Load and validate a bundle version (default: CURRENT)."""
+    path = os.path.join(root, version or current_version(root))
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"unreadable bundle manifest in {path}: {e}") from e
+    if manifest.get("format") != FORMAT:
+        raise BundleError(f"bundle {path} has format {manifest.get('format')}, expected {FORMAT}")
+    for name, checksum in manifest["files"].items():
+        if not os.path.exists(os.path.join(path, name)) or _sha256(os.path.join(path, name)) != checksum:
+            raise BundleError(f"bundle {manifest['version']}: {name} is missing or corrupt")
+
+    model = joblib.load(os.path.join(path, "model.pkl"))
+    with open(os.path.join(path, "vocabulary.json")) as f:
+        terms = json.load(f)
+    settings = dict(manifest["vectorizer"], ngram_range=tuple(manifest["vectorizer"]["ngram_range"]))
+    vectorizer = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(terms)}, **settings)
+    vectorizer.idf_ = np.load(os.path.join(path, "idf.npy"))
+    engine = None
+    if manifest["engine"] is not None:
+        arrays = {name: np.load(os.path.join(path, "trees", f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in fast_inference.TreeEnsemble.ARRAYS}
+        engine = fast_inference.TreeEnsemble(**arrays, **manifest["engine"])
+    cascade = None
+    if manifest.get("cascade") is not None:
+        names = [f"trees/{name}" for name in fast_inference.TreeEnsemble.ARRAYS] + list(cascade_stage.Cascade.ARRAYS)
+        arrays = {name: np.load(os.path.join(path, "cascade", f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+        cascade = cascade_stage.Cascade.from_arrays(arrays, manifest["cascade"])
+    return ModelBundle(model, vectorizer, manifest["feature_names"], engine, manifest, cascade).validate()
+
+
+def from_pickles(model_path="best_model.pkl", vectorizer_path="vectorizer.pkl",
+                 feature_names_path="feature_names.pkl"):
+    """Unbundled legacy pickles, checked the same way as a bundle (probe scores excepted)."""
+    model = joblib.load(model_path)
+    vectorizer = joblib.load(vectorizer_path)
+    feature_names = list(joblib.load(feature_names_path))
+    try:
+        engine = fast_inference.TreeEnsemble.from_model(model)
+    except (TypeError, ValueError) as e:
+        print(f"⚠ Fast inference disabled: {e}")
+        engine = None
+    X = fast_inference.combine_features(extract_features_batch(PROBE_URLS), vectorizer.transform(PROBE_URLS))
+    proba = model.predict_proba(X)[:, 1].tolist()
+    manifest = {"version": "legacy-pickles", "probe": {"urls": PROBE_URLS, "proba": proba}}
+    return ModelBundle(model, vectorizer, feature_names, engine, manifest).validate()
+
+
+def load_or_legacy(root=BUNDLE_DIR):
+    """The CURRENT bundle, or the three legacy pickles if no bundle has been written yet."""
+    if os.path.exists(os.path.join(root, "CURRENT")):
+        return load(root)
+    print(f"⚠ No model bundle in {root}; loading legacy pickles")
+    return from_pickles()
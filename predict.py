@@ -1,38 +1,63 @@
-import joblib
-import numpy as np
-from scipy.sparse import hstack
-from urllib.parse import urlparse
-import re
+"""Score URLs with the trained model.
+
+    python predict.py https://example.com/login          # one URL, with debug output
+    python predict.py --input proxy.log.gz --output scores.csv --workers 8
+
+Bulk mode streams URLs from files or stdin ("-"), gzipped or not, one per
+line. With --field, the URL is that whitespace-separated field of each
+log line. URLs are cut into chunks, and the chunks are spread over a process
+pool whose workers each load the model once. Scores are written in input
+order as CSV, JSONL or Parquet while the run goes on, and throughput and
+ETA are reported on stderr.
+
+After each written chunk the run saves a checkpoint next to the output
+(<output>.progress). --resume continues an interrupted run from that
+point, on the same inputs and chunk size.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
 import sys
+import time
 import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import extract_features, extract_features_batch
+import fast_inference
+import model_bundle
 
 # Suppress warnings (like the ones from LGBM and sklearn)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-# ✅ Load Model, Vectorizer, and Expected Feature Count
-try:
-    model = joblib.load("best_model.pkl")
-    vectorizer = joblib.load("vectorizer.pkl")
-    expected_features = len(joblib.load("feature_names.pkl"))  # ✅ Get the count of expected features
-    print("✅ Model, vectorizer, and feature count loaded successfully.")
-except Exception as e:
-    print(f"❌ ERROR: Failed to load necessary files - {e}")
-    sys.exit(1)
-
-# ✅ Extract Features (SAME as train_model.py)
-def extract_features(url):
-    return [
-        len(url),  # URL length
-        url.count('.'),  # Number of dots
-        url.count('-'),  # Number of hyphens
-        url.count('@'),  # Number of '@' symbols
-        url.count('?'),  # Number of query parameters
-        url.count('='),  # Number of '=' in URL
-        int(bool(re.search(r'https?', url))),  # HTTPS presence
-        int(bool(re.search(r'\d+\.\d+\.\d+\.\d+', url))),  # IP Address presence
-        urlparse(url).netloc.count('.'),  # Subdomain count
-        len(urlparse(url).netloc)  # Domain length
-    ]
+THRESHOLD = 0.9  # Adjust for sensitivity
+CHUNK_SIZE = 10_000
+# Rows per Parquet part file; a part is only checkpointed once it is closed
+PARQUET_PART_ROWS = 1_000_000
+PROGRESS_EVERY = 5.0
+
+model = None
+vectorizer = None
+
+
+def load_model(quiet=False):
+    """Load the model bundle (model, vectorizer and feature schema) into this process."""
+    global model, vectorizer
+    try:
+        bundle = model_bundle.load_or_legacy()
+    except Exception as e:
+        print(f"❌ ERROR: Failed to load the model bundle - {e}")
+        sys.exit(1)
+    model = bundle.model
+    vectorizer = bundle.vectorizer
+    if not quiet:
+        print(f"✅ Model bundle {bundle.version} loaded successfully ({len(bundle.feature_names)} features).")
+
 
 def predict_url(url):
     print(f"🌍 Checking URL: {url}")
@@ -47,42 +72,297 @@ def predict_url(url):
     print(f"🔢 Numeric Features Shape: {numeric_features.shape}")
     print(f"📊 TF-IDF Features Shape: {tfidf_features.shape}")
 
-    # ✅ Combine features
-    features_vectorized = hstack((numeric_features, tfidf_features))
-
-    # ✅ Debugging: Check the combined feature shape
-    actual_features = features_vectorized.shape[1]
-    print(f"✅ Model Expects Features: {expected_features}")
-    print(f"✅ Your Features Shape: {actual_features}")
-
-    # 🚨 Feature Mismatch Check
-    if actual_features != expected_features:
-        print(f"🔥 ERROR: Feature mismatch detected!")
-
-        # Print exact difference (expected_features is now an integer)
-        print(f"🔍 Difference: {actual_features - expected_features}")
-
-        # Debug Feature Matrix
-        print(f"🔍 Numeric Features Count: {numeric_features.shape[1]}")
-        print(f"🔍 TF-IDF Features Count: {tfidf_features.shape[1]}")
-        return None  # Stop execution if there's a mismatch
+    # ✅ Combine features (the bundle's schema was checked against the model at load)
+    features_vectorized = fast_inference.combine_features(numeric_features, tfidf_features)
 
     # ✅ AI Model Prediction
     prediction_prob = model.predict_proba(features_vectorized)[0][1]  # Probability of being malicious
 
-    threshold = 0.9  # Adjust for sensitivity
-
-    if prediction_prob > threshold:
+    if prediction_prob > THRESHOLD:
         print(f"🚨 Malicious! (Confidence: {prediction_prob:.2f})")
         return True
     else:
         print(f"✅ Safe. (Confidence: {prediction_prob:.2f})")
         return False
 
+
+def score_chunk(urls):
+    """Malicious probabilities for a chunk of URLs (runs in the pool workers)."""
+    features = fast_inference.combine_features(extract_features_batch(urls), vectorizer.transform(urls))
+    return model.predict_proba(features)[:, 1].astype(np.float32)
+
+
+# -- input -------------------------------------------------------------------
+
+class UrlReader:
+    """URLs from files (plain or gzip) or stdin, tracking how many raw bytes have been read."""
+
+    def __init__(self, paths, field=None):
+        self.paths = paths
+        self.field = field
+        self.done_bytes = 0
+        self._current = None
+        sizes = [os.path.getsize(p) for p in paths if p != "-"]
+        self.total_bytes = sum(sizes) if len(sizes) == len(paths) else None
+
+    @property
+    def bytes_read(self):
+        return self.done_bytes + (self._current.tell() if self._current is not None else 0)
+
+    def _open(self, path):
+        raw = sys.stdin.buffer if path == "-" else open(path, "rb")
+        if path != "-":
+            self._current = raw
+        stream = gzip.GzipFile(fileobj=raw) if raw.peek(2)[:2] == b"\x1f\x8b" else raw
+        return raw, io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+
+    def __iter__(self):
+        for path in self.paths:
+            raw, lines = self._open(path)
+            try:
+                for line in lines:
+                    if self.field is not None:
+                        fields = line.split()
+                        url = fields[self.field] if len(fields) > self.field else ""
+                    else:
+                        url = line.strip()
+                    if url:
+                        yield url
+            finally:
+                if path != "-":
+                    self.done_bytes += os.path.getsize(path)
+                    self._current = None
+                    raw.close()
+
+
+def chunked(urls, size, skip=0):
+    """Lists of ``size`` URLs, after skipping the first ``skip``."""
+    chunk = []
+    for i, url in enumerate(urls):
+        if i < skip:
+            continue
+        chunk.append(url)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -- output ------------------------------------------------------------------
+
+def output_format(path, requested=None):
+    if requested:
+        return requested
+    for fmt, ext in (("jsonl", ".jsonl"), ("jsonl", ".ndjson"), ("parquet", ".parquet")):
+        if path.rstrip("/").endswith(ext):
+            return fmt
+    return "csv"
+
+
+class TextWriter:
+    """CSV or JSONL, appended to; the checkpoint is the byte size after the last full chunk."""
+
+    def __init__(self, path, fmt, offset=0):
+        self.fmt = fmt
+        if path == "-":
+            self.file = sys.stdout
+        else:
+            self.file = open(path, "r+" if offset else "w", newline="", encoding="utf-8")
+            self.file.seek(offset)
+            self.file.truncate()
+        self.csv = csv.writer(self.file) if fmt == "csv" else None
+        if self.csv is not None and not offset:
+            self.csv.writerow(["url", "malicious_probability", "malicious"])
+        self.offset = offset
+
+    def write(self, urls, probs):
+        if self.csv is not None:
+            self.csv.writerows((url, f"{p:.6f}", int(p > THRESHOLD)) for url, p in zip(urls, probs))
+        else:
+            self.file.write("".join(json.dumps({"url": url, "malicious_probability": round(float(p), 6),
+                                                "malicious": bool(p > THRESHOLD)}) + "\n"
+                                    for url, p in zip(urls, probs)))
+        self.file.flush()
+        if self.file is not sys.stdout:
+            self.offset = self.file.tell()
+        return True
+
+    def checkpoint(self):
+        return {"bytes": self.offset}
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class ParquetWriter:
+    """Directory of Parquet part files; each part is checkpointed when it is closed."""
+
+    def __init__(self, path, parts=0, part_rows=PARQUET_PART_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("❌ ERROR: Parquet output needs pyarrow (pip install pyarrow).", file=sys.stderr)
+            sys.exit(1)
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.part_rows = part_rows
+        self.parts = parts
+        self.rows = 0
+        self.writer = None
+        os.makedirs(path, exist_ok=True)
+        # Parts past the checkpoint were never closed cleanly
+        for name in os.listdir(path):
+            if name.startswith("part-") and int(name[5:10]) >= parts:
+                os.remove(os.path.join(path, name))
+
+    def write(self, urls, probs):
+        if self.writer is None:
+            schema = self.pa.schema([("url", self.pa.string()), ("malicious_probability", self.pa.float32()),
+                                     ("malicious", self.pa.bool_())])
+            self.writer = self.pq.ParquetWriter(os.path.join(self.path, f"part-{self.parts:05d}.parquet"), schema)
+        self.writer.write_table(self.pa.table({"url": urls, "malicious_probability": probs,
+                                               "malicious": probs > THRESHOLD}))
+        self.rows += len(urls)
+        if self.rows < self.part_rows:
+            return False
+        self.close()
+        return True
+
+    def checkpoint(self):
+        return {"parts": self.parts}
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.parts += 1
+            self.rows = 0
+
+
+# -- bulk run ----------------------------------------------------------------
+
+def progress_path(output):
+    return output.rstrip("/") + ".progress"
+
+
+def read_progress(output, settings):
+    try:
+        with open(progress_path(output)) as f:
+            progress = json.load(f)
+    except FileNotFoundError:
+        return None
+    if progress["settings"] != settings:
+        print("❌ ERROR: --resume needs the same inputs, field and chunk size as the interrupted run.", file=sys.stderr)
+        sys.exit(1)
+    return progress
+
+
+def save_progress(output, settings, urls_done, checkpoint):
+    tmp = progress_path(output) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"settings": settings, "urls_done": urls_done, **checkpoint}, f)
+    os.replace(tmp, progress_path(output))
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds // 60 % 60:02d}m" if seconds >= 3600 else f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+def bulk_score(inputs, output, fmt=None, workers=None, chunk_size=CHUNK_SIZE, field=None, resume=False):
+    """Score every URL in ``inputs`` into ``output``; returns the number of URLs scored in this run."""
+    fmt = output_format(output, fmt)
+    if fmt == "parquet" and output == "-":
+        print("❌ ERROR: Parquet output needs an --output directory.", file=sys.stderr)
+        sys.exit(1)
+    workers = workers or os.cpu_count() or 1
+    settings = {"inputs": [os.path.abspath(p) if p != "-" else p for p in inputs],
+                "field": field, "chunk_size": chunk_size, "format": fmt}
+    progress = read_progress(output, settings) if resume and output != "-" else None
+    urls_done = progress["urls_done"] if progress else 0
+    if progress:
+        print(f"↩ Resuming after {urls_done:,} URLs", file=sys.stderr)
+
+    reader = UrlReader(inputs, field)
+    if fmt == "parquet":
+        writer = ParquetWriter(output, parts=progress["parts"] if progress else 0)
+    else:
+        writer = TextWriter(output, fmt, offset=progress["bytes"] if progress else 0)
+    pending_urls = 0  # written but not yet covered by a checkpoint (open Parquet part)
+
+    started = last_report = time.monotonic()
+    scored = 0
+
+    def finish(chunk, probs):
+        nonlocal urls_done, pending_urls, scored, last_report
+        committed = writer.write(chunk, probs)
+        scored += len(chunk)
+        pending_urls += len(chunk)
+        if committed and output != "-":
+            urls_done += pending_urls
+            pending_urls = 0
+            save_progress(output, settings, urls_done, writer.checkpoint())
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_EVERY:
+            last_report = now
+            rate = scored / (now - started)
+            line = f"⏳ {urls_done + pending_urls:,} URLs, {rate:,.0f} URLs/s"
+            if reader.total_bytes:
+                fraction = reader.bytes_read / reader.total_bytes
+                line += f", {fraction:.0%}"
+                if fraction > 0:
+                    line += f", ETA {format_eta((now - started) * (1 - fraction) / fraction)}"
+            print(line, file=sys.stderr)
+
+    chunks = chunked(reader, chunk_size, skip=urls_done)
+    if workers == 1:
+        load_model(quiet=True)
+        for chunk in chunks:
+            finish(chunk, score_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=load_model, initargs=(True,)) as pool:
+            # A bounded window keeps memory flat however long the input is
+            window = deque()
+            for chunk in chunks:
+                window.append((chunk, pool.submit(score_chunk, chunk)))
+                if len(window) >= 2 * workers:
+                    chunk, future = window.popleft()
+                    finish(chunk, future.result())
+            while window:
+                chunk, future = window.popleft()
+                finish(chunk, future.result())
+
+    writer.close()
+    if output != "-":
+        save_progress(output, settings, urls_done + pending_urls, writer.checkpoint())
+    elapsed = time.monotonic() - started
+    print(f"✅ Scored {scored:,} URLs in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):,.0f} URLs/s) → {output}",
+          file=sys.stderr)
+    return scored
+
+
 # ✅ Run Prediction from Command Line
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Score one URL, or files of URLs in bulk.")
+    parser.add_argument("url", nargs="?", help="Single URL to check")
+    parser.add_argument("--input", nargs="+", metavar="FILE", help="URL files (.gz ok); '-' reads stdin")
+    parser.add_argument("--output", default="-", help="Result file (CSV/JSONL) or directory (Parquet); '-' is stdout")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="Output format (default: from extension)")
+    parser.add_argument("--field", type=int, help="Take the URL from this whitespace-separated field (0-based)")
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="URLs per scoring task")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run into the same output")
+    args = parser.parse_args()
+
+    if args.input:
+        bulk_score(args.input, args.output, fmt=args.format, workers=args.workers, chunk_size=args.chunk_size,
+                   field=args.field, resume=args.resume)
+    elif args.url:
+        load_model()
+        predict_url(args.url)
+    else:
         print("❌ ERROR: Please provide a URL to check.")
         sys.exit(1)
-
-    predict_url(sys.argv[1])
@@ -0,0 +1,68 @@
+import os
+
+import openai
+from dotenv import load_dotenv
+
+import local_safe_browsing
+from upstream import UPSTREAMS
+
+# Load environment variables
+load_dotenv()
+
+openai.api_key = os.getenv("OPENAI_API_KEY")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+VT_API_KEY = os.getenv("VIRUSTOTAL_API_KEY")
+HF_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
+
+# Upstream endpoints; overridable to point at stubs (OpenAI reads OPENAI_API_BASE itself)
+GSB_API_URL = os.getenv("GSB_API_URL", "https://safebrowsing.googleapis.com/v4/threatMatches:find")
+VT_API_URL = os.getenv("VT_API_URL", "https://www.virustotal.com/api/v3")
+HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/google/flan-t5-large")
+
+
+def safe_browsing_payload(url):
+    return {
+        "client": {"clientId": "your-client-id", "clientVersion": "1.0"},
+        "threatInfo": {
+            "threatTypes": ["MALWARE", "SOCIAL_ENGINEERING"],
+            "platformTypes": ["ANY_PLATFORM"],
+            "threatEntryTypes": ["URL"],
+            "threatEntries": [{"url": url}],
+        },
+    }
+
+
+def check_google_safe_browsing(url):
+    # With fresh local lists only a prefix hit costs a network call
+    store = local_safe_browsing.store()
+    if store is not None:
+        hits = store.lookup(url)
+        if not hits:
+            return False
+        payload = local_safe_browsing.full_hashes_payload(hits, store.client_states())
+        res = UPSTREAMS["google_safe_browsing"].post(f"{local_safe_browsing.FULL_HASHES_URL}?key={GOOGLE_API_KEY}",
+                                                     json=payload)
+        return local_safe_browsing.confirmed(hits, res.json())
+
+    api_url = f"{GSB_API_URL}?key={GOOGLE_API_KEY}"
+    res = UPSTREAMS["google_safe_browsing"].post(api_url, json=safe_browsing_payload(url))
+    return res.json() != {}
+
+
+def openai_messages(url):
+    return [
+        {"role": "system", "content": "You are a cybersecurity assistant."},
+        {"role": "user", "content": (
+            f"Analyze this URL: {url}\n\n"
+            "Please give a detailed threat assessment of the domain and page structure. "
+            "Check for signs of phishing, malware, fake logins, and suspicious patterns."
+        )}
+    ]
+
+
+def huggingface_prompt(url):
+    return (
+        f"Analyze the following URL and give a detailed cybersecurity assessment. "
+        f"Check for phishing, malware, and fake login signs. Explain why it's suspicious if so.\n\nURL: {url}"
+    )
+
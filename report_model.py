@@ -1,59 +1,246 @@
+"""Evaluate model bundles on a labeled URL CSV in one bounded-memory pass.
+
+    python report_model.py --csv balanced_dataset.csv --versions v1 v2 --workers 4 --json report.json
+
+The CSV is read in chunks and scored on a process pool. Each worker loads
+every bundle version being compared once. The main process keeps a
+histogram of scores per class, model and source. Memory stays flat however
+large the dataset is, and every metric comes from those histograms:
+
+- a threshold sweep: precision, recall, FPR, F1 and accuracy at each cutoff,
+  including the serving THRESHOLD
+- ROC and precision-recall curves with ROC AUC and average precision
+- the same metrics per value of the --source-column, if the CSV has one
+- scoring throughput per model, so candidates compare on speed as well as
+  accuracy
+
+Scores are binned to 1/BINS. Cutoffs on bin edges are exact, and AUC is
+exact up to ties within a bin.
+"""
+import argparse
+import json
+import os
+import time
 import warnings
-import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from scipy.sparse import hstack
-from sklearn.metrics import classification_report
-import joblib
-from urllib.parse import urlparse
-import re
+import pandas as pd
+
+from features import extract_features_batch
+import fast_inference
+import model_bundle
+from predict import THRESHOLD
 
 # Suppress specific warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-# Load the model and vectorizer
-model = joblib.load("best_model.pkl")
-vectorizer = joblib.load("vectorizer.pkl")
-
-# Load your validation dataset
-data = pd.read_csv("balanced_dataset.csv")  # Replace with your validation dataset
-X = data["url"]  # Features (URLs)
-y = data["label"]  # Labels (0 for safe, 1 for malicious)
-
-# Function to extract numerical features
-def extract_features(url):
-    """
-    Extract numerical features from a URL.
-    """
-    # Parse the URL
-    parsed_url = urlparse(url)
-    
-    # Extract features
-    features = [
-        len(url),  # URL length
-        url.count('.'),  # Number of dots
-        url.count('-'),  # Number of hyphens
-        url.count('@'),  # Number of '@' symbols
-        url.count('?'),  # Number of query parameters
-        url.count('='),  # Number of '=' in URL
-        int(bool(re.search(r'https?', url))),  # HTTPS presence (use raw string for regex)
-        int(bool(re.search(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', url))),  # IP Address presence (use raw string for regex)
-        parsed_url.netloc.count('.'),  # Subdomain count
-        len(parsed_url.netloc)  # Domain length
-    ]
-    
-    return features
-
-# Extract features
-X_features = np.array([extract_features(url) for url in X], dtype=np.float64)  # Use np.float64 instead of np.float
-
-# Vectorize URLs
-X_vectorized = vectorizer.transform(X)
-
-# Combine features
-X_combined = hstack([X_features, X_vectorized])
-
-# Evaluate the model
-y_pred = model.predict(X_combined)
-print(classification_report(y, y_pred))
\ No newline at end of file
+BINS = 10_000
+CHUNK_SIZE = 20_000
+SWEEP = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+_bundles = {}
+
+
+def load_bundles(versions):
+    """Load each bundle version (None: CURRENT or the legacy pickles) once per worker."""
+    for version in versions:
+        _bundles[version] = model_bundle.load(version=version) if version else model_bundle.load_or_legacy()
+
+
+def score_chunk(urls):
+    """``({version: probabilities}, {stage: seconds})`` for one chunk (runs in the pool workers)."""
+    started = time.perf_counter()
+    numeric = extract_features_batch(urls)
+    seconds = {"features": time.perf_counter() - started}
+    probs = {}
+    for version, bundle in _bundles.items():
+        started = time.perf_counter()
+        features = fast_inference.combine_features(numeric, bundle.vectorizer.transform(urls))
+        probs[version] = bundle.model.predict_proba(features)[:, 1].astype(np.float32)
+        seconds[version] = time.perf_counter() - started
+    return probs, seconds
+
+
+class ScoreHistogram:
+    """Per-class counts of scores in BINS equal-width bins."""
+
+    def __init__(self, bins=BINS):
+        self.bins = bins
+        self.counts = np.zeros((2, bins), dtype=np.int64)
+
+    def add(self, probs, labels):
+        index = np.minimum((probs * self.bins).astype(np.int64), self.bins - 1)
+        for label in (0, 1):
+            self.counts[label] += np.bincount(index[labels == label], minlength=self.bins)
+
+    def cumulative(self):
+        """``(thresholds, tp, fp)`` for "score >= threshold" at every bin edge, highest threshold first."""
+        tp = np.cumsum(self.counts[1][::-1])
+        fp = np.cumsum(self.counts[0][::-1])
+        thresholds = np.arange(self.bins - 1, -1, -1) / self.bins
+        return thresholds, tp, fp
+
+    def at(self, threshold):
+        """Confusion-matrix metrics for "score >= threshold"."""
+        start = min(int(np.ceil(threshold * self.bins - 1e-9)), self.bins)
+        tp, fp = int(self.counts[1][start:].sum()), int(self.counts[0][start:].sum())
+        positives, negatives = int(self.counts[1].sum()), int(self.counts[0].sum())
+        fn, tn = positives - tp, negatives - fp
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / positives if positives else 0.0
+        return {
+            "threshold": threshold,
+            "precision": precision,
+            "recall": recall,
+            "fpr": fp / negatives if negatives else 0.0,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "accuracy": (tp + tn) / (positives + negatives) if positives + negatives else 0.0,
+            "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        }
+
+    def curves(self):
+        """ROC and PR curves at the bin edges where the counts change, plus ROC AUC and average precision."""
+        thresholds, tp, fp = self.cumulative()
+        positives, negatives = tp[-1], fp[-1]
+        keep = np.flatnonzero(self.counts.sum(axis=0)[::-1])
+        thresholds, tp, fp = thresholds[keep], tp[keep], fp[keep]
+        tpr = tp / positives if positives else np.zeros(len(tp))
+        fpr = fp / negatives if negatives else np.zeros(len(fp))
+        precision = tp / np.maximum(tp + fp, 1)
+        # Trapezoids from (0, 0); inside a bin, ties are ordered at random
+        x, y = np.concatenate([[0.0], fpr]), np.concatenate([[0.0], tpr])
+        roc_auc = float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2))
+        average_precision = float(np.sum(np.diff(np.concatenate([[0.0], tpr])) * precision))
+        return {
+            "roc_auc": roc_auc,
+            "average_precision": average_precision,
+            "roc": {"threshold": thresholds.tolist(), "fpr": fpr.tolist(), "tpr": tpr.tolist()},
+            "pr": {"threshold": thresholds.tolist(), "precision": precision.tolist(), "recall": tpr.tolist()},
+        }
+
+    def report(self, sweep=SWEEP, curves=True):
+        cutoffs = sorted(set(sweep) | {THRESHOLD})
+        summary = self.curves()
+        return {
+            "samples": int(self.counts.sum()),
+            "positives": int(self.counts[1].sum()),
+            "roc_auc": summary["roc_auc"],
+            "average_precision": summary["average_precision"],
+            "serving": self.at(THRESHOLD),
+            "sweep": [self.at(t) for t in cutoffs],
+            **({"roc": summary["roc"], "pr": summary["pr"]} if curves else {}),
+        }
+
+
+def read_chunks(csv_path, chunk_size, source_column):
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    use_source = source_column in columns
+    usecols = ["url", "label"] + ([source_column] if use_source else [])
+    for chunk in pd.read_csv(csv_path, usecols=usecols, chunksize=chunk_size):
+        chunk = chunk.dropna(subset=["url"])
+        sources = chunk[source_column].fillna("unknown").astype(str).to_numpy() if use_source else None
+        yield chunk["url"].astype(str).tolist(), chunk["label"].to_numpy(dtype=np.int64), sources
+
+
+def evaluate(csv_path="balanced_dataset.csv", versions=(None,), workers=None, chunk_size=CHUNK_SIZE,
+             source_column="source"):
+    """Score ``csv_path`` with each bundle version and return the report dict."""
+    versions = list(versions)
+    workers = workers or os.cpu_count() or 1
+    overall = {version: ScoreHistogram() for version in versions}
+    by_source = {version: {} for version in versions}
+    seconds = {"features": 0.0, **{version: 0.0 for version in versions}}
+    rows = 0
+
+    def add(urls, labels, sources, result):
+        nonlocal rows
+        probs, chunk_seconds = result
+        rows += len(urls)
+        for stage, s in chunk_seconds.items():
+            seconds[stage] += s
+        for version in versions:
+            overall[version].add(probs[version], labels)
+            if sources is not None:
+                for source in np.unique(sources):
+                    mask = sources == source
+                    by_source[version].setdefault(source, ScoreHistogram()).add(probs[version][mask], labels[mask])
+
+    started = time.perf_counter()
+    chunks = read_chunks(csv_path, chunk_size, source_column)
+    if workers == 1:
+        load_bundles(versions)
+        for urls, labels, sources in chunks:
+            add(urls, labels, sources, score_chunk(urls))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=load_bundles, initargs=(versions,)) as pool:
+            # A bounded window keeps memory flat however large the CSV is
+            window = deque()
+            for urls, labels, sources in chunks:
+                window.append((urls, labels, sources, pool.submit(score_chunk, urls)))
+                if len(window) >= 2 * workers:
+                    *chunk, future = window.popleft()
+                    add(*chunk, future.result())
+            while window:
+                *chunk, future = window.popleft()
+                add(*chunk, future.result())
+    wall = time.perf_counter() - started
+
+    models = {}
+    for version in versions:
+        cpu = seconds["features"] + seconds[version]
+        models[version or "current"] = {
+            **overall[version].report(),
+            "throughput": {
+                "urls_per_cpu_second": rows / cpu if cpu else 0.0,
+                "feature_seconds": seconds["features"],
+                "model_seconds": seconds[version],
+            },
+            "by_source": {source: hist.report(curves=False) for source, hist in sorted(by_source[version].items())},
+        }
+    return {"csv": csv_path, "rows": rows, "workers": workers, "wall_seconds": wall,
+            "urls_per_second": rows / wall if wall else 0.0, "models": models}
+
+
+def print_report(report):
+    print(f"📊 {report['rows']:,} URLs from {report['csv']} in {report['wall_seconds']:.1f}s "
+          f"({report['urls_per_second']:,.0f} URLs/s on {report['workers']} workers)")
+    for name, model in report["models"].items():
+        serving = model["serving"]
+        print(f"\n🧠 {name}: ROC AUC {model['roc_auc']:.4f}, average precision {model['average_precision']:.4f}, "
+              f"{model['throughput']['urls_per_cpu_second']:,.0f} URLs/s per core")
+        print(f"   at serving threshold {THRESHOLD}: precision {serving['precision']:.4f}, "
+              f"recall {serving['recall']:.4f}, FPR {serving['fpr']:.4f}")
+        print(f"   {'cutoff':>7} {'precision':>9} {'recall':>7} {'fpr':>7} {'f1':>7} {'accuracy':>8}")
+        for row in model["sweep"]:
+            print(f"   {row['threshold']:>7.2f} {row['precision']:>9.4f} {row['recall']:>7.4f} {row['fpr']:>7.4f} "
+                  f"{row['f1']:>7.4f} {row['accuracy']:>8.4f}")
+        if model["by_source"]:
+            print(f"   {'source':<24} {'samples':>9} {'auc':>7} {'precision':>9} {'recall':>7} {'fpr':>7}")
+            for source, stats in model["by_source"].items():
+                s = stats["serving"]
+                print(f"   {source[:24]:<24} {stats['samples']:>9,} {stats['roc_auc']:>7.4f} {s['precision']:>9.4f} "
+                      f"{s['recall']:>7.4f} {s['fpr']:>7.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate model bundles on a labeled URL CSV.")
+    parser.add_argument("--csv", default="balanced_dataset.csv", help="CSV with url,label (and optionally source)")
+    parser.add_argument("--versions", nargs="+", metavar="VERSION",
+                        help="Bundle versions to compare (default: CURRENT, or the legacy pickles)")
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per scoring task")
+    parser.add_argument("--source-column", default="source", help="Column to break the metrics down by")
+    parser.add_argument("--json", metavar="PATH", help="Also write the full report, curves included, as JSON")
+    args = parser.parse_args()
+
+    report = evaluate(args.csv, versions=args.versions or [None], workers=args.workers,
+                      chunk_size=args.chunk_size, source_column=args.source_column)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f)
+        print(f"\n💾 Full report written to {args.json}")
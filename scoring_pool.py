@@ -0,0 +1,381 @@
+"""Scoring worker pool: model processes that micro-batch requests from the web workers.
+
+Under ``gunicorn app:app`` every web worker scores its own requests inline,
+one or a few rows at a time. The model's own threads (XGBoost/LightGBM
+n_jobs) then compete with the web workers for the same cores. This module
+moves scoring into a separate pool:
+
+- the parent loads and validates the model bundle once, then forks
+  SCORING_POOL_WORKERS processes. They share the model read-only:
+  copy-on-write pages from the fork, plus the bundle's memory-mapped tree
+  arrays. Each worker is pinned to one core and scores on a single thread.
+- every worker accepts connections on the same Unix socket
+  (SCORING_POOL_SOCKET). A web worker keeps one connection per thread and
+  sends length-prefixed JSON requests: ``{"urls": [...]}`` in,
+  ``{"probs": [...], "batch_rows": n, "version": v}`` out, where ``v`` is
+  the version of the bundle the pool serves. A client built for another
+  version raises PoolError, so after a rollout the web workers score
+  inline until the pool is restarted with the new bundle.
+- a worker scores the requests queued up while it was busy together, up
+  to SCORING_MAX_BATCH URLs, with one ``predict_proba`` call.
+  SCORING_MAX_WAIT_MS > 0 also waits that long after the first request
+  for more. That makes batches bigger but adds the wait to every request
+  at low load. With the default of 0, batches grow with load on their own.
+
+Run it next to gunicorn on the same host, and point app.py at it:
+
+    python scoring_pool.py --socket /tmp/threat-scoring.sock &
+    SCORING_POOL_SOCKET=/tmp/threat-scoring.sock gunicorn --preload app:app
+
+If the pool is unreachable, app.py scores inline as before. To compare
+throughput and p99 latency with inline scoring as concurrency rises:
+
+    python scoring_pool.py --benchmark
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+SOCKET_PATH = os.getenv("SCORING_POOL_SOCKET")
+WORKERS = int(os.getenv("SCORING_POOL_WORKERS", os.cpu_count() or 1))
+MAX_BATCH = int(os.getenv("SCORING_MAX_BATCH", 64))
+MAX_WAIT_MS = float(os.getenv("SCORING_MAX_WAIT_MS", 0))
+# Seconds a web worker waits for its scores before scoring inline
+TIMEOUT = float(os.getenv("SCORING_POOL_TIMEOUT", 5))
+PIN_CORES = os.getenv("SCORING_POOL_PIN", "1") == "1"
+
+# Big-endian payload length before every JSON message
+HEADER = struct.Struct(">I")
+MAX_MESSAGE = 64 << 20
+
+
+class PoolError(Exception):
+    """The pool could not be reached or could not score a request."""
+
+
+def send_message(sock, payload):
+    data = json.dumps(payload).encode()
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if size > MAX_MESSAGE:
+        raise ConnectionError(f"message of {size} bytes exceeds {MAX_MESSAGE}")
+    return json.loads(_recv_exactly(sock, size))
+
+
+def bundle_scorer(bundle, fast_path_max_rows=16):
+    """``score(urls) -> probabilities`` for ``bundle``, routed like app.score_urls."""
+    def score(urls):
+        features = bundle.transform(urls)
+        scorer = bundle.engine if bundle.engine is not None and len(urls) <= fast_path_max_rows else bundle.model
+        return scorer.predict_proba(features)[:, 1]
+    return score
+
+
+def single_threaded(model):
+    """Keep the model's own thread pool to one thread; the pool already runs one process per core."""
+    if hasattr(model, "set_params") and "n_jobs" in model.get_params():
+        model.set_params(n_jobs=1)
+
+
+class Batcher:
+    """Collects requests into batches of up to ``max_batch`` URLs and scores each batch at once."""
+
+    def __init__(self, score, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, version=None):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.version = version
+        self.requests = queue.Queue()
+
+    def reply(self, probs, batch_rows):
+        return {"probs": probs, "batch_rows": batch_rows, "version": self.version}
+
+    def submit(self, conn, urls):
+        self.requests.put((conn, urls))
+
+    def next_batch(self):
+        """Block for one request, then take whatever else arrives before the wait runs out or the batch fills."""
+        batch = [self.requests.get()]
+        rows = len(batch[0][1])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[1])
+        return batch
+
+    def run_once(self):
+        batch = self.next_batch()
+        urls = [url for _, request_urls in batch for url in request_urls]
+        try:
+            probs = np.asarray(self.score(urls), dtype=float).tolist()
+            replies = []
+            start = 0
+            for _, request_urls in batch:
+                replies.append(self.reply(probs[start:start + len(request_urls)], len(urls)))
+                start += len(request_urls)
+        except Exception as e:
+            replies = [{"error": f"{type(e).__name__}: {e}"}] * len(batch)
+        for (conn, _), reply in zip(batch, replies):
+            try:
+                send_message(conn, reply)
+            except OSError:
+                pass  # The client gave up; its reader thread closes the connection
+
+    def run(self):
+        while True:
+            self.run_once()
+
+
+def _read_requests(conn, batcher):
+    """Hand every request on ``conn`` to the batcher; clients wait for each reply before the next request."""
+    with conn:
+        try:
+            while True:
+                message = recv_message(conn)
+                urls = message.get("urls") if isinstance(message, dict) else None
+                if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+                    send_message(conn, {"error": "expected {\"urls\": [str, ...]}"})
+                elif not urls:
+                    send_message(conn, batcher.reply([], 0))
+                else:
+                    batcher.submit(conn, urls)
+        except (OSError, ValueError):
+            return
+
+
+def serve(listener, score, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, core=None, version=None):
+    """Worker process body: accept connections on ``listener`` and score their requests in batches."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    batcher = Batcher(score, max_batch, max_wait_ms, version)
+    threading.Thread(target=batcher.run, daemon=True).start()
+    while True:
+        conn, _ = listener.accept()
+        threading.Thread(target=_read_requests, args=(conn, batcher), daemon=True).start()
+
+
+def start(score, path, workers=WORKERS, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, pin=PIN_CORES, version=None):
+    """Bind ``path`` and fork ``workers`` processes serving it. Returns the processes.
+
+    ``version`` names the bundle behind ``score`` in every reply.
+
+    ``score`` is inherited through fork, so whatever it closes over (the
+    model) is shared with the workers rather than loaded again.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1024)
+    cores = sorted(os.sched_getaffinity(0)) if pin and hasattr(os, "sched_getaffinity") else []
+    context = multiprocessing.get_context("fork")
+    processes = []
+    for i in range(workers):
+        core = cores[i % len(cores)] if cores else None
+        process = context.Process(target=serve, args=(listener, score, max_batch, max_wait_ms, core, version),
+                                  name=f"scoring-{i}", daemon=True)
+        process.start()
+        processes.append(process)
+    listener.close()
+    return processes
+
+
+def stop(processes, path):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+class ScoringClient:
+    """Connection to the pool from a web worker: one socket per thread, reconnected after a fork.
+
+    With ``version`` set, replies from a pool serving another bundle raise PoolError.
+    """
+
+    def __init__(self, path, timeout=TIMEOUT, version=None):
+        self.path = path
+        self.timeout = timeout
+        self.version = version
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "sock", None) is None or local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            local.sock, local.pid = sock, os.getpid()
+        return local.sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def request(self, urls):
+        """The pool's reply for ``urls``; raises PoolError."""
+        try:
+            sock = self._connection()
+            send_message(sock, {"urls": list(urls)})
+            reply = recv_message(sock)
+        except (OSError, ValueError) as e:
+            # A half-finished exchange leaves the stream out of step
+            self._close()
+            raise PoolError(f"scoring pool at {self.path}: {e}") from e
+        if "error" in reply:
+            raise PoolError(f"scoring pool at {self.path}: {reply['error']}")
+        if self.version is not None and reply.get("version") != self.version:
+            raise PoolError(f"scoring pool at {self.path} serves bundle {reply.get('version')}, not {self.version}")
+        return reply
+
+    def score(self, urls):
+        """Malicious probability for each URL, as a NumPy array."""
+        return np.array(self.request(urls)["probs"], dtype=float)
+
+
+def from_env(version=None):
+    """A client for SCORING_POOL_SOCKET expecting bundle ``version``, or None when scoring stays inline."""
+    return ScoringClient(SOCKET_PATH, version=version) if SOCKET_PATH else None
+
+
+def _client_process(mode, path, score, urls, results):
+    latencies, batch_rows = [], []
+    client = ScoringClient(path) if mode == "pool" else None
+    for url in urls:
+        started = time.perf_counter()
+        if client is not None:
+            batch_rows.append(client.request([url])["batch_rows"])
+        else:
+            score([url])
+        latencies.append(time.perf_counter() - started)
+    results.put((latencies, batch_rows))
+
+
+def run_clients(mode, path, score, urls, concurrency):
+    """``concurrency`` client processes, each sending its share of ``urls`` one URL per request."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    shares = [urls[i::concurrency] for i in range(concurrency)]
+    clients = [context.Process(target=_client_process, args=(mode, path, score, share, results))
+               for share in shares]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    collected = [results.get() for _ in clients]
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.join()
+    ms = np.concatenate([np.asarray(latencies) for latencies, _ in collected]) * 1000
+    rows = [n for _, batch_rows in collected for n in batch_rows]
+    return {"concurrency": concurrency, "requests_per_s": len(ms) / elapsed,
+            "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            "mean_batch_rows": float(np.mean(rows)) if rows else 1.0}
+
+
+def benchmark(bundle, urls, concurrency_levels, path, workers=WORKERS, max_batch=MAX_BATCH,
+              max_wait_ms=MAX_WAIT_MS):
+    """``{"inline": [...], "pool": [...]}``: throughput and latency per concurrency level.
+
+    Inline clients score in their own process with the model's default
+    threading, as gunicorn workers do today; pool clients send every
+    request to a pool of ``workers`` processes.
+    """
+    inline = bundle_scorer(bundle)
+    result = {"inline": [run_clients("inline", None, inline, urls, c) for c in concurrency_levels]}
+
+    single_threaded(bundle.model)
+    processes = start(bundle_scorer(bundle), path, workers, max_batch, max_wait_ms, version=bundle.version)
+    try:
+        result["pool"] = [run_clients("pool", path, None, urls, c) for c in concurrency_levels]
+    finally:
+        stop(processes, path)
+    return result
+
+
+if __name__ == "__main__":
+    import model_bundle
+
+    parser = argparse.ArgumentParser(description="Serve the model from a pool of micro-batching scoring processes.")
+    parser.add_argument("--socket", default=SOCKET_PATH or "/tmp/threat-scoring.sock", help="Unix socket to listen on")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Scoring processes (default: one per core)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="URLs per predict_proba call at most")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="How long a batch waits for more requests after the first")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Compare inline and pool scoring instead of serving")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="Client processes per benchmark round")
+    parser.add_argument("--requests", type=int, default=4000, help="Requests per benchmark round")
+    parser.add_argument("--out", help="Write the benchmark results as JSON")
+    args = parser.parse_args()
+
+    bundle = model_bundle.load_or_legacy()
+    print(f"✅ Model bundle {bundle.version} loaded")
+
+    if args.benchmark:
+        from synthetic_urls import generate_urls
+        urls, _ = generate_urls(args.requests, seed=42)
+        result = benchmark(bundle, urls, args.concurrency, args.socket, args.workers, args.max_batch,
+                           args.max_wait_ms)
+        print(f"⏱️ {args.requests:,} single-URL requests per round, {args.workers} pool workers, "
+              f"batches of up to {args.max_batch} within {args.max_wait_ms:g} ms")
+        print(f"{'clients':>8} {'inline req/s':>13} {'p99 ms':>8} {'pool req/s':>11} {'p99 ms':>8} {'batch':>6}")
+        for inline, pooled in zip(result["inline"], result["pool"]):
+            print(f"{inline['concurrency']:>8} {inline['requests_per_s']:>13,.0f} {inline['p99_ms']:>8.2f} "
+                  f"{pooled['requests_per_s']:>11,.0f} {pooled['p99_ms']:>8.2f} {pooled['mean_batch_rows']:>6.1f}")
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(result, f, indent=1)
+            print(f"💾 Results written to {args.out}")
+    else:
+        single_threaded(bundle.model)
+        processes = start(bundle_scorer(bundle), args.socket, args.workers, args.max_batch, args.max_wait_ms,
+                          version=bundle.version)
+        print(f"🏊 {args.workers} scoring workers on {args.socket} "
+              f"(batches of up to {args.max_batch} URLs within {args.max_wait_ms:g} ms)")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            for process in processes:
+                process.join()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            stop(processes, args.socket)
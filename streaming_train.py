@@ -0,0 +1,299 @@
+"""Out-of-core training for datasets larger than RAM.
+
+The CSV is read ``chunksize`` rows at a time and never held in memory as a
+whole:
+
+1. Pass one counts token frequencies to pick the TF-IDF vocabulary (the
+   ``max_features`` most frequent terms, as TfidfVectorizer would).
+2. Pass two turns each chunk into sparse term counts plus the numeric
+   features and writes it to the on-disk cache. It also accumulates the
+   document frequencies that give the IDF weights.
+3. The boosters read the cache chunk by chunk. XGBoost uses its
+   external-memory DMatrix. LightGBM builds its binned Dataset from a
+   Sequence and saves it as a binary file that later runs load directly.
+
+Features stay CSR end to end. Only one chunk is densified at a time, for
+LightGBM's row batches, so peak memory follows the chunk size.
+"""
+import json
+import os
+import time
+import zlib
+from collections import Counter
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from fast_inference import BoosterClassifier, combine_features
+from features import FEATURE_NAMES, extract_features_batch
+
+# Term counters kept while streaming the vocabulary pass, as a multiple of
+# max_features. Rare tokens beyond this are pruned, which only matters for
+# terms that could never make the top max_features anyway.
+VOCAB_CAPACITY_FACTOR = 100
+
+# One row in TEST_FRACTION goes to the test split, chosen by a hash of the
+# URL so the split is stable across runs and chunk sizes
+TEST_FRACTION = 5
+
+# Rows LightGBM samples to pick its bin boundaries. Sampled rows are
+# densified (2010 float64 columns each), so the default of 200k would
+# need ~3GB on its own.
+LGB_SAMPLE_ROWS = 50_000
+
+
+def read_chunks(csv_path, chunksize):
+    for chunk in pd.read_csv(csv_path, usecols=["url", "label"], chunksize=chunksize):
+        chunk = chunk.dropna(subset=["url"])
+        yield chunk["url"].astype(str).tolist(), chunk["label"].to_numpy(dtype=np.float32)
+
+
+def fit_vocabulary(csv_path, chunksize, max_features=2000):
+    """The ``max_features`` most frequent terms of the corpus, streamed chunk by chunk.
+
+    Ties at the cut-off are broken alphabetically, so the vocabulary can
+    differ from TfidfVectorizer's (which breaks ties arbitrarily) only in
+    terms with the same count.
+    """
+    capacity = max_features * VOCAB_CAPACITY_FACTOR
+    term_counts = Counter()
+    for urls, _ in read_chunks(csv_path, chunksize):
+        counter = CountVectorizer()
+        counts = counter.fit_transform(urls)
+        term_counts.update(dict(zip(counter.get_feature_names_out(), counts.sum(axis=0).A1.tolist())))
+        if len(term_counts) > 2 * capacity:
+            term_counts = Counter(dict(term_counts.most_common(capacity)))
+    top = sorted(term_counts.items(), key=lambda item: (-item[1], item[0]))[:max_features]
+    terms = sorted(term for term, _ in top)
+    return {term: index for index, term in enumerate(terms)}
+
+
+def build_cache(csv_path, cache_dir, chunksize, max_features=2000):
+    """Write sparse feature chunks and the fitted vectorizer to ``cache_dir``."""
+    os.makedirs(cache_dir, exist_ok=True)
+    print("📖 Pass 1: fitting vocabulary...")
+    vocabulary = fit_vocabulary(csv_path, chunksize, max_features)
+
+    print("📖 Pass 2: extracting features...")
+    counter = CountVectorizer(vocabulary=vocabulary)
+    doc_freq = np.zeros(len(vocabulary), dtype=np.int64)
+    n_docs = 0
+    chunks = {"train": [], "test": []}
+    for index, (urls, labels) in enumerate(read_chunks(csv_path, chunksize)):
+        counts = counter.transform(urls)
+        doc_freq += np.bincount(counts.indices, minlength=len(vocabulary))
+        n_docs += len(urls)
+        numeric = extract_features_batch(urls)
+        is_test = np.fromiter((is_test_url(url) for url in urls), dtype=bool, count=len(urls))
+        for split, mask in (("train", ~is_test), ("test", is_test)):
+            if not mask.any():
+                continue
+            part = counts[mask]
+            path = os.path.join(cache_dir, f"{split}_{index:05d}.npz")
+            np.savez(path, data=part.data, indices=part.indices, indptr=part.indptr,
+                     numeric=numeric[mask], labels=labels[mask])
+            chunks[split].append({"path": path, "rows": int(mask.sum())})
+        print(f"   chunk {index}: {n_docs:,} rows")
+
+    # Same IDF as TfidfVectorizer(smooth_idf=True)
+    vectorizer = TfidfVectorizer(max_features=max_features, vocabulary=vocabulary)
+    vectorizer.idf_ = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+    joblib.dump(vectorizer, os.path.join(cache_dir, "vectorizer.pkl"))
+    return chunks
+
+
+class ChunkLoader:
+    """Loads cached chunks as CSR feature matrices, keeping only the last one in memory."""
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self._path = None
+        self._chunk = None
+
+    def __call__(self, path):
+        if path != self._path:
+            with np.load(path) as data:
+                counts = csr_matrix((data["data"], data["indices"], data["indptr"]),
+                                    shape=(len(data["labels"]), len(self.vectorizer.vocabulary_)))
+                # Same weighting as TfidfVectorizer.transform: counts * idf, then L2 row norm
+                tfidf = counts.astype(np.float64)
+                tfidf.data *= self.vectorizer.idf_[tfidf.indices]
+                normalize(tfidf, norm="l2", copy=False)
+                self._chunk = combine_features(data["numeric"], tfidf), data["labels"]
+            self._path = path
+        return self._chunk
+
+
+class ChunkSequence(lgb.Sequence):
+    """One cached chunk as a LightGBM Sequence; rows are densified a batch at a time."""
+
+    def __init__(self, chunk, loader, batch_size=4096):
+        self.path = chunk["path"]
+        self.rows = chunk["rows"]
+        self.loader = loader
+        self.batch_size = batch_size
+
+    def __getitem__(self, idx):
+        rows = self.loader(self.path)[0][idx].toarray()
+        return rows[0] if isinstance(idx, (int, np.integer)) else rows
+
+    def __len__(self):
+        return self.rows
+
+
+class ChunkIter(xgb.DataIter):
+    """Feeds cached chunks to XGBoost's external-memory DMatrix."""
+
+    def __init__(self, chunks, loader, cache_prefix):
+        self.chunks = chunks
+        self.loader = loader
+        self._it = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._it == len(self.chunks):
+            return False
+        X, y = self.loader(self.chunks[self._it]["path"])
+        input_data(data=X, label=y)
+        self._it += 1
+        return True
+
+    def reset(self):
+        self._it = 0
+
+
+def is_test_url(url):
+    """Whether ``url`` is in the test split: a stable hash, independent of row order and chunk size."""
+    return zlib.crc32(url.encode()) % TEST_FRACTION == 0
+
+
+def cascade_sample(data_path, cache_dir, chunksize, sample_rows, seed=42):
+    """``(urls, labels, (train_idx, holdout_idx))``: up to ``sample_rows`` rows of each split, streamed.
+
+    The split is the one train() uses, so the cascade picks its band on rows
+    the streaming model did not train on. Each chunk's rows get random keys
+    and only the ``sample_rows`` smallest per split are kept, so memory is
+    bounded by the sample plus one chunk.
+    """
+    if data_path.endswith(".db"):
+        data_path = export_store(data_path, cache_dir)
+    rng = np.random.default_rng(seed)
+    kept = {test: ([], np.empty(0), np.empty(0, dtype=np.int64)) for test in (False, True)}
+    for urls, labels in read_chunks(data_path, chunksize):
+        is_test = np.fromiter((is_test_url(url) for url in urls), dtype=bool, count=len(urls))
+        keys = rng.random(len(urls))
+        for test in (False, True):
+            rows = np.flatnonzero(is_test == test)
+            sample_urls, sample_keys, sample_labels = kept[test]
+            sample_urls = sample_urls + [urls[i] for i in rows]
+            sample_keys = np.concatenate([sample_keys, keys[rows]])
+            sample_labels = np.concatenate([sample_labels, labels[rows].astype(np.int64)])
+            if len(sample_keys) > sample_rows:
+                keep = np.argpartition(sample_keys, sample_rows)[:sample_rows]
+                sample_urls = [sample_urls[i] for i in keep]
+                sample_keys, sample_labels = sample_keys[keep], sample_labels[keep]
+            kept[test] = (sample_urls, sample_keys, sample_labels)
+    (train_urls, _, train_labels), (test_urls, _, test_labels) = kept[False], kept[True]
+    split = (np.arange(len(train_urls)), np.arange(len(train_urls), len(train_urls) + len(test_urls)))
+    return train_urls + test_urls, np.concatenate([train_labels, test_labels]), split
+
+
+def _cache_key(csv_path, chunksize, max_features):
+    stat = os.stat(csv_path)
+    return {"csv": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime,
+            "chunksize": chunksize, "max_features": max_features}
+
+
+def evaluate(model, chunks, loader):
+    correct = total = 0
+    for chunk in chunks:
+        X, y = loader(chunk["path"])
+        correct += int((model.predict(X) == y).sum())
+        total += len(y)
+    return correct / total if total else 0.0
+
+
+def export_store(db_path, cache_dir):
+    """Export a label store snapshot to a versioned CSV in ``cache_dir``, reusing an existing export."""
+    from label_store import LabelStore
+    os.makedirs(cache_dir, exist_ok=True)
+    store = LabelStore(db_path)
+    try:
+        version = store.version()
+        csv_path = os.path.join(cache_dir, f"labels-v{version}.csv")
+        if not os.path.exists(csv_path):
+            # An ingest may land between version() and the export; name the file after what was exported
+            part_path = os.path.join(cache_dir, "labels.csv.part")
+            version = store.export_csv(part_path)
+            csv_path = os.path.join(cache_dir, f"labels-v{version}.csv")
+            os.replace(part_path, csv_path)
+    finally:
+        store.close()
+    print(f"🗃️  Label store snapshot v{version} in {csv_path}")
+    return csv_path
+
+
+def train(csv_path="balanced_dataset.csv", cache_dir="training_cache", chunksize=100_000, max_features=2000):
+    start = time.time()
+    if csv_path.endswith(".db"):
+        csv_path = export_store(csv_path, cache_dir)
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    key = _cache_key(csv_path, chunksize, max_features)
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("key") != key:
+            manifest = None
+
+    if manifest is None:
+        stale_bin = os.path.join(cache_dir, "lgb_train.bin")
+        if os.path.exists(stale_bin):
+            os.remove(stale_bin)
+        manifest = {"key": key, "chunks": build_cache(csv_path, cache_dir, chunksize, max_features)}
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+    else:
+        print(f"♻️  Reusing feature cache in {cache_dir}")
+
+    vectorizer = joblib.load(os.path.join(cache_dir, "vectorizer.pkl"))
+    all_feature_names = FEATURE_NAMES + vectorizer.get_feature_names_out().tolist()
+    train_chunks, test_chunks = manifest["chunks"]["train"], manifest["chunks"]["test"]
+    loader = ChunkLoader(vectorizer)
+    print(f"✅ Train rows: {sum(c['rows'] for c in train_chunks):,}, "
+          f"test rows: {sum(c['rows'] for c in test_chunks):,}, features: {len(all_feature_names)}")
+
+    # ✅ Train XGBoost from external memory
+    dtrain = xgb.DMatrix(ChunkIter(train_chunks, loader, os.path.join(cache_dir, "xgb")))
+    xgb_booster = xgb.train({"objective": "binary:logistic", "eta": 0.05, "max_depth": 6,
+                             "tree_method": "hist", "seed": 42}, dtrain, num_boost_round=200)
+    xgb_model = BoosterClassifier(xgb_booster)
+    acc_xgb = evaluate(xgb_model, test_chunks, loader)
+    print(f"🔥 XGBoost Accuracy: {acc_xgb:.2%}")
+
+    # ✅ Train LightGBM from the binary dataset cache
+    bin_path = os.path.join(cache_dir, "lgb_train.bin")
+    lgb_params = {"objective": "binary", "learning_rate": 0.05, "seed": 42, "force_row_wise": True,
+                  "verbose": -1, "bin_construct_sample_cnt": LGB_SAMPLE_ROWS}
+    if os.path.exists(bin_path):
+        lgb_train = lgb.Dataset(bin_path, params=lgb_params)
+    else:
+        labels = np.concatenate([np.load(c["path"])["labels"] for c in train_chunks])
+        lgb_train = lgb.Dataset([ChunkSequence(c, loader) for c in train_chunks], label=labels,
+                                feature_name=all_feature_names, params=lgb_params)
+        lgb_train.construct()
+        lgb_train.save_binary(bin_path)
+    lgb_booster = lgb.train(lgb_params, lgb_train, num_boost_round=200)
+    lgb_model = BoosterClassifier(lgb_booster)
+    acc_lgb = evaluate(lgb_model, test_chunks, loader)
+    print(f"🚀 LightGBM Accuracy: {acc_lgb:.2%}")
+
+    best_model = xgb_model if acc_xgb > acc_lgb else lgb_model
+    print(f"⏱  Streaming training finished in {time.time() - start:.1f}s")
+    return best_model, vectorizer, all_feature_names
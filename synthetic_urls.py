@@ -0,0 +1,126 @@
+"""Seeded synthetic benign and phishing URLs for the benchmarks and tests.
+
+Benign URLs mix popular sites with a long tail of ordinary domains,
+tracking parameters and asset paths. Phishing URLs cover the usual
+styles: raw IPs, brand and lure words on cheap TLDs, brand-prefixed
+hosts, typosquats and pages on free hosting platforms.
+
+    python synthetic_urls.py --rows 100000 --out corpus.csv
+"""
+import argparse
+import csv
+import random
+import string
+
+# Building blocks for synthetic benign and phishing URLs used by the benchmarks
+BENIGN_DOMAINS = [
+    "google.com", "youtube.com", "facebook.com", "wikipedia.org", "amazon.com",
+    "github.com", "stackoverflow.com", "reddit.com", "microsoft.com", "apple.com",
+    "linkedin.com", "nytimes.com", "bbc.co.uk", "cnn.com", "yahoo.co.jp",
+    "mozilla.org", "python.org", "netflix.com", "paypal.com", "dropbox.com",
+]
+BENIGN_PATHS = [
+    "", "/", "/index.html", "/about", "/news/world", "/wiki/Main_Page", "/search",
+    "/products/item", "/blog/2024/05/post-title", "/docs/latest/tutorial.html",
+    "/watch", "/user/profile", "/help/article",
+]
+BRANDS = ["paypal", "apple", "microsoft", "amazon", "netflix", "bankofamerica", "chase", "office365", "dhl"]
+LURES = ["login", "secure", "verify", "account", "update", "signin", "webscr", "billing", "support", "confirm"]
+SHADY_TLDS = ["xyz", "top", "info", "ru", "tk", "ml", "online", "site", "club", "cn"]
+UNICODE_HOSTS = ["bücher.de", "пример.рф", "例子.中国"]
+# Long-tail benign domains are two of these words on a common TLD
+WORDS = ["cloud", "data", "shop", "news", "travel", "health", "learn", "photo", "music", "home", "green", "city",
+         "tech", "food", "market", "studio", "labs", "media", "design", "books", "garden", "sport", "family", "art"]
+COMMON_TLDS = ["com"] * 6 + ["org", "net", "io", "de", "co.uk", "fr", "edu", "gov"]
+TRACKING = ["utm_source=newsletter&utm_medium=email", "utm_source=twitter&utm_campaign=spring", "fbclid=", "gclid="]
+FREE_HOSTS = ["000webhostapp.com", "weebly.com", "firebaseapp.com", "web.app", "blogspot.com", "github.io",
+              "wixsite.com", "netlify.app"]
+TYPOS = {"o": "0", "l": "1", "i": "1", "a": "4", "e": "3", "m": "rn"}
+
+
+def _token(rng, k):
+    return "".join(rng.choices(string.ascii_lowercase + string.digits, k=k))
+
+
+def benign_url(rng):
+    scheme = rng.choice(["https://", "https://", "https://", "http://", ""])
+    if rng.random() < 0.6:
+        host = rng.choice(BENIGN_DOMAINS)
+    else:
+        host = rng.choice(["", "-"]).join(rng.sample(WORDS, 2)) + "." + rng.choice(COMMON_TLDS)
+    if rng.random() < 0.4:
+        host = rng.choice(["www.", "m.", "en.", "docs."]) + host
+    if rng.random() < 0.05:
+        url = f"{scheme}{host}/static/js/app.{_token(rng, 8)}.js"
+    else:
+        url = scheme + host + rng.choice(BENIGN_PATHS)
+    chance = rng.random()
+    if chance < 0.3:
+        url += f"?q={_token(rng, rng.randint(3, 12))}&page={rng.randint(1, 50)}"
+    elif chance < 0.4:
+        tracking = rng.choice(TRACKING)
+        url += "?" + (tracking + _token(rng, 20) if tracking.endswith("=") else tracking)
+    if rng.random() < 0.01:
+        url = f"https://{rng.choice(UNICODE_HOSTS)}/{_token(rng, 6)}"
+    return url
+
+
+def phishing_url(rng):
+    brand, lure = rng.choice(BRANDS), rng.choice(LURES)
+    style = rng.random()
+    if style < 0.12:
+        host = ".".join(str(rng.randint(1, 254)) for _ in range(4))
+        if rng.random() < 0.3:
+            host += f":{rng.choice([8080, 8443, 2083])}"
+    elif style < 0.35:
+        host = f"{brand}.{lure}-{_token(rng, 5)}.{rng.choice(SHADY_TLDS)}"
+    elif style < 0.55:
+        host = f"{lure}-{brand}-{rng.randint(1, 999)}.{rng.choice(SHADY_TLDS)}"
+    elif style < 0.7:
+        host = f"{brand}.com.{_token(rng, 8)}.{rng.choice(SHADY_TLDS)}"
+    elif style < 0.85:
+        host = f"{brand}-{lure}-{_token(rng, 4)}.{rng.choice(FREE_HOSTS)}"
+    else:
+        typo = rng.choice([c for c in brand if c in TYPOS] or [brand[0]])
+        host = brand.replace(typo, TYPOS.get(typo, typo * 2), 1) + "." + rng.choice(["com", "net", "co"] + SHADY_TLDS)
+    url = rng.choice(["http://", "http://", "https://", ""]) + host
+    if rng.random() < 0.1:
+        url = url.replace("//", f"//{brand}.com@", 1) if "//" in url else f"{brand}.com@{url}"
+    url += f"/{lure}/{_token(rng, rng.randint(4, 24))}"
+    if rng.random() < 0.5:
+        url += f".php?{rng.choice(['id', 'session', 'token', 'cmd'])}={_token(rng, rng.randint(8, 40))}"
+        if rng.random() < 0.4:
+            url += f"&email={_token(rng, 6)}@{rng.choice(['gmail.com', 'outlook.com'])}"
+    return url
+
+
+def generate_urls(n, seed=0, phishing_ratio=0.5):
+    """Return ``(urls, labels)`` with ``n`` synthetic URLs (label 1 = phishing)."""
+    rng = random.Random(seed)
+    urls, labels = [], []
+    for _ in range(n):
+        label = int(rng.random() < phishing_ratio)
+        urls.append(phishing_url(rng) if label else benign_url(rng))
+        labels.append(label)
+    return urls, labels
+
+
+def write_csv(path, n, seed=0, phishing_ratio=0.5):
+    """Write ``n`` synthetic URLs to ``path`` as a url,label CSV, the layout train_model.py reads."""
+    urls, labels = generate_urls(n, seed=seed, phishing_ratio=phishing_ratio)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["url", "label"])
+        writer.writerows(zip(urls, labels))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic url,label corpus.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--phishing-ratio", type=float, default=0.5,
+                        help="Share of phishing URLs (live traffic is mostly benign; training sets are balanced)")
+    parser.add_argument("--out", default="synthetic_dataset.csv")
+    args = parser.parse_args()
+    write_csv(args.out, args.rows, args.seed, args.phishing_ratio)
+    print(f"✅ Wrote {args.rows:,} synthetic URLs to {args.out}")
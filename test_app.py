@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+URL = "http://shop.example/account/login?id=7"
+
+
+def explanation_ready(app_module, url):
+    _, generation = app_module.explainer.start(url)
+    if generation is not None:
+        generation.wait(5)
+
+
+def test_verdict_etag_ignores_genai_and_pending_state(app_module):
+    body = app_module.verdict(URL, 0.2, {})
+    etag = app_module.verdict_etag(body)
+    assert app_module.verdict_etag({**body, "genai_status": "stub_success", "genai_analysis": "text",
+                                    "virustotal_status": "queue_full"}) == etag
+    # Keyed on the origin, like the extension's cache
+    assert app_module.verdict_etag({**body, "url": "HTTP://Shop.Example:80/other"}) == etag
+    assert app_module.verdict_etag({**body, "url": "https://shop.example/"}) != etag
+    assert app_module.verdict_etag({**body, "malicious_probability": 0.95, "threat": True}) != etag
+
+
+def test_get_analyze_revalidates_with_etag(app_module):
+    client = app_module.app.test_client()
+    first = client.get("/analyze", query_string={"url": URL})
+    assert first.status_code == 200
+    assert first.get_json()["url"] == URL
+    etag = first.headers["ETag"]
+    assert "max-age=" in first.headers["Cache-Control"]
+
+    # The explanation finishing does not invalidate the client's verdict
+    explanation_ready(app_module, URL)
+    second = client.get("/analyze", query_string={"url": URL})
+    assert second.get_json()["genai_status"] == "stub_success"
+    assert second.headers["ETag"] == etag
+
+    not_modified = client.get("/analyze", query_string={"url": URL}, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b""
+    assert not_modified.headers["ETag"] == etag
+    assert client.get("/analyze", query_string={"url": URL},
+                      headers={"If-None-Match": '"stale"'}).status_code == 200
+    # POST never answers 304
+    assert client.post("/analyze", json={"url": URL}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_genai_explanation_uses_the_cascade_first_stage(app_module, cascade_decides_everything):
+    client = app_module.app.test_client()
+    assert client.get("/analyze", query_string={"url": URL}).get_json()["cascade"] == "numeric"
+    response = client.get("/analyze/genai", query_string={"url": URL})
+    assert response.status_code == 200
+    assert response.get_json()["genai_status"] == "stub_success"
+
+
+def test_pool_serving_another_bundle_falls_back_to_inline_scoring(app_module, monkeypatch, tmp_path):
+    import scoring_pool
+    path = str(tmp_path / "scoring.sock")
+    processes = scoring_pool.start(lambda urls: [0.5] * len(urls), path, workers=1, pin=False, version="old")
+    try:
+        inline = app_module.score_urls([URL])
+        monkeypatch.setattr(app_module, "scoring_client", scoring_pool.ScoringClient(path, version="old"))
+        assert app_module.score_urls([URL]).tolist() == [0.5]
+        monkeypatch.setattr(app_module, "scoring_client",
+                            scoring_pool.ScoringClient(path, version=app_module.bundle.version))
+        assert app_module.score_urls([URL]).tolist() == inline.tolist()
+    finally:
+        scoring_pool.stop(processes, path)
+
+
+def batch_lines(response):
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_streams_verdicts_in_input_order(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "BATCH_CHUNK_SIZE", 2)
+    urls = ["http://a.example/x", 42, "", "http://b.example/login.php?acct=1", "http://a.example/x", None]
+    lines = batch_lines(app_module.app.test_client().post("/analyze/batch", json={"urls": urls}))
+    assert [line["url"] for line in lines] == urls
+    assert [line.get("error") for line in lines] == [None, "Invalid URL", "Invalid URL", None, None, "Invalid URL"]
+    assert lines[0] == lines[4]
+    assert lines[0]["malicious_probability"] == pytest.approx(float(app_module.score_urls([urls[0]])[0]))
+
+
+def test_batch_rejects_missing_and_oversized_requests(app_module, monkeypatch):
+    client = app_module.app.test_client()
+    assert client.post("/analyze/batch", json={}).status_code == 400
+    assert client.post("/analyze/batch", json={"urls": []}).status_code == 400
+    assert client.post("/analyze/batch", data="not json", content_type="application/json").status_code == 400
+    monkeypatch.setattr(app_module, "MAX_BATCH_URLS", 3)
+    response = client.post("/analyze/batch", json={"urls": ["http://a.example/"] * 4})
+    assert response.status_code == 413
+    assert response.get_json() == {"error": "Too many URLs (max 3)"}
+    assert client.get("/analyze").status_code == 400
+
+
+def test_listed_domains_skip_scoring(app_module, domain_lists, monkeypatch):
+    scored = []
+    full_scores = app_module.cached_scores
+    monkeypatch.setattr(app_module, "cached_scores", lambda urls: scored.extend(urls) or full_scores(urls))
+    client = app_module.app.test_client()
+
+    body = client.get("/analyze", query_string={"url": "https://login.evil.example/a"}).get_json()
+    assert (body["domain_list"], body["threat"], body["malicious_probability"]) == ("deny", True, 1.0)
+    urls = ["https://www.good.example/", "http://other.example/", "https://evil.example/"]
+    lines = batch_lines(client.post("/analyze/batch", json={"urls": urls}))
+    assert [line.get("domain_list") for line in lines] == ["allow", None, "deny"]
+    assert scored == ["http://other.example/"]
+
+
+def test_cascade_first_stage_skips_the_full_model(app_module, cascade_decides_everything):
+    client = app_module.app.test_client()
+    lines = batch_lines(client.post("/analyze/batch", json={"urls": ["http://a.example/", "http://b.example/"],
+                                                             "google_safe_browsing": True}))
+    assert [line["cascade"] for line in lines] == ["numeric", "numeric"]
+    assert "google_safe_browsing" not in lines[0]
+
+
+def test_batch_lookups_report_pending_virustotal(app_module):
+    lines = batch_lines(app_module.app.test_client().post(
+        "/analyze/batch", json={"urls": ["http://vt-pending.example/"], "virustotal": True}))
+    assert lines[0]["virustotal_status"] in ("pending", "failed")
+    assert lines[0]["virustotal"] is None
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+URL = "http://shop.example/account/login?id=7"
+
+
+@pytest.fixture(scope="module")
+def async_app(app_module):
+    import async_app
+    return async_app
+
+
+def run(async_app, requests):
+    """Run ``requests(client)`` against a fresh aiohttp app and return its result."""
+    async def go():
+        async with TestClient(TestServer(async_app.create_app())) as client:
+            return await requests(client)
+    return asyncio.run(go())
+
+
+def test_get_analyze_etag_matches_the_flask_app(app_module, async_app):
+    flask_etag = app_module.app.test_client().get("/analyze", query_string={"url": URL}).headers["ETag"]
+
+    async def requests(client):
+        response = await client.get("/analyze", params={"url": URL})
+        etag = response.headers["ETag"]
+        revalidated = await client.get("/analyze", params={"url": URL}, headers={"If-None-Match": etag})
+        return response.status, etag, revalidated.status, await revalidated.read()
+
+    status, etag, revalidated_status, revalidated_body = run(async_app, requests)
+    assert status == 200
+    assert etag == flask_etag
+    assert revalidated_status == 304
+    assert revalidated_body == b""
+
+
+def test_genai_explanation_uses_the_cascade_first_stage(async_app, cascade_decides_everything):
+
+    async def requests(client):
+        response = await client.get("/analyze/genai", params={"url": URL})
+        return response.status, await response.json()
+
+    status, body = run(async_app, requests)
+    assert status == 200
+    assert body["genai_status"] == "stub_success"
+
+
+async def batch_lines(client, payload):
+    response = await client.post("/analyze/batch", json=payload)
+    assert response.status == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    return [json.loads(line) for line in (await response.text()).splitlines()]
+
+
+def test_batch_streams_verdicts_in_input_order(app_module, async_app, monkeypatch):
+    monkeypatch.setattr(app_module, "BATCH_CHUNK_SIZE", 2)
+    urls = ["http://a.example/x", 42, "", "http://b.example/login.php?acct=1", "http://a.example/x", None]
+    lines = run(async_app, lambda client: batch_lines(client, {"urls": urls}))
+    assert [line["url"] for line in lines] == urls
+    assert [line.get("error") for line in lines] == [None, "Invalid URL", "Invalid URL", None, None, "Invalid URL"]
+    assert lines[0] == lines[4]
+    # Same answers as the Flask app
+    flask_lines = app_module.app.test_client().post("/analyze/batch", json={"urls": urls}).get_data(as_text=True)
+    assert lines == [json.loads(line) for line in flask_lines.splitlines()]
+
+
+def test_batch_rejects_missing_and_oversized_requests(app_module, async_app, monkeypatch):
+    monkeypatch.setattr(app_module, "MAX_BATCH_URLS", 3)
+
+    async def requests(client):
+        statuses = [(await client.post("/analyze/batch", json=payload)).status
+                    for payload in ({}, {"urls": []}, {"urls": ["http://a.example/"] * 4})]
+        statuses.append((await client.post("/analyze/batch", data="not json")).status)
+        statuses.append((await client.get("/analyze")).status)
+        return statuses
+
+    assert run(async_app, requests) == [400, 400, 413, 400, 400]
+
+
+def test_listed_domains_and_cascade_skip_scoring(app_module, async_app, domain_lists, cascade_decides_everything):
+    async def requests(client):
+        single = await (await client.get("/analyze", params={"url": "https://login.evil.example/a"})).json()
+        lines = await batch_lines(client, {"urls": ["https://www.good.example/", "http://other.example/"]})
+        return single, lines
+
+    single, lines = run(async_app, requests)
+    assert (single["domain_list"], single["threat"]) == ("deny", True)
+    assert lines[0]["domain_list"] == "allow"
+    assert lines[1]["cascade"] == "numeric"
+
+
+def test_genai_streams_server_sent_events(async_app):
+    async def requests(client):
+        response = await client.get("/analyze/genai", params={"url": "http://sse.example/", "stream": "1"})
+        return response.headers["Content-Type"], await response.text()
+
+    content_type, text = run(async_app, requests)
+    assert content_type.startswith("text/event-stream")
+    events = [block.split("\n", 1) for block in text.strip().split("\n\n")]
+    assert events[-1][0] == "event: done"
+    done = json.loads(events[-1][1].removeprefix("data: "))
+    assert done["genai_status"] == "stub_success"
+    chunks = "".join(json.loads(data.removeprefix("data: "))["text"] for event, data in events[:-1])
+    assert chunks in ("", done["genai_analysis"])
+
+
+def test_status_endpoints(app_module, async_app):
+    async def requests(client):
+        home = await (await client.get("/")).text()
+        vt = await (await client.get("/analyze/virustotal", params={"url": "http://vt.example/", "enqueue": "0"})).json()
+        stats = await (await client.get("/cache/stats")).json()
+        missing = (await client.get("/analyze/virustotal")).status
+        return home, vt, stats, missing
+
+    home, vt, stats, missing = run(async_app, requests)
+    assert home == "URL Threat Detector API is Live!"
+    assert vt == {"url": "http://vt.example/", "virustotal_status": "unknown", "virustotal": None}
+    assert stats == app_module.cache.stats()
+    assert missing == 400
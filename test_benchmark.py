@@ -0,0 +1,32 @@
+import csv
+
+import benchmark
+from synthetic_urls import generate_urls, write_csv
+
+
+def test_corpus_is_seeded_and_labelled(tmp_path):
+    assert generate_urls(200, seed=9) == generate_urls(200, seed=9)
+    urls, labels = generate_urls(2000, seed=9, phishing_ratio=0.1)
+    assert 0.05 < sum(labels) / len(labels) < 0.15
+
+    path = tmp_path / "corpus.csv"
+    write_csv(str(path), 50, seed=9)
+    rows = list(csv.DictReader(open(path, encoding="utf-8")))
+    assert [row["url"] for row in rows] == generate_urls(50, seed=9)[0]
+    assert {row["label"] for row in rows} <= {"0", "1"}
+
+
+def test_compare_flags_slower_throughput_and_latency():
+    old = {"results": {"features": {"urls_per_s": 1000.0, "runs_per_s": [1000.0]},
+                       "analyze": {"cold": {"p50_ms": 10.0, "p99_ms": 20.0}}, "train": {"rows": 5}}}
+    new = {"results": {"features": {"urls_per_s": 850.0, "runs_per_s": [850.0]},
+                       "analyze": {"cold": {"p50_ms": 10.5, "p99_ms": 30.0}}, "train": {"rows": 5}}}
+    rows = {metric: regressed for metric, _, _, _, regressed in benchmark.compare(new, old, tolerance=0.10)}
+    assert rows == {"features.urls_per_s": True, "analyze.cold.p50_ms": False, "analyze.cold.p99_ms": True}
+
+
+def test_timed_runs_after_a_warm_up():
+    calls = []
+    runs = benchmark.timed(lambda: calls.append(1), repeats=3)
+    assert len(runs) == 3 and len(calls) == 4
+    assert benchmark.throughput("urls", 10, [1.0, 2.0, 4.0])["urls_per_s"] == 5.0
@@ -0,0 +1,52 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from xgboost import XGBClassifier
+
+import cascade
+import fast_inference
+import model_bundle
+from features import FEATURE_NAMES, extract_features_batch
+from synthetic_urls import generate_urls
+
+
+def test_band_keeps_every_url_stage_two_flags():
+    labels = np.array([1, 1, 1, 0, 0, 0, 0])
+    p2 = np.array([0.95, 0.97, 0.20, 0.10, 0.30, 0.95, 0.05])
+    p1 = np.array([0.30, 0.99, 0.01, 0.02, 0.93, 0.40, 0.60])
+    low, high = cascade.choose_band(p1, p2, labels, 0.9)
+    # The flagged positive at 0.30 bounds low; the cleared negative at 0.93 bounds high
+    assert low == 0.30
+    assert high == np.nextafter(0.93, np.inf)
+    # Neither edge crosses the threshold
+    assert cascade.choose_band(p1 / 10, p2, labels, 0.9) == (0.03, 0.9)
+    # Confident stage-1 scores never clear a URL above MAX_LOW
+    low, _ = cascade.choose_band(np.full(7, 0.85), p2, labels, 0.9, max_low=0.5)
+    assert low == 0.5
+
+
+def test_decide_splits_on_the_band():
+    engine = fast_inference.TreeEnsemble.from_model(
+        XGBClassifier(n_estimators=3, max_depth=2).fit(np.array([[0.0], [1.0], [2.0], [3.0]]), [0, 0, 1, 1]))
+    stage = cascade.Cascade(engine, [0.0, 1.0], [0.0, 1.0], low=0.4, high=0.6)
+    probs, decided = stage.decide(np.array([[0.0], [3.0]]))
+    assert decided.tolist() == [(p < 0.4 or p >= 0.6) for p in probs]
+    combined, _ = cascade.combine(stage, probs, np.full(2, 0.5))
+    assert np.array_equal(combined, np.where(decided, probs, 0.5))
+
+
+def test_bundle_round_trips_the_cascade(tmp_path):
+    urls, labels = generate_urls(3000, seed=5, phishing_ratio=0.3)
+    vectorizer = TfidfVectorizer(max_features=300).fit(urls)
+    X = fast_inference.combine_features(extract_features_batch(urls), vectorizer.transform(urls))
+    model = XGBClassifier(n_estimators=20, max_depth=4).fit(X, labels)
+    stage, report = cascade.fit(urls, labels, model, vectorizer, 0.9)
+    assert 0.0 <= stage.low <= 0.5 and stage.high >= 0.9
+    # The band is chosen on other hold-out rows than the report's, so recall is close rather than equal
+    assert report["cascade"]["recall"] >= report["full"]["recall"] - 0.05
+
+    feature_names = FEATURE_NAMES + vectorizer.get_feature_names_out().tolist()
+    model_bundle.save(model, vectorizer, feature_names, root=str(tmp_path), cascade=stage)
+    bundle = model_bundle.load(root=str(tmp_path))
+    assert (bundle.cascade.low, bundle.cascade.high) == (stage.low, stage.high)
+    numeric = extract_features_batch(urls[:50])
+    assert np.allclose(bundle.cascade.stage_one(numeric), stage.stage_one(numeric))
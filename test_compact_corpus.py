@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import compact_corpus
+import feature_cache
+import tournament
+
+
+def test_canonical_urls_ignore_tracking_and_parameter_order():
+    assert compact_corpus.canonicalize("HTTP://Example.COM:80/a?b=2&utm_source=x&a=1#frag") == \
+        compact_corpus.canonicalize("http://example.com/a?a=1&b=2&fbclid=abc")
+    assert compact_corpus.canonicalize("http://example.com/a?a=1") != compact_corpus.canonicalize("http://example.com/A?a=1")
+
+
+def test_near_duplicates_collapse_into_weighted_groups():
+    urls = [f"http://paypal-verify.example/login/session?id={i}&ref=mail" for i in range(8)]
+    urls += ["http://paypal-verify.example/login/session?ref=mail&id=3&utm_campaign=x"]
+    urls += [f"https://site{i}.example/{word}/index.html" for i, word in enumerate(["news", "shop", "blog", "docs"])]
+    labels = [1] * 9 + [0] * 4
+    result, stats = compact_corpus.compact(urls, labels)
+
+    assert stats["canonical"] == 12
+    assert result["url"].tolist() == [urls[0]] + urls[9:]
+    assert result["rows"].tolist() == [9, 1, 1, 1, 1]
+    assert result["group"].nunique() == 5
+    # Each label keeps its share of the input, with weights averaging 1
+    assert stats["weighted_share"][1] == pytest.approx(9 / 13, abs=1e-5)
+    assert result["weight"].mean() == pytest.approx(1.0, abs=1e-5)
+
+    by_size, _ = compact_corpus.compact(urls, labels, weighting="group")
+    assert by_size["weight"].tolist() == pytest.approx([9 * 5 / 13] + [5 / 13] * 4, abs=1e-5)
+
+
+def test_signatures_do_not_depend_on_row_order():
+    sets = [compact_corpus.tokens(f"http://a{i}.example/x/y") for i in range(30)]
+    forward = compact_corpus.signatures(sets)
+    assert np.array_equal(compact_corpus.signatures(sets[::-1])[::-1], forward)
+
+
+def test_group_splits_keep_groups_together(tmp_path):
+    groups = np.repeat(np.arange(500), 4)
+    labels = groups % 2
+    train_idx, test_idx = tournament.split(labels, groups)
+    assert not set(groups[train_idx]) & set(groups[test_idx])
+    assert 0.1 < len(test_idx) / len(labels) < 0.3
+    for fit_idx, val_idx in tournament.cv_folds(labels[train_idx], groups[train_idx]):
+        assert not set(groups[train_idx][fit_idx]) & set(groups[train_idx][val_idx])
+
+    path = tmp_path / "compact.csv"
+    path.write_text("url,label,weight,group,rows\nhttp://a.example/,1,0.5,0,2\nhttp://b.example/,0,1.5,1,1\n")
+    weights, groups = feature_cache.load_weights(str(path))
+    assert weights.tolist() == [0.5, 1.5] and groups.tolist() == [0, 1]
+    path.write_text("url,label\nhttp://a.example/,1\n")
+    assert feature_cache.load_weights(str(path)) == (None, None)
@@ -0,0 +1,137 @@
+import time
+
+import numpy as np
+import pytest
+
+import build_domain_index
+import domain_filter
+from domain_filter import DomainIndex, host_of, normalize_entry, suffixes
+
+
+def write_list(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    allow = write_list(tmp_path / "allow.csv", ["1,google.com", "2,github.com", "3,mail.evil-host.net"])
+    deny = write_list(tmp_path / "deny.txt", ["# blocklist", "0.0.0.0 evil-host.net", "phish.example",
+                                              "sites.google.com", "*.badcdn.io"])
+    root = tmp_path / "db"
+    assert build_domain_index.build(str(root), allow=[allow], deny=[deny]) == {"allow": 3, "deny": 4}
+    return root
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("example.com", "example.com"),
+    ("Example.COM.", "example.com"),
+    ("0.0.0.0 ads.example.com", "ads.example.com"),
+    ("127.0.0.1\tads.example.com  # tracker", "ads.example.com"),
+    ("42,example.org", "example.org"),
+    ("*.example.net", "example.net"),
+    ("# comment", None),
+    ("", None),
+    ("127.0.0.1 localhost", None),
+])
+def test_normalize_entry(line, expected):
+    assert normalize_entry(line) == expected
+
+
+def test_host_and_suffixes():
+    assert host_of("HTTPS://User@Sub.Example.COM.:8443/path?q") == "sub.example.com"
+    assert host_of("example.com/login") == "example.com"
+    assert host_of("http://[::1") == ""
+    assert suffixes("a.b.example.co.uk") == ["a.b.example.co.uk", "b.example.co.uk", "example.co.uk", "co.uk", "uk"]
+
+
+def test_allow_and_deny_cover_subdomains(index_dir):
+    index = DomainIndex(str(index_dir))
+    assert index.check("https://www.google.com/search?q=x") == "allow"
+    assert index.check("https://github.com/") == "allow"
+    assert index.check("http://login.phish.example/verify") == "deny"
+    assert index.check("http://cdn1.badcdn.io/x.js") == "deny"
+    assert index.check("https://notgoogle.com/") is None
+    assert index.check("https://google.com.evil.xyz/") is None
+    assert index.check("not a url") is None
+
+
+def test_most_specific_match_wins(index_dir):
+    index = DomainIndex(str(index_dir))
+    # Denied subdomain of an allowed domain, and the other way round
+    assert index.check("https://sites.google.com/view/fake-login") == "deny"
+    assert index.check("https://mail.evil-host.net/") == "allow"
+    assert index.check("https://www.evil-host.net/") == "deny"
+
+
+def test_deny_wins_a_tie(tmp_path):
+    listed = write_list(tmp_path / "both.txt", ["both.example"])
+    build_domain_index.build(str(tmp_path / "db"), allow=[listed], deny=[listed])
+    assert DomainIndex(str(tmp_path / "db")).check("http://both.example/") == "deny"
+
+
+def test_lists_are_memory_mapped_and_sized(index_dir):
+    index = DomainIndex(str(index_dir))
+    assert isinstance(index.lists["allow"].base, np.memmap)
+    assert index.stats() == {"allow": {"entries": 3, "bytes": 24}, "deny": {"entries": 4, "bytes": 32}}
+
+
+def test_rebuilding_one_list_is_picked_up_without_restart(index_dir, tmp_path):
+    index = DomainIndex(str(index_dir), reload_interval=0)
+    old = index.lists["deny"]
+    assert index.check("http://new-threat.example/") is None
+
+    time.sleep(0.01)
+    build_domain_index.build(str(index_dir), deny=[write_list(tmp_path / "deny2.txt", ["new-threat.example"])])
+    assert index.check("http://new-threat.example/") == "deny"
+    assert index.check("http://phish.example/") is None
+    assert index.check("https://www.google.com/") == "allow"
+    # Arrays already handed out stay readable after the swap
+    assert len(old) == 4
+    assert len([f for f in index_dir.iterdir() if f.suffix == ".npy"]) == 2
+
+
+def test_missing_index_lists_nothing(tmp_path):
+    assert DomainIndex(str(tmp_path / "nowhere")).check("https://www.google.com/") is None
+
+
+def test_process_wide_index_is_off_without_a_directory(monkeypatch):
+    monkeypatch.setattr(domain_filter, "DB_DIR", "")
+    assert domain_filter.index() is None
+    assert domain_filter.check("https://www.google.com/") is None
+
+
+def test_benchmark_reports_rate_and_memory():
+    result = build_domain_index.benchmark(1000, lookups=200)
+    assert result["hit_rate"] == 0.5
+    assert result["index_mb_per_million"] == pytest.approx(8e6 / 2 ** 20, rel=0.01)
+    assert result["lookups_per_s"] > 0
+
+
+def test_allow_entries_do_not_cover_shared_hosting_tenants(tmp_path):
+    allow = write_list(tmp_path / "allow.csv", ["1,github.io", "2,blogspot.com", "3,000webhostapp.com",
+                                                "4,mysite.github.io", "5,bbc.co.uk"])
+    deny = write_list(tmp_path / "deny.txt", ["herokuapp.com"])
+    root = str(tmp_path / "db")
+    assert build_domain_index.build(root, allow=[allow], deny=[deny]) == {"allow": 2, "deny": 1}
+    index = DomainIndex(root)
+    assert index.check("https://paypal-verify-acct.github.io/login") is None
+    assert index.check("http://secure-bank-update.000webhostapp.com/x") is None
+    assert index.check("https://evil.blogspot.com") is None
+    # Entries at or below a tenant's registrable domain still apply
+    assert index.check("https://mysite.github.io/") == "allow"
+    assert index.check("https://www.mysite.github.io/") == "allow"
+    assert index.check("https://www.bbc.co.uk/news") == "allow"
+    # Deny entries keep covering subdomains
+    assert index.check("https://anything.herokuapp.com/") == "deny"
+
+
+def test_public_suffix_list_file(tmp_path, monkeypatch):
+    psl = write_list(tmp_path / "psl.dat", ["// comment", "com", "*.ck", "!www.ck", "example-hosting.net"])
+    monkeypatch.setattr(domain_filter, "PUBLIC_SUFFIX_LIST", psl)
+    monkeypatch.setattr(domain_filter, "_suffix_rules", None)
+    assert domain_filter.public_suffix_labels("a.b.example-hosting.net") == 2
+    assert domain_filter.public_suffix_labels("shop.foo.ck") == 2
+    assert domain_filter.public_suffix_labels("www.ck") == 1
+    assert domain_filter.public_suffix_labels("example.com") == 1
+    monkeypatch.setattr(domain_filter, "_suffix_rules", None)
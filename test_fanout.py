@@ -0,0 +1,93 @@
+import time
+
+import fanout
+
+# Stub providers with latencies similar to the real upstreams
+STUB_LATENCIES = {
+    "google_safe_browsing": 0.15,
+    "virustotal": 0.30,
+    "genai": 0.45,
+}
+
+
+def make_stub(name, delay, value=True):
+    def provider(url):
+        time.sleep(delay)
+        return f"{name}:{url}" if value is True else value
+    return provider
+
+
+def stub_providers(latencies=STUB_LATENCIES):
+    return {name: make_stub(name, delay) for name, delay in latencies.items()}
+
+
+def run_serial(providers, url):
+    return {name: fn(url) for name, fn in providers.items()}
+
+
+def test_fan_out_takes_max_not_sum():
+    providers = stub_providers()
+    start = time.perf_counter()
+    results = fanout.fan_out(providers, "http://example.com")
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status == "ok" for r in results.values())
+    assert results["virustotal"].value == "virustotal:http://example.com"
+    assert elapsed < sum(STUB_LATENCIES.values()) * 0.75
+    assert elapsed >= max(STUB_LATENCIES.values())
+
+
+def test_deadline_drops_slow_provider():
+    providers = stub_providers({"fast": 0.05, "slow": 1.0})
+    start = time.perf_counter()
+    results = fanout.fan_out(providers, "http://example.com", deadlines={"fast": 0.5, "slow": 0.2})
+    elapsed = time.perf_counter() - start
+
+    assert results["fast"].status == "ok"
+    assert results["slow"].status == "timeout"
+    assert results["slow"].value is None
+    assert elapsed < 0.5
+
+
+def test_provider_error_is_reported():
+    def broken(url):
+        raise RuntimeError("upstream down")
+
+    results = fanout.fan_out({"broken": broken, "ok": make_stub("ok", 0.01)}, "http://example.com")
+
+    assert results["broken"].status == "error"
+    assert isinstance(results["broken"].error, RuntimeError)
+    assert results["ok"].status == "ok"
+
+
+def test_start_overlaps_caller_work():
+    pending = fanout.start(stub_providers({"a": 0.2, "b": 0.2}), "http://example.com")
+    start = time.perf_counter()
+    time.sleep(0.2)  # stands in for ML scoring
+    results = fanout.collect(pending, {})
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status == "ok" for r in results.values())
+    assert elapsed < 0.35
+
+
+# ✅ Run the harness directly to compare serial vs fan-out latency
+if __name__ == "__main__":
+    providers = stub_providers()
+    url = "http://example.com/login"
+    rounds = 5
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        run_serial(providers, url)
+    serial = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fanout.fan_out(providers, url)
+    concurrent = (time.perf_counter() - start) / rounds
+
+    print(f"Stub latencies: {STUB_LATENCIES}")
+    print(f"Serial:  {serial * 1000:.1f} ms per request (sum = {sum(STUB_LATENCIES.values()) * 1000:.0f} ms)")
+    print(f"Fan-out: {concurrent * 1000:.1f} ms per request (max = {max(STUB_LATENCIES.values()) * 1000:.0f} ms)")
+    print(f"Speedup: {serial / concurrent:.2f}x")
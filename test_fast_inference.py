@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from lightgbm import LGBMClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from xgboost import XGBClassifier
+
+import fast_inference
+from features import extract_features_batch
+from synthetic_urls import generate_urls
+
+MODELS = {
+    "xgboost": lambda: XGBClassifier(n_estimators=30, max_depth=5),
+    "lightgbm": lambda: LGBMClassifier(n_estimators=30, num_leaves=15, verbose=-1),
+}
+
+
+@pytest.fixture(scope="module")
+def data():
+    urls, labels = generate_urls(3000, seed=3, phishing_ratio=0.3)
+    vectorizer = TfidfVectorizer(max_features=300).fit(urls[:2000])
+    X = fast_inference.combine_features(extract_features_batch(urls), vectorizer.transform(urls))
+    return X[:2000], np.asarray(labels[:2000]), X[2000:]
+
+
+@pytest.mark.parametrize("kind", sorted(MODELS))
+def test_tree_ensemble_matches_native_predict_proba(data, kind):
+    X_train, y_train, X_test = data
+    model = MODELS[kind]().fit(X_train, y_train)
+    engine = fast_inference.TreeEnsemble.from_model(model)
+    assert engine.kind == kind
+
+    expected = model.predict_proba(X_test)
+    assert np.allclose(engine.predict_proba(X_test), expected, atol=1e-6)
+    for i in range(20):
+        assert np.allclose(engine.predict_proba(X_test[i]), expected[i:i + 1], atol=1e-6)
+    assert np.array_equal(engine.predict(X_test), (expected[:, 1] > 0.5).astype(int))
+
+
+@pytest.mark.parametrize("kind", sorted(MODELS))
+def test_tree_ensemble_routes_missing_values_like_the_booster(kind):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 6))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    X[rng.random(X.shape) < 0.2] = np.nan
+    model = MODELS[kind]().fit(X, y)
+    engine = fast_inference.TreeEnsemble.from_model(model)
+    assert np.allclose(engine.predict_proba(X[:200]), model.predict_proba(X[:200]), atol=1e-6)
+    assert np.allclose(engine.predict_proba(X[:1]), model.predict_proba(X[:1]), atol=1e-6)
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+import genai
+import verdict_cache
+from genai import Explainer, Generation, StubProvider
+from upstream import UpstreamError
+
+
+def finished(explainer, url):
+    explanation, generation = explainer.start(url)
+    return explanation if generation is None else generation.wait(5)
+
+
+@pytest.fixture
+def cache():
+    return verdict_cache.VerdictCache()
+
+
+def test_stub_explanation_streams_and_is_cached(cache):
+    stub = StubProvider(text="This site looks fine.", delay=0)
+    explainer = Explainer(cache, providers=[stub])
+
+    explanation, generation = explainer.start("http://example.com/")
+    assert explanation is None
+    assert "".join(generation.follow(timeout=5)) == "This site looks fine."
+    assert generation.wait(5) == {"text": "This site looks fine.", "status": "stub_success",
+                                  "source": "Stub", "truncated": False}
+
+    # A repeat hit comes from the cache without calling the provider again
+    explanation, generation = explainer.start("http://example.com/")
+    assert generation is None and explanation["text"] == "This site looks fine."
+    assert stub.calls == 1
+    assert explainer.stats()["hits"] == 1
+
+
+def test_concurrent_requests_share_one_generation(cache):
+    stub = StubProvider(text="one two three four", delay=0.05)
+    explainer = Explainer(cache, providers=[stub])
+
+    _, first = explainer.start("http://shared.example/")
+    _, second = explainer.start("http://shared.example/")
+    assert first is second
+    assert "".join(second.follow(timeout=5)) == "one two three four"
+    assert stub.calls == 1
+    assert explainer.stats()["joined"] == 1
+
+
+def test_late_reader_gets_the_text_from_the_start(cache):
+    explainer = Explainer(cache, providers=[StubProvider(text="a b c d e f", delay=0.02)])
+    _, generation = explainer.start("http://late.example/")
+    time.sleep(0.07)
+    assert "".join(generation.follow(timeout=5)) == "a b c d e f"
+
+
+def test_token_budget_caps_the_explanation(cache):
+    explainer = Explainer(cache, providers=[StubProvider(text="a b c d e f", delay=0)], max_tokens=3)
+    explanation = finished(explainer, "http://tokens.example/")
+    assert explanation["text"] == "a b c"
+    assert explanation["truncated"] is True
+    explainer = Explainer(cache, providers=[StubProvider(text="a b c", delay=0)], max_tokens=3)
+    assert finished(explainer, "http://fits.example/")["truncated"] is False
+
+
+def test_openai_length_finish_marks_the_explanation_truncated(cache, monkeypatch):
+    chunks = [{"choices": [{"delta": {"content": "Looks"}, "finish_reason": None}]},
+              {"choices": [{"delta": {"content": " risky"}, "finish_reason": None}]},
+              {"choices": [{"delta": {}, "finish_reason": "length"}]}]
+    monkeypatch.setattr(genai.openai.ChatCompletion, "create", lambda **kwargs: iter(chunks))
+    explanation = finished(Explainer(cache, providers=[genai.OpenAIProvider()]), "http://openai.example/")
+    assert explanation["text"] == "Looks risky"
+    assert explanation["status"] == "openai_success"
+    assert explanation["truncated"] is True
+
+
+def test_time_budget_keeps_partial_text_and_marks_it_truncated(cache):
+    explainer = Explainer(cache, providers=[StubProvider(text=" ".join(["word"] * 50), delay=0.05)],
+                          time_budget=0.2)
+    started = time.monotonic()
+    explanation = finished(explainer, "http://slow.example/")
+    assert time.monotonic() - started < 1
+    assert explanation["truncated"]
+    assert 0 < len(explanation["text"].split()) < 50
+
+
+def test_falls_back_to_next_provider_before_any_text(cache):
+    broken = StubProvider(error=UpstreamError("quota exceeded"))
+    broken.name, broken.status = "openai", "openai_success"
+    explainer = Explainer(cache, providers=[broken, StubProvider(text="fallback", delay=0)])
+    explanation = finished(explainer, "http://fallback.example/")
+    assert explanation["text"] == "fallback" and explanation["source"] == "Stub"
+    assert broken.calls == 1
+
+
+def test_failures_are_reported_and_not_cached(cache):
+    broken = StubProvider(error=UpstreamError("down"))
+    explainer = Explainer(cache, providers=[broken])
+    explanation = finished(explainer, "http://down.example/")
+    assert explanation["status"] == "stub_error"
+    assert "down" in explanation["text"]
+    finished(explainer, "http://down.example/")
+    assert broken.calls == 2
+
+
+def test_domain_cache_key_shares_explanations_across_paths(cache):
+    stub = StubProvider(text="site wide", delay=0)
+    explainer = Explainer(cache, providers=[stub], cache_key="domain")
+    finished(explainer, "https://shop.example/cart?id=1")
+    assert finished(explainer, "https://shop.example/checkout")["text"] == "site wide"
+    assert finished(explainer, "shop.example/other")["text"] == "site wide"
+    assert stub.calls == 2  # https:// and http:// are different sites
+
+
+def test_generation_read_times_out_without_news():
+    generation = Generation("http://idle.example/")
+    assert generation.read(0, timeout=0.01) == ([], None)
+    assert list(generation.follow(timeout=0.01)) == []
+
+    threading.Timer(0.02, generation.add, ["x"]).start()
+    assert generation.read(0, timeout=5) == (["x"], None)
+
+
+def test_sse_format():
+    assert genai.sse("chunk", {"text": "hi"}) == 'event: chunk\ndata: {"text": "hi"}\n\n'
+
+
+def test_providers_from_env():
+    providers = genai.providers_from_env("openai, huggingface,stub")
+    assert [p.name for p in providers] == ["openai", "huggingface", "stub"]
@@ -0,0 +1,44 @@
+import pandas as pd
+
+import streaming_train
+from label_store import LabelStore
+
+
+def test_incremental_merge_writes_only_changes(tmp_path):
+    store = LabelStore(str(tmp_path / "labels.db"))
+    assert store.ingest(["http://a.example/", "http://b.example/"], [1, 0], "feed", observed_at=10) == (2, 0)
+    assert store.ingest(["http://a.example/", "http://c.example/"], [1, 0], "feed", observed_at=20) == (1, 0)
+    assert store.version() == 3
+    urls, labels, version = store.snapshot()
+    assert sorted(zip(urls, labels.tolist())) == [("http://a.example/", 1), ("http://b.example/", 0),
+                                                  ("http://c.example/", 0)]
+    assert version == 3
+
+
+def test_newer_relabel_wins(tmp_path):
+    store = LabelStore(str(tmp_path / "labels.db"))
+    store.ingest(["http://a.example/"], [0], "feed", observed_at=10)
+    assert store.ingest(["http://a.example/"], [1], "triage", observed_at=20) == (0, 1)
+    assert store.snapshot()[1].tolist() == [1]
+
+
+def test_out_of_order_label_does_not_override_repeated_newer_label(tmp_path):
+    store = LabelStore(str(tmp_path / "labels.db"))
+    for observed_at in (10, 20, 30):
+        store.ingest(["http://a.example/"], [1], "feed", observed_at=observed_at)
+    assert store.ingest(["http://a.example/"], [0], "late-feed", observed_at=25) == (0, 0)
+    assert store.snapshot()[1].tolist() == [1]
+    assert store.ingest(["http://a.example/"], [0], "triage", observed_at=35) == (0, 1)
+    assert store.snapshot()[1].tolist() == [0]
+
+
+def test_streaming_training_reads_a_label_store(tmp_path):
+    store = LabelStore(str(tmp_path / "labels.db"))
+    store.ingest([f"http://{i}.example/" for i in range(5)], [i % 2 for i in range(5)], "feed", observed_at=1)
+    store.close()
+    csv_path = streaming_train.export_store(str(tmp_path / "labels.db"), str(tmp_path / "cache"))
+    assert csv_path.endswith("labels-v5.csv")
+    assert len(pd.read_csv(csv_path)) == 5
+    mtime = (tmp_path / "cache" / "labels-v5.csv").stat().st_mtime
+    assert streaming_train.export_store(str(tmp_path / "labels.db"), str(tmp_path / "cache")) == csv_path
+    assert (tmp_path / "cache" / "labels-v5.csv").stat().st_mtime == mtime
@@ -0,0 +1,266 @@
+import base64
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+import local_safe_browsing as sb
+import update_safe_browsing
+from local_safe_browsing import PrefixStore, canonicalize, expressions
+
+# Canonicalization examples from the Safe Browsing Update API documentation
+CANONICAL = [
+    ("http://host/%25%32%35", "http://host/%25"),
+    ("http://host/%25%32%35%25%32%35", "http://host/%25%25"),
+    ("http://host/%2525252525252525", "http://host/%25"),
+    ("http://host/asdf%25%32%35asd", "http://host/asdf%25asd"),
+    ("http://host/%%%25%32%35asd%%", "http://host/%25%25%25asd%25%25"),
+    ("http://www.google.com/", "http://www.google.com/"),
+    ("http://%31%36%38%2e%31%38%38%2e%39%39%2e%32%36/%2E%73%65%63%75%72%65/%77%77%77%2E%65%62%61%79%2E%63%6F%6D/",
+     "http://168.188.99.26/.secure/www.ebay.com/"),
+    ("http://195.127.0.11/uploads/%20%20%20%20/.verify/.eBaysecure=updateuserdataxplimnbqmn-xplmvalidateinfoswqpcmlx=hgplmcx/",
+     "http://195.127.0.11/uploads/%20%20%20%20/.verify/.eBaysecure=updateuserdataxplimnbqmn-xplmvalidateinfoswqpcmlx=hgplmcx/"),
+    ("http://host%23.com/%257Ea%2521b%2540c%2523d%2524e%25f%255E00%252611%252A22%252833%252944_55%252B",
+     "http://host%23.com/~a!b@c%23d$e%25f^00&11*22(33)44_55+"),
+    ("http://3279880203/blah", "http://195.127.0.11/blah"),
+    ("http://www.google.com/blah/..", "http://www.google.com/"),
+    ("www.google.com/", "http://www.google.com/"),
+    ("www.google.com", "http://www.google.com/"),
+    ("http://www.evil.com/blah#frag", "http://www.evil.com/blah"),
+    ("http://www.GOOgle.com/", "http://www.google.com/"),
+    ("http://www.google.com.../", "http://www.google.com/"),
+    ("http://www.google.com/foo\tbar\rbaz\n2", "http://www.google.com/foobarbaz2"),
+    ("http://www.google.com/q?", "http://www.google.com/q?"),
+    ("http://www.google.com/q?r?", "http://www.google.com/q?r?"),
+    ("http://www.google.com/q?r?s", "http://www.google.com/q?r?s"),
+    ("http://evil.com/foo#bar#baz", "http://evil.com/foo"),
+    ("http://evil.com/foo;", "http://evil.com/foo;"),
+    ("http://evil.com/foo?bar;", "http://evil.com/foo?bar;"),
+    (b"http://\x01\x80.com/", "http://%01%80.com/"),
+    ("http://notrailingslash.com", "http://notrailingslash.com/"),
+    ("http://www.gotaport.com:1234/", "http://www.gotaport.com/"),
+    ("  http://www.google.com/  ", "http://www.google.com/"),
+    ("http:// leadingspace.com/", "http://%20leadingspace.com/"),
+    ("http://%20leadingspace.com/", "http://%20leadingspace.com/"),
+    ("%20leadingspace.com/", "http://%20leadingspace.com/"),
+    ("https://www.securesite.com/", "https://www.securesite.com/"),
+    ("http://host.com/ab%23cd", "http://host.com/ab%23cd"),
+    ("http://host.com//twoslashes?more//slashes", "http://host.com/twoslashes?more//slashes"),
+]
+
+
+@pytest.mark.parametrize("url, expected", CANONICAL)
+def test_canonicalize(url, expected):
+    assert canonicalize(url) == expected
+
+
+def test_expressions_follow_the_documented_examples():
+    assert expressions("http://a.b.c/1/2.html?param=1") == [
+        "a.b.c/1/2.html?param=1", "a.b.c/1/2.html", "a.b.c/", "a.b.c/1/",
+        "b.c/1/2.html?param=1", "b.c/1/2.html", "b.c/", "b.c/1/",
+    ]
+    assert expressions("http://a.b.c.d.e.f.g/1.html") == [
+        "a.b.c.d.e.f.g/1.html", "a.b.c.d.e.f.g/",
+        "c.d.e.f.g/1.html", "c.d.e.f.g/", "d.e.f.g/1.html", "d.e.f.g/",
+        "e.f.g/1.html", "e.f.g/", "f.g/1.html", "f.g/",
+    ]
+    assert expressions("http://1.2.3.4/1/") == ["1.2.3.4/1/", "1.2.3.4/"]
+
+
+def test_expressions_are_capped_at_thirty():
+    many = expressions("http://a.b.c.d.e.f.g.h/1/2/3/4/5/6.html?q=1")
+    assert len(many) == 30
+    assert len(set(many)) == 30
+
+
+def load_fixture(root, listed):
+    return update_safe_browsing.apply_update(str(root), update_safe_browsing.fixture_response(listed))
+
+
+def test_fixture_update_and_local_lookup(tmp_path):
+    applied = load_fixture(tmp_path, {"MALWARE": ["evil.example/", "phish.test/login/"],
+                                      "SOCIAL_ENGINEERING": ["phish.test/login/"]})
+    assert applied == {"MALWARE/ANY_PLATFORM/URL": 2, "SOCIAL_ENGINEERING/ANY_PLATFORM/URL": 1}
+
+    store = PrefixStore(str(tmp_path))
+    assert store.fresh
+    assert isinstance(store.lists["MALWARE/ANY_PLATFORM/URL"].base, np.memmap)
+
+    hits = store.lookup("http://www.evil.example/any/page.php?x=1")
+    assert list(hits.values()) == [["MALWARE/ANY_PLATFORM/URL"]]
+    assert sb.full_hash("evil.example/") in hits
+
+    hits = store.lookup("https://phish.test/login/index.html")
+    assert hits[sb.full_hash("phish.test/login/")] == ["MALWARE/ANY_PLATFORM/URL", "SOCIAL_ENGINEERING/ANY_PLATFORM/URL"]
+
+    assert store.lookup("https://phish.test/other/") == {}
+    assert store.lookup("https://www.google.com/") == {}
+    assert sorted(store.client_states()) == sorted(
+        base64.b64encode(f"fixture-{t}".encode()).decode() for t in ("MALWARE", "SOCIAL_ENGINEERING"))
+
+
+def raw_hashes(expressions_):
+    keys = np.sort(sb.prefix_keys([sb.full_hash(e) for e in expressions_]))
+    return keys, base64.b64encode(keys.astype(">u4").tobytes()).decode()
+
+
+def test_partial_update_removes_by_index_and_verifies_checksum(tmp_path):
+    load_fixture(tmp_path, {"MALWARE": ["a.example/", "b.example/", "c.example/"]})
+    before = np.array(sb.load_prefixes(str(tmp_path), sb.read_state(str(tmp_path))["lists"]["MALWARE/ANY_PLATFORM/URL"]))
+    gone = int(np.flatnonzero(before == sb.prefix_keys([sb.full_hash("b.example/")])[0])[0])
+    added, blob = raw_hashes(["d.example/"])
+    after = np.sort(np.concatenate([np.delete(before, [gone]), added]))
+
+    partial = {"listUpdateResponses": [{
+        "threatType": "MALWARE", "platformType": "ANY_PLATFORM", "threatEntryType": "URL",
+        "responseType": "PARTIAL_UPDATE",
+        "removals": [{"compressionType": "RAW", "rawIndices": {"indices": [gone]}}],
+        "additions": [{"compressionType": "RAW", "rawHashes": {"prefixSize": 4, "rawHashes": blob}}],
+        "newClientState": "c3RhdGUy",
+        "checksum": {"sha256": sb.checksum(after)},
+    }]}
+    assert update_safe_browsing.apply_update(str(tmp_path), partial) == {"MALWARE/ANY_PLATFORM/URL": 3}
+
+    store = PrefixStore(str(tmp_path))
+    assert store.lookup("http://b.example/") == {}
+    assert store.lookup("http://d.example/x") and store.lookup("http://a.example/")
+    assert store.client_states() == ["c3RhdGUy"]
+    # The replaced array file is gone
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".npy")]) == 1
+
+
+def test_checksum_mismatch_keeps_old_lists_and_resets_state(tmp_path):
+    load_fixture(tmp_path, {"MALWARE": ["a.example/"]})
+    _, blob = raw_hashes(["z.example/"])
+    bad = {"listUpdateResponses": [{
+        "threatType": "MALWARE", "platformType": "ANY_PLATFORM", "threatEntryType": "URL",
+        "responseType": "PARTIAL_UPDATE",
+        "additions": [{"compressionType": "RAW", "rawHashes": {"prefixSize": 4, "rawHashes": blob}}],
+        "newClientState": "bmV3", "checksum": {"sha256": base64.b64encode(b"\0" * 32).decode()},
+    }]}
+    assert update_safe_browsing.apply_update(str(tmp_path), bad) == {}
+
+    store = PrefixStore(str(tmp_path))
+    assert store.lookup("http://a.example/") and not store.lookup("http://z.example/")
+    request = update_safe_browsing.fetch_request(str(tmp_path))
+    assert request["listUpdateRequests"][0]["state"] == ""
+
+
+def test_longer_prefixes_are_truncated(tmp_path):
+    full = sb.full_hash("long.example/")
+    update = {"listUpdateResponses": [{
+        "threatType": "MALWARE", "platformType": "ANY_PLATFORM", "threatEntryType": "URL",
+        "responseType": "FULL_UPDATE",
+        "additions": [{"compressionType": "RAW", "rawHashes": {"prefixSize": 32,
+                                                                "rawHashes": base64.b64encode(full).decode()}}],
+        "newClientState": "cw==",
+    }]}
+    update_safe_browsing.apply_update(str(tmp_path), update)
+    assert PrefixStore(str(tmp_path)).lookup("http://long.example/page")
+
+
+def test_store_reloads_when_updater_swaps_lists(tmp_path):
+    load_fixture(tmp_path, {"MALWARE": ["old.example/"]})
+    store = PrefixStore(str(tmp_path), reload_interval=0)
+    assert store.lookup("http://old.example/")
+
+    time.sleep(0.01)
+    load_fixture(tmp_path, {"MALWARE": ["new.example/"]})
+    assert store.lookup("http://new.example/")
+    assert not store.lookup("http://old.example/")
+
+
+def test_stale_or_missing_store_is_not_fresh(tmp_path):
+    assert not PrefixStore(str(tmp_path)).fresh
+    load_fixture(tmp_path, {"MALWARE": ["a.example/"], "SOCIAL_ENGINEERING": ["b.example/"]})
+    assert PrefixStore(str(tmp_path), max_age=5).fresh
+    state_path = tmp_path / "state.json"
+    state = json.loads(state_path.read_text())
+    state["updated"] = time.time() - 10
+    state_path.write_text(json.dumps(state))
+    assert not PrefixStore(str(tmp_path), max_age=5).fresh
+
+
+def test_remote_confirmation_needs_a_full_hash_match(tmp_path):
+    load_fixture(tmp_path, {"MALWARE": ["evil.example/"]})
+    hits = PrefixStore(str(tmp_path)).lookup("http://evil.example/x")
+
+    payload = sb.full_hashes_payload(hits, ["c3RhdGU="])
+    prefix = sb.full_hash("evil.example/")[:4]
+    assert payload["threatInfo"]["threatEntries"] == [{"hash": base64.b64encode(prefix).decode()}]
+    assert payload["threatInfo"]["threatTypes"] == ["MALWARE"]
+
+    listed = {"matches": [{"threatType": "MALWARE", "threat": {"hash": base64.b64encode(sb.full_hash("evil.example/")).decode()}}]}
+    collision = {"matches": [{"threatType": "MALWARE", "threat": {"hash": base64.b64encode(prefix + b"\1" * 28).decode()}}]}
+    assert sb.confirmed(hits, listed)
+    assert not sb.confirmed(hits, collision)
+    assert not sb.confirmed(hits, {})
+
+
+def test_expressions_file_cli(tmp_path):
+    listing = tmp_path / "lists.txt"
+    listing.write_text("# fixture\nMALWARE evil.example/\nSOCIAL_ENGINEERING phish.test/login/\n")
+    response = update_safe_browsing.fixture_response(update_safe_browsing.read_expressions(str(listing)))
+    assert [u["threatType"] for u in response["listUpdateResponses"]] == ["MALWARE", "SOCIAL_ENGINEERING"]
+
+
+def list_update(threat_type, additions, checksum, response_type="FULL_UPDATE", removals=None):
+    return {
+        "threatType": threat_type, "platformType": "ANY_PLATFORM", "threatEntryType": "URL",
+        "responseType": response_type,
+        "removals": [{"compressionType": "RAW", "rawIndices": {"indices": removals}}] if removals else [],
+        "additions": [{"compressionType": "RAW", "rawHashes": {"prefixSize": len(prefixes[0]),
+                                                               "rawHashes": base64.b64encode(b"".join(prefixes)).decode()}}
+                      for prefixes in additions],
+        "newClientState": base64.b64encode(f"{threat_type}-{response_type}".encode()).decode(),
+        "checksum": {"sha256": base64.b64encode(hashlib.sha256(b"".join(sorted(checksum))).digest()).decode()},
+    }
+
+
+def test_long_prefixes_verify_and_match_in_full(tmp_path):
+    evil, phish = sb.full_hash("evil.example/"), sb.full_hash("phish.test/login/")
+    # Same first 4 bytes as evil.example/ but a different 5th byte: a 4-byte hit that must not match
+    decoy = evil[:4] + bytes([evil[4] ^ 0xFF]) + b"\0" * 3
+    short = [sb.full_hash(e)[:4] for e in ("a.example/", "b.example/")]
+    long = [evil[:8], decoy, phish[:5] + b"\1\2\3"]
+    listed = short + long
+    response = {"listUpdateResponses": [
+        list_update("MALWARE", [short, [p[:8] for p in long]], listed),
+        list_update("SOCIAL_ENGINEERING", [short], short),
+    ]}
+    assert update_safe_browsing.apply_update(str(tmp_path), response) == {
+        "MALWARE/ANY_PLATFORM/URL": 5, "SOCIAL_ENGINEERING/ANY_PLATFORM/URL": 2}
+
+    store = PrefixStore(str(tmp_path))
+    assert store.fresh
+    assert store.lookup("http://evil.example/page") == {evil: ["MALWARE/ANY_PLATFORM/URL"]}
+    # phish.test/login/ only shares the 5-byte head of the stored 8-byte prefix
+    assert store.lookup("https://phish.test/login/") == {}
+    assert store.lookup("http://a.example/")
+
+    # A partial update removes by index in the list of full prefixes and re-verifies
+    order = sorted(listed)
+    gone = order.index(evil[:8])
+    remaining = order[:gone] + order[gone + 1:] + [sb.full_hash("c.example/")[:6]]
+    partial = {"listUpdateResponses": [list_update("MALWARE", [[sb.full_hash("c.example/")[:6]]], remaining,
+                                                   "PARTIAL_UPDATE", removals=[gone])]}
+    assert update_safe_browsing.apply_update(str(tmp_path), partial) == {"MALWARE/ANY_PLATFORM/URL": 5}
+    store = PrefixStore(str(tmp_path))
+    assert store.lookup("http://evil.example/page") == {}
+    assert store.lookup("http://c.example/")
+
+
+def test_unverified_lists_are_not_fresh(tmp_path):
+    load_fixture(tmp_path, {"MALWARE": ["a.example/"], "SOCIAL_ENGINEERING": ["b.example/"]})
+    assert PrefixStore(str(tmp_path)).fresh
+    bad = {"listUpdateResponses": [list_update("MALWARE", [[b"\1\2\3\4\5"]], [b"\0\0\0\0\0"], "PARTIAL_UPDATE")]}
+    assert update_safe_browsing.apply_update(str(tmp_path), bad) == {}
+    assert not PrefixStore(str(tmp_path)).fresh
+
+    # A list that was never applied keeps the store stale too
+    only_one = tmp_path / "one"
+    load_fixture(only_one, {"MALWARE": ["a.example/"]})
+    assert not PrefixStore(str(only_one)).fresh
@@ -0,0 +1,89 @@
+import pytest
+
+import fanout
+import metrics
+import verdict_cache
+from upstream import LatencyHistogram, Upstream
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "stages", metrics.Registry())
+    monkeypatch.setattr(metrics, "endpoints", metrics.Registry())
+    monkeypatch.setattr(metrics, "provider_results", metrics.Counter())
+
+
+def test_request_timings_become_a_server_timing_header():
+    metrics.begin()
+    metrics.record("features", 0.002)
+    metrics.record("lookups", 0.010)
+    metrics.record("lookups", 0.005)
+    header = metrics.end("/analyze")
+    parts = header.split(", ")
+    assert parts[:2] == ["features;dur=2.000", "lookups;dur=15.000"]
+    assert parts[2].startswith("total;dur=")
+    assert metrics.stages.histograms["lookups"].stats()["count"] == 2
+    assert metrics.endpoints.histograms["/analyze"].stats()["count"] == 1
+    # Stages outside a timed request only reach the histograms
+    assert metrics.end("/analyze") is None
+    metrics.record("features", 0.001)
+    assert metrics.stages.histograms["features"].stats()["count"] == 2
+
+
+def test_lap_chains_consecutive_stages():
+    t = metrics.lap("a", 0.0)
+    assert metrics.lap("b", t) >= t
+    assert set(metrics.stages.histograms) == {"a", "b"}
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    metrics.begin()
+    assert metrics.lap("features", 1.5) == 1.5
+    metrics.count_results({"gsb": fanout.ProviderResult("gsb", "timeout")})
+    assert metrics.end("/analyze") is None
+    assert not metrics.stages.histograms and not metrics.provider_results
+
+
+def test_latency_histogram_buckets_are_inclusive_upper_bounds():
+    histogram = LatencyHistogram((1, 10))
+    for seconds in (0.0005, 0.001, 0.002, 0.010, 0.5):
+        histogram.observe(seconds)
+    assert histogram.stats()["buckets_ms"] == {"1": 2, "10": 2, "+Inf": 1}
+
+
+def test_render_prometheus_text():
+    metrics.record("predict", 0.0003)
+    metrics.record("predict", 0.002)
+    metrics.count_results({"google_safe_browsing": fanout.ProviderResult("google_safe_browsing", "timeout")})
+    cache = verdict_cache.VerdictCache()
+    cache.set("ml", "http://a.example/", 0.5)
+    cache.get("ml", "http://a.example/")
+    cache.get("ml", "http://b.example/")
+    gsb = Upstream("google_safe_browsing")
+    gsb.latency.observe(0.03)
+
+    text = metrics.render("v7", cache.stats(), {"google_safe_browsing": gsb}, {"genai": {"in_flight": 2}})
+    lines = text.splitlines()
+    assert 'threat_model_info{version="v7"} 1' in lines
+    assert 'threat_stage_seconds_bucket{stage="predict",le="0.00025"} 0' in lines
+    assert 'threat_stage_seconds_bucket{stage="predict",le="0.0005"} 1' in lines
+    assert 'threat_stage_seconds_bucket{stage="predict",le="+Inf"} 2' in lines
+    assert 'threat_stage_seconds_count{stage="predict"} 2' in lines
+    assert 'threat_upstream_attempt_seconds_bucket{upstream="google_safe_browsing",le="0.05"} 1' in lines
+    assert 'threat_upstream_calls_total{upstream="google_safe_browsing",outcome="failed"} 0' in lines
+    assert 'threat_upstream_breaker_open{upstream="google_safe_browsing"} 0' in lines
+    assert 'threat_provider_results_total{provider="google_safe_browsing",status="timeout"} 1' in lines
+    assert 'threat_cache_hit_ratio{layer="ml"} 0.5' in lines
+    assert 'threat_genai{counter="in_flight"} 2' in lines
+    # Every sample line is "name{labels} value" with a numeric value
+    for line in lines:
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
+
+
+def test_benchmark_reports_overhead():
+    result = metrics.benchmark(200)
+    assert result["enabled_us"] > result["disabled_us"] > 0
+    assert not metrics.stages.histograms
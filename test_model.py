@@ -1,10 +1,7 @@
 import joblib
 import pandas as pd
-import numpy as np
-import re
 import time
 from scipy.sparse import hstack
-from urllib.parse import urlparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
@@ -12,6 +9,8 @@ from xgboost import XGBClassifier
 from lightgbm import LGBMClassifier
 from sklearn.utils import shuffle
 
+from features import extract_features_batch
+
 # ✅ Load dataset
 try:
     data = pd.read_csv("balanced_dataset.csv")
@@ -20,23 +19,8 @@ except FileNotFoundError:
     print("❌ Error: balanced_dataset.csv not found. Please check the file location.")
     exit()
 
-# ✅ Function to extract URL-based features
-def extract_features(url):
-    return [
-        len(url),  # URL length
-        url.count('.'),  # Number of dots
-        url.count('-'),  # Number of hyphens
-        url.count('@'),  # Number of '@' symbols
-        url.count('?'),  # Number of query parameters
-        url.count('='),  # Number of '=' in URL
-        int(bool(re.search(r'https?', url))),  # HTTPS presence
-        int(bool(re.search(r'\d+\.\d+\.\d+\.\d+', url))),  # IP Address presence
-        urlparse(url).netloc.count('.'),  # Subdomain count
-        len(urlparse(url).netloc)  # Domain length
-    ]
-
 # ✅ Apply feature extraction
-X_basic_features = np.array([extract_features(url) for url in data["url"]], dtype=np.float64)
+X_basic_features = extract_features_batch(data["url"])
 
 # ✅ Convert URLs into TF-IDF features
 vectorizer = TfidfVectorizer(max_features=2000)
@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import predict
+from predict import TextWriter, UrlReader, chunked, output_format
+
+
+def test_reader_handles_plain_gzip_and_log_fields(tmp_path):
+    plain = tmp_path / "a.txt"
+    plain.write_text("http://a.example/\n\n  http://b.example/  \n")
+    packed = tmp_path / "b.log.gz"
+    with gzip.open(packed, "wt") as f:
+        f.write("1 GET http://c.example/x 200\n2 GET\n")
+
+    assert list(UrlReader([str(plain)])) == ["http://a.example/", "http://b.example/"]
+    reader = UrlReader([str(packed)], field=2)
+    assert list(reader) == ["http://c.example/x"]
+    assert reader.bytes_read == reader.total_bytes == packed.stat().st_size
+
+
+def test_chunked_skips_already_scored_urls():
+    assert list(chunked(iter("abcdefg"), 3)) == [list("abc"), list("def"), ["g"]]
+    assert list(chunked(iter("abcdefg"), 3, skip=6)) == [["g"]]
+
+
+@pytest.mark.parametrize("path, fmt", [
+    ("out.csv", "csv"), ("out.jsonl", "jsonl"), ("out.ndjson", "jsonl"), ("out.parquet/", "parquet"), ("-", "csv"),
+])
+def test_output_format_from_extension(path, fmt):
+    assert output_format(path) == fmt
+
+
+def test_text_writer_resumes_at_the_checkpoint(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    writer = TextWriter(path, "jsonl")
+    writer.write(["http://a.example/"], np.array([0.95], dtype=np.float32))
+    checkpoint = writer.checkpoint()
+    writer.write(["http://b.example/"], np.array([0.1], dtype=np.float32))
+    writer.close()
+
+    # An interrupted run leaves rows past the checkpoint; resuming drops them
+    writer = TextWriter(path, "jsonl", offset=checkpoint["bytes"])
+    writer.write(["http://c.example/"], np.array([0.2], dtype=np.float32))
+    writer.close()
+    rows = [json.loads(line) for line in open(path)]
+    assert [r["url"] for r in rows] == ["http://a.example/", "http://c.example/"]
+    assert rows[0]["malicious"] is True and rows[1]["malicious"] is False
+
+
+def test_csv_writer_writes_header_once(tmp_path):
+    path = str(tmp_path / "out.csv")
+    writer = TextWriter(path, "csv")
+    writer.write(["http://a.example/"], np.array([0.5], dtype=np.float32))
+    writer.close()
+    writer = TextWriter(path, "csv", offset=writer.checkpoint()["bytes"])
+    writer.write(["http://b.example/"], np.array([0.99], dtype=np.float32))
+    writer.close()
+    assert open(path).read().splitlines() == [
+        "url,malicious_probability,malicious", "http://a.example/,0.500000,0", "http://b.example/,0.990000,1",
+    ]
+
+
+def test_resume_refuses_different_settings(tmp_path):
+    output = str(tmp_path / "out.csv")
+    predict.save_progress(output, {"chunk_size": 10}, 10, {"bytes": 5})
+    assert predict.read_progress(output, {"chunk_size": 10})["urls_done"] == 10
+    with pytest.raises(SystemExit):
+        predict.read_progress(output, {"chunk_size": 20})
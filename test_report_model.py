@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from sklearn.metrics import average_precision_score, precision_score, recall_score, roc_auc_score
+
+from report_model import BINS, ScoreHistogram
+
+
+@pytest.fixture
+def scored():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2, size=20_000)
+    # Scores at bin centres, so the binned metrics are exact
+    bins = np.clip(rng.normal(0.35 + 0.3 * labels, 0.2) * BINS, 0, BINS - 1).astype(np.int64)
+    return (bins + 0.5) / BINS, labels
+
+
+def histogram(probs, labels, chunks=7):
+    hist = ScoreHistogram()
+    for p, y in zip(np.array_split(probs, chunks), np.array_split(labels, chunks)):
+        hist.add(p, y)
+    return hist
+
+
+def test_curves_match_sklearn(scored):
+    probs, labels = scored
+    summary = histogram(probs, labels).curves()
+    assert summary["roc_auc"] == pytest.approx(roc_auc_score(labels, probs), abs=1e-9)
+    assert summary["average_precision"] == pytest.approx(average_precision_score(labels, probs), abs=1e-9)
+    assert summary["roc"]["fpr"][-1] == summary["roc"]["tpr"][-1] == 1.0
+
+
+@pytest.mark.parametrize("threshold", [0.1, 0.5, 0.9, 0.99])
+def test_threshold_metrics_match_direct_counts(scored, threshold):
+    probs, labels = scored
+    metrics = histogram(probs, labels).at(threshold)
+    predicted = probs >= threshold
+    assert metrics["precision"] == pytest.approx(precision_score(labels, predicted, zero_division=0))
+    assert metrics["recall"] == pytest.approx(recall_score(labels, predicted))
+    assert metrics["fpr"] == pytest.approx(predicted[labels == 0].mean())
+    assert metrics["tp"] + metrics["fp"] == predicted.sum()
+
+
+def test_report_includes_serving_threshold_and_top_score():
+    hist = ScoreHistogram()
+    hist.add(np.array([1.0, 0.9, 0.2], dtype=np.float32), np.array([1, 1, 0]))
+    report = hist.report(sweep=[0.5])
+    assert [row["threshold"] for row in report["sweep"]] == [0.5, 0.9]
+    assert report["serving"]["tp"] == 2 and report["serving"]["fp"] == 0
+    assert report["samples"] == 3 and report["positives"] == 2
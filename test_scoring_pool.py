@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pytest
+
+import scoring_pool
+
+
+def url_length(urls):
+    return np.array([len(url) / 100 for url in urls])
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "scoring.sock")
+    processes = scoring_pool.start(url_length, path, workers=1, max_batch=8, max_wait_ms=50, pin=False)
+    yield path
+    scoring_pool.stop(processes, path)
+
+
+def test_pool_scores_requests(pool):
+    client = scoring_pool.ScoringClient(pool)
+    assert client.score(["http://a.example/", "http://bb.example/"]).tolist() == [0.17, 0.18]
+    assert client.score([]).tolist() == []
+
+
+def test_concurrent_requests_share_a_batch(pool):
+    replies = []
+
+    def request(url):
+        replies.append(scoring_pool.ScoringClient(pool).request([url]))
+
+    threads = [threading.Thread(target=request, args=(f"http://{'x' * i}.example/",)) for i in range(1, 7)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(reply["probs"][0] for reply in replies) == [(16 + i) / 100 for i in range(1, 7)]
+    assert max(reply["batch_rows"] for reply in replies) > 1
+
+
+def test_batcher_stops_at_max_batch():
+    batcher = scoring_pool.Batcher(url_length, max_batch=3, max_wait_ms=0)
+    for urls in (["a"], ["b", "c"], ["d"]):
+        batcher.submit(None, urls)
+    assert [urls for _, urls in batcher.next_batch()] == [["a"], ["b", "c"]]
+    assert [urls for _, urls in batcher.next_batch()] == [["d"]]
+
+
+def test_unreachable_pool_raises_pool_error(tmp_path):
+    client = scoring_pool.ScoringClient(str(tmp_path / "missing.sock"), timeout=0.5)
+    with pytest.raises(scoring_pool.PoolError):
+        client.score(["http://a.example/"])
+
+
+def test_scoring_errors_reach_the_client(tmp_path):
+    path = str(tmp_path / "scoring.sock")
+    processes = scoring_pool.start(lambda urls: 1 / 0, path, workers=1, pin=False)
+    try:
+        with pytest.raises(scoring_pool.PoolError, match="ZeroDivisionError"):
+            scoring_pool.ScoringClient(path).score(["http://a.example/"])
+    finally:
+        scoring_pool.stop(processes, path)
+
+
+def test_replies_name_the_bundle_version(tmp_path):
+    path = str(tmp_path / "scoring.sock")
+    processes = scoring_pool.start(url_length, path, workers=1, pin=False, version="v2")
+    try:
+        assert scoring_pool.ScoringClient(path, version="v2").request(["http://a.example/"])["version"] == "v2"
+        assert scoring_pool.ScoringClient(path, version="v2").request([])["version"] == "v2"
+        with pytest.raises(scoring_pool.PoolError, match="serves bundle v2, not v1"):
+            scoring_pool.ScoringClient(path, version="v1").score(["http://a.example/"])
+    finally:
+        scoring_pool.stop(processes, path)
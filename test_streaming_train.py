@@ -0,0 +1,15 @@
+import pandas as pd
+
+import streaming_train
+
+
+def test_cascade_sample_follows_the_streaming_split(tmp_path):
+    urls = [f"http://site{i}.example/page" for i in range(500)]
+    pd.DataFrame({"url": urls, "label": [i % 2 for i in range(500)]}).to_csv(tmp_path / "data.csv", index=False)
+    sample, labels, (train_idx, holdout_idx) = streaming_train.cascade_sample(
+        str(tmp_path / "data.csv"), str(tmp_path / "cache"), chunksize=64, sample_rows=50)
+    assert len(train_idx) == 50
+    assert 0 < len(holdout_idx) <= 50
+    assert not any(streaming_train.is_test_url(sample[i]) for i in train_idx)
+    assert all(streaming_train.is_test_url(sample[i]) for i in holdout_idx)
+    assert all(labels[i] == int(sample[i].split("site")[1].split(".")[0]) % 2 for i in range(len(sample)))
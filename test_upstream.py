@@ -0,0 +1,208 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, CircuitOpenError, Upstream, UpstreamError
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """Local HTTP/1.1 server answering each path from a script of (status, delay) steps.
+
+    The last step repeats once the script runs out. Every request records the
+    client port it arrived on, so tests can see whether connections were reused.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.scripts = {}
+        self.hits = defaultdict(int)
+        self.client_ports = []
+        self.lock = threading.Lock()
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def next_step(self, path, client_port):
+        with self.lock:
+            self.hits[path] += 1
+            self.client_ports.append(client_port)
+            script = self.scripts.get(path, [(200, 0)])
+            return script.pop(0) if len(script) > 1 else script[0]
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        status, delay = self.server.next_step(self.path, self.client_address[1])
+        time.sleep(delay)
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = respond
+    do_POST = respond
+
+
+@pytest.fixture
+def server():
+    fake = FakeUpstream()
+    thread = threading.Thread(target=fake.serve_forever, daemon=True)
+    thread.start()
+    yield fake
+    fake.shutdown()
+    fake.server_close()
+
+
+def make_upstream(**kwargs):
+    params = dict(connect_timeout=0.5, read_timeout=0.3, retries=2, backoff=0.01, backoff_cap=0.05,
+                  breaker=CircuitBreaker(failures=3, reset_after=0.2))
+    return Upstream("fake", **dict(params, **kwargs))
+
+
+def test_retries_transient_errors_then_succeeds(server):
+    server.scripts["/lookup"] = [(503, 0), (502, 0), (200, 0)]
+    client = make_upstream()
+    response = client.post(server.base + "/lookup", json={"url": "http://example.com"})
+
+    assert response.status_code == 200
+    assert server.hits["/lookup"] == 3
+    assert client.stats()["outcomes"] == {"ok": 1, "retried": 2, "failed": 0}
+    assert client.breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried(server):
+    server.scripts["/missing"] = [(404, 0)]
+    client = make_upstream()
+    assert client.get(server.base + "/missing").status_code == 404
+    assert server.hits["/missing"] == 1
+
+
+def test_exhausted_retries_return_last_response(server):
+    server.scripts["/down"] = [(503, 0)]
+    client = make_upstream()
+    assert client.get(server.base + "/down").status_code == 503
+    assert server.hits["/down"] == 3
+    assert client.stats()["outcomes"]["failed"] == 1
+
+
+def test_read_timeout_bounds_a_hung_upstream(server):
+    server.scripts["/hang"] = [(200, 2.0)]
+    client = make_upstream(retries=1)
+    start = time.perf_counter()
+    with pytest.raises(UpstreamError):
+        client.get(server.base + "/hang")
+    assert time.perf_counter() - start < 1.5
+    assert server.hits["/hang"] == 2
+
+
+def test_connection_refused_raises_upstream_error():
+    client = make_upstream(retries=1)
+    with pytest.raises(UpstreamError):
+        client.get("http://127.0.0.1:9/")
+
+
+def test_breaker_opens_rejects_and_recovers(server):
+    server.scripts["/flaky"] = [(500, 0)]
+    client = make_upstream(retries=0)
+    for _ in range(3):
+        client.get(server.base + "/flaky")
+    assert client.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        client.get(server.base + "/flaky")
+    assert server.hits["/flaky"] == 3
+    assert client.stats()["breaker"]["rejected"] == 1
+
+    time.sleep(0.25)
+    server.scripts["/flaky"] = [(200, 0)]
+    assert client.get(server.base + "/flaky").status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_failed_trial_call_reopens_breaker(server):
+    server.scripts["/flaky"] = [(500, 0)]
+    client = make_upstream(retries=0)
+    for _ in range(3):
+        client.get(server.base + "/flaky")
+    time.sleep(0.25)
+    client.get(server.base + "/flaky")
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get(server.base + "/flaky")
+
+
+def test_connections_are_reused(server):
+    client = make_upstream()
+    for _ in range(5):
+        client.get(server.base + "/lookup")
+    assert len(set(server.client_ports)) == 1
+
+
+def test_latency_histogram_records_every_attempt(server):
+    server.scripts["/slow"] = [(503, 0.03), (200, 0.03)]
+    client = make_upstream()
+    client.get(server.base + "/slow")
+    latency = client.stats()["latency"]
+
+    assert latency["count"] == 2
+    assert latency["sum_ms"] >= 60
+    assert sum(latency["buckets_ms"].values()) == 2
+    assert latency["p50_ms"] in (50, 100)
+
+
+def test_backoff_is_jittered_and_capped():
+    client = make_upstream(backoff=0.1, backoff_cap=0.3)
+    delays = [client.backoff_delay(attempt) for attempt in range(5) for _ in range(200)]
+    assert 0 <= min(delays) and max(delays) <= 0.3
+    assert len(set(delays)) > 100
+    assert client.backoff_delay(0, retry_after="0.2") == 0.2
+    assert client.backoff_delay(0, retry_after="120") == 0.3
+
+
+def test_async_request_shares_policy(server):
+    server.scripts["/lookup"] = [(503, 0), (200, 0)]
+    client = make_upstream()
+
+    async def call():
+        async with aiohttp.ClientSession() as session:
+            response = await client.arequest(session, "POST", server.base + "/lookup", json={})
+            return response.status, await response.json()
+
+    assert asyncio.run(call()) == (200, {"path": "/lookup"})
+    assert client.stats()["outcomes"] == {"ok": 1, "retried": 1, "failed": 0}
+    assert client.stats()["latency"]["count"] == 2
+
+
+def test_async_timeout_raises_upstream_error(server):
+    server.scripts["/hang"] = [(200, 2.0)]
+    client = make_upstream(retries=0)
+
+    async def call():
+        async with aiohttp.ClientSession() as session:
+            await client.arequest(session, "GET", server.base + "/hang")
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(call())
+    assert client.breaker.consecutive_failures == 1
+
+
+def test_stats_cover_every_provider():
+    assert set(upstream.stats()) == {"google_safe_browsing", "virustotal", "huggingface"}
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import url_vectorizer
+from synthetic_urls import generate_urls
+from url_vectorizer import UrlVectorizer
+
+URLS, _ = generate_urls(5000, seed=3)
+
+# Inputs where the NumPy tokenizer could plausibly drift from the regex
+EDGE_CASES = [
+    "", "a", "ab", "_", "__", "a_b", "A_B_c", "LOGIN", "PayPal.COM/Verify", "x1.y2.z3",
+    "http://192.168.0.1:8080/", "...---...", "ab\ncd", "tab\tsep", "  spaced  out  ",
+    "https://bücher.de/Login", "http://пример.рф/вход", "例子.中国/path", "caféLOGIN",
+    "http://paypal.com@evil.xyz/webscr?cmd=_login&amp;id=1", "a" * 300, "9" * 40 + "z",
+]
+
+
+def fit(urls=URLS, **params):
+    return TfidfVectorizer(max_features=2000, **params).fit(urls)
+
+
+def assert_identical(expected, actual):
+    assert expected.shape == actual.shape
+    assert expected.indptr.dtype == actual.indptr.dtype
+    assert expected.indices.dtype == actual.indices.dtype
+    assert np.array_equal(expected.indptr, actual.indptr)
+    assert np.array_equal(expected.indices, actual.indices)
+    assert np.array_equal(expected.data, actual.data)
+
+
+@pytest.mark.parametrize("size", [1, 2, 16, 63, 64, 65, 1000, 5000])
+def test_matches_tfidf_on_batches(size):
+    vectorizer = fit()
+    assert_identical(vectorizer.transform(URLS[:size]), UrlVectorizer.from_tfidf(vectorizer).transform(URLS[:size]))
+
+
+def test_matches_tfidf_on_edge_cases():
+    # Fit on the edge cases too, so uppercase, digit and non-ASCII terms are in the vocabulary
+    vectorizer = fit(URLS + EDGE_CASES * 3)
+    fast = UrlVectorizer.from_tfidf(vectorizer)
+    batch = EDGE_CASES * 5 + URLS[:200]
+    assert_identical(vectorizer.transform(batch), fast.transform(batch))
+    for url in EDGE_CASES:
+        assert_identical(vectorizer.transform([url]), fast.transform([url]))
+
+
+def test_matches_across_chunks(monkeypatch):
+    monkeypatch.setattr(url_vectorizer, "CHUNK_SIZE", 97)
+    vectorizer = fit()
+    batch = URLS[:1000] + EDGE_CASES
+    assert_identical(vectorizer.transform(batch), UrlVectorizer.from_tfidf(vectorizer).transform(batch))
+
+
+@pytest.mark.parametrize("params", [
+    {"lowercase": False},
+    {"sublinear_tf": True},
+    {"norm": None},
+    {"smooth_idf": False},
+    {"token_pattern": r"(?u)\b\w+\b"},
+])
+def test_matches_other_settings(params):
+    vectorizer = fit(**params)
+    batch = URLS[:500] + EDGE_CASES
+    assert_identical(vectorizer.transform(batch), UrlVectorizer.from_tfidf(vectorizer).transform(batch))
+
+
+def test_regex_fallback_matches():
+    vectorizer = fit()
+    fast = UrlVectorizer.from_tfidf(vectorizer)
+    fast._hashed = False
+    assert_identical(vectorizer.transform(URLS), fast.transform(URLS))
+
+
+def test_empty_input_and_out_of_vocabulary_rows():
+    vectorizer = fit()
+    fast = UrlVectorizer.from_tfidf(vectorizer)
+    assert fast.transform([]).shape == (0, 2000)  # TfidfVectorizer raises on an empty batch
+    assert_identical(vectorizer.transform(["zzzqqq"] * 100), fast.transform(["zzzqqq"] * 100))
+
+
+def test_unsupported_settings_are_rejected():
+    with pytest.raises(ValueError, match="ngram_range"):
+        UrlVectorizer.from_tfidf(fit(ngram_range=(1, 2)))
+    assert isinstance(url_vectorizer.accelerate(fit(binary=True)), TfidfVectorizer)
+
+
+def test_string_input_is_rejected():
+    with pytest.raises(ValueError):
+        UrlVectorizer.from_tfidf(fit()).transform("http://example.com")
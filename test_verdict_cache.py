@@ -0,0 +1,105 @@
+import time
+
+from verdict_cache import SqliteBackend, VerdictCache
+
+
+def test_ml_scores_do_not_survive_a_bundle_rollout(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "verdicts.db"))
+    old = VerdictCache(backend=backend, namespaces={"ml": "v1"})
+    old.set("ml", "http://a.example/", 0.9)
+    old.set("gsb", "http://a.example/", {"safe": True})
+
+    new = VerdictCache(backend=SqliteBackend(str(tmp_path / "verdicts.db")), namespaces={"ml": "v2"})
+    assert new.get("ml", "http://a.example/") is None
+    # Layers without a namespace are shared across bundles
+    assert new.get("gsb", "http://a.example/") == {"safe": True}
+    assert VerdictCache(backend=backend, namespaces={"ml": "v1"}).get("ml", "http://a.example/") == 0.9
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ml_scores_are_keyed_on_the_exact_url():
+    cache = VerdictCache()
+    cache.set("ml", "HTTP://Example.com:80/a#top", 0.8)
+    assert cache.get("ml", "http://example.com/a") is None
+    assert cache.get("ml", "HTTP://Example.com:80/a#top") == 0.8
+    # Reputation layers share one entry across spellings of a URL
+    cache.set("gsb", "HTTP://Example.com:80/a#top", True)
+    assert cache.get("gsb", "http://example.com/a") is True
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = VerdictCache(max_entries=2)
+    cache.set("ml", "http://a.example/", 0.1)
+    cache.set("ml", "http://b.example/", 0.2)
+    assert cache.get("ml", "http://a.example/") == 0.1
+    cache.set("ml", "http://c.example/", 0.3)
+    assert cache.get("ml", "http://b.example/") is None
+    assert cache.get("ml", "http://a.example/") == 0.1
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_each_layer_expires_on_its_own_ttl():
+    clock = Clock()
+    cache = VerdictCache(ttls={"ml": 100, "gsb": 10}, clock=clock)
+    cache.set("ml", "http://a.example/", 0.4)
+    cache.set("gsb", "http://a.example/", False)
+    clock.now += 11
+    assert cache.get("gsb", "http://a.example/") is None
+    assert cache.get("ml", "http://a.example/") == 0.4
+    clock.now += 90
+    assert cache.get("ml", "http://a.example/") is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_sqlite_backend_is_shared_and_expires(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / "verdicts.db")
+    writer = VerdictCache(ttls={"vt": 60}, backend=SqliteBackend(path), clock=clock)
+    reader = VerdictCache(ttls={"vt": 60}, backend=SqliteBackend(path), clock=clock)
+    writer.set("vt", "http://a.example/", {"malicious": True})
+    assert reader.get("vt", "http://a.example/") == {"malicious": True}
+    assert reader.stats()["backend_hits"] == 1
+    clock.now += 61
+    reader.clear()
+    assert reader.get("vt", "http://a.example/") is None
+
+
+def test_counters_track_hits_and_misses_per_layer():
+    cache = VerdictCache()
+    cache.set("ml", "http://a.example/", 0.5)
+    cache.get("ml", "http://a.example/")
+    cache.get("ml", "http://b.example/")
+    cache.get("genai", "http://a.example/")
+    cache.set("vt", "http://a.example/", None)
+    stats = cache.stats()
+    assert stats["hits"]["ml"] == 1
+    assert stats["misses"] == {"ml": 1, "gsb": 0, "vt": 0, "genai": 1}
+    # None is never stored
+    assert cache.get("vt", "http://a.example/") is None
+
+
+def test_sqlite_backend_prunes_expired_rows_while_running(tmp_path):
+    clock = Clock()
+    clock.now = time.time()
+    path = str(tmp_path / "verdicts.db")
+    cache = VerdictCache(ttls={"vt": 60}, backend=SqliteBackend(path, prune_interval=300), clock=clock)
+
+    def rows():
+        return cache.backend._connect().execute("SELECT key FROM verdicts ORDER BY key").fetchall()
+
+    cache.set("vt", "http://a.example/", True)
+    clock.now += 120
+    cache.set("vt", "http://b.example/", False)
+    # a.example/ has expired, but the last prune (at startup) is recent
+    assert len(rows()) == 2
+    clock.now += 300
+    cache.set("vt", "http://c.example/", True)
+    assert rows() == [("http://c.example/",)]
@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import vt_queue
+from upstream import Upstream
+from verdict_cache import VerdictCache
+
+URL = "http://phish.example/login"
+URL_ID = vt_queue.url_id(URL)
+
+
+class FakeVirusTotal(ThreadingHTTPServer):
+    """Local VirusTotal API answering each "METHOD path" from a script of (status, body, headers) steps.
+
+    The last step repeats once the script runs out; every call is logged with its arrival time.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.scripts = defaultdict(lambda: [(404, {}, {})])
+        self.calls = []
+        self.lock = threading.Lock()
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def next_step(self, call):
+        with self.lock:
+            self.calls.append((time.monotonic(), call))
+            script = self.scripts[call]
+            return script.pop(0) if len(script) > 1 else script[0]
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, body, headers = self.server.next_step(f"{self.command} {self.path}")
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = respond
+    do_POST = respond
+
+
+@pytest.fixture
+def server():
+    fake = FakeVirusTotal()
+    thread = threading.Thread(target=fake.serve_forever, daemon=True)
+    thread.start()
+    yield fake
+    fake.shutdown()
+    fake.server_close()
+
+
+@pytest.fixture
+def make_queue(server):
+    queues = []
+
+    def make(**kwargs):
+        params = dict(rate_per_min=6000, poll_interval=0.02, api_url=server.base, api_key="test-key")
+        queue = vt_queue.VirusTotalQueue(VerdictCache(), **dict(params, **kwargs))
+        queue.upstream = Upstream("virustotal-test", retries=0)
+        queues.append(queue)
+        return queue
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def wait_for(queue, url, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, verdict = queue.status(url, enqueue=False)
+        if status != "pending":
+            return status, verdict
+        time.sleep(0.01)
+    raise AssertionError(f"{url} still pending after {timeout}s")
+
+
+def analysis(status, malicious=0):
+    return {"data": {"attributes": {"status": status, "stats": {"malicious": malicious}}}}
+
+
+def test_known_url_completes_from_its_report(server, make_queue):
+    server.scripts[f"GET /urls/{URL_ID}"] = [
+        (200, {"data": {"attributes": {"last_analysis_stats": {"malicious": 3}}}}, {})]
+    queue = make_queue()
+    assert queue.status(URL) == ("pending", None)
+    assert wait_for(queue, URL) == ("completed", True)
+    assert [call for _, call in server.calls] == [f"GET /urls/{URL_ID}"]
+    assert queue.stats()["completed"] == 1
+
+
+def test_unknown_url_is_submitted_and_polled(server, make_queue):
+    server.scripts["POST /urls"] = [(200, {"data": {"id": "an-1"}}, {})]
+    server.scripts["GET /analyses/an-1"] = [(200, analysis("queued"), {}), (200, analysis("in-progress"), {}),
+                                            (200, analysis("completed", malicious=0), {})]
+    queue = make_queue()
+    queue.status(URL)
+    assert wait_for(queue, URL) == ("completed", False)
+    assert [call for _, call in server.calls] == [f"GET /urls/{URL_ID}", "POST /urls"] + ["GET /analyses/an-1"] * 3
+
+
+def test_analysis_that_never_completes_fails(server, make_queue):
+    server.scripts["POST /urls"] = [(200, {"data": {"id": "an-2"}}, {})]
+    server.scripts["GET /analyses/an-2"] = [(200, analysis("queued"), {})]
+    queue = make_queue(max_polls=3)
+    queue.status(URL)
+    assert wait_for(queue, URL) == ("failed", None)
+    assert queue.stats()["failed"] == 1
+
+
+def test_calls_are_spaced_to_the_rate(server, make_queue):
+    queue = make_queue(rate_per_min=600)
+    urls = [f"http://{i}.example/" for i in range(3)]
+    for i, url in enumerate(urls):
+        server.scripts[f"GET /urls/{vt_queue.url_id(url)}"] = [
+            (200, {"data": {"attributes": {"last_analysis_stats": {"malicious": i}}}}, {})]
+        queue.status(url)
+    for url in urls:
+        assert wait_for(queue, url)[0] == "completed"
+    times = [at for at, _ in server.calls]
+    assert len(times) == 3
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.09
+
+
+def test_rate_limit_pauses_the_queue(server, make_queue):
+    server.scripts[f"GET /urls/{URL_ID}"] = [
+        (429, {}, {"Retry-After": "0.3"}),
+        (200, {"data": {"attributes": {"last_analysis_stats": {"malicious": 1}}}}, {})]
+    queue = make_queue()
+    queue.status(URL)
+    assert wait_for(queue, URL) == ("completed", True)
+    (first, _), (second, _) = server.calls
+    assert second - first >= 0.29
+
+
+def test_zero_rate_means_no_limit(server, make_queue):
+    queue = make_queue(rate_per_min=0)
+    assert queue.interval == 0.0
+    server.scripts[f"GET /urls/{URL_ID}"] = [
+        (200, {"data": {"attributes": {"last_analysis_stats": {"malicious": 0}}}}, {})]
+    queue.status(URL)
+    assert wait_for(queue, URL) == ("completed", False)
+    with pytest.raises(ValueError):
+        make_queue(rate_per_min=-1)
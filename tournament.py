@@ -0,0 +1,157 @@
+"""Train candidate models in parallel on one cached feature matrix.
+
+Each candidate runs in its own worker process (one task per process, so
+the reported peak memory is that candidate's own). Workers open the
+feature cache memory-mapped, score the candidate with stratified k-fold
+cross-validation on the training split, refit it on the whole training
+split and report hold-out metrics. The winner is the candidate with the
+best mean cross-validated ROC AUC.
+
+A CSV from compact_corpus.py carries sample weights, which every fit and
+metric uses, and near-duplicate groups. Each group then falls wholly on
+one side of the hold-out split and of every cross-validation fold.
+"""
+import warnings
+warnings.filterwarnings("ignore", message=".*does not have valid feature names")
+
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+import feature_cache
+
+CV_FOLDS = int(os.getenv("CV_FOLDS", 3))
+
+# name -> (library, constructor kwargs). The first entry of each library
+# is the configuration train_model.py has always used.
+CANDIDATES = {
+    "xgb_default": ("xgboost", {"n_estimators": 200, "learning_rate": 0.05, "random_state": 42}),
+    "xgb_deep": ("xgboost", {"n_estimators": 400, "learning_rate": 0.05, "max_depth": 8, "random_state": 42}),
+    "lgb_default": ("lightgbm", {"n_estimators": 200, "learning_rate": 0.05, "random_state": 42,
+                                 "force_row_wise": True, "verbose": -1}),
+    "lgb_wide": ("lightgbm", {"n_estimators": 400, "learning_rate": 0.05, "num_leaves": 63, "random_state": 42,
+                              "force_row_wise": True, "verbose": -1}),
+}
+
+
+def make_model(library, params, n_jobs):
+    if library == "xgboost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(n_jobs=n_jobs, **params)
+    from lightgbm import LGBMClassifier
+    return LGBMClassifier(n_jobs=n_jobs, **params)
+
+
+def fit(model, library, X, y, feature_names, sample_weight=None):
+    if library == "lightgbm":
+        model.fit(X, y, sample_weight=sample_weight, feature_name=feature_names)
+    else:
+        model.fit(X, y, sample_weight=sample_weight)
+    return model
+
+
+def group_hash(groups):
+    """Stable 64-bit mix (splitmix64) of integer group ids, so neighbouring ids land apart."""
+    z = np.asarray(groups).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def split(labels, groups=None):
+    """Stable 80/20 train/test row indices; with ``groups``, each group goes wholly to one side."""
+    if groups is None:
+        return train_test_split(np.arange(len(labels)), test_size=0.2, random_state=42, stratify=labels)
+    is_test = group_hash(groups) % np.uint64(5) == 0
+    return np.flatnonzero(~is_test), np.flatnonzero(is_test)
+
+
+def cv_folds(labels, groups=None):
+    """``(fit_idx, val_idx)`` pairs: stratified, or by group hash when there are groups."""
+    if groups is None:
+        return list(StratifiedKFold(CV_FOLDS, shuffle=True, random_state=42).split(labels, labels))
+    # Divided by 5 first so the folds are independent of split()'s test/train choice
+    fold = group_hash(groups) // np.uint64(5) % np.uint64(CV_FOLDS)
+    return [(np.flatnonzero(fold != k), np.flatnonzero(fold == k)) for k in range(CV_FOLDS)]
+
+
+def scores(y_true, proba, sample_weight=None):
+    return {
+        "accuracy": accuracy_score(y_true, proba > 0.5, sample_weight=sample_weight),
+        "f1": f1_score(y_true, proba > 0.5, sample_weight=sample_weight),
+        "roc_auc": roc_auc_score(y_true, proba, sample_weight=sample_weight),
+    }
+
+
+def run_candidate(name, library, params, cache_path, labels, feature_names, out_dir, n_jobs, weights=None,
+                  groups=None):
+    """Cross-validate, refit and save one candidate. Runs in a worker process."""
+    start = time.time()
+    X = feature_cache.load_matrix(cache_path)
+    if weights is None:
+        weights = np.ones(len(labels))
+    train_idx, test_idx = split(labels, groups)
+    X_train, y_train, w_train = X[train_idx], labels[train_idx], weights[train_idx]
+
+    folds = []
+    for fit_idx, val_idx in cv_folds(y_train, None if groups is None else groups[train_idx]):
+        model = fit(make_model(library, params, n_jobs), library, X_train[fit_idx], y_train[fit_idx], feature_names,
+                    w_train[fit_idx])
+        folds.append(scores(y_train[val_idx], model.predict_proba(X_train[val_idx])[:, 1], w_train[val_idx]))
+
+    model = fit(make_model(library, params, n_jobs), library, X_train, y_train, feature_names, w_train)
+    holdout = scores(labels[test_idx], model.predict_proba(X[test_idx])[:, 1], weights[test_idx])
+    model_path = os.path.join(out_dir, f"{name}.pkl")
+    joblib.dump(model, model_path)
+    return {
+        "name": name,
+        "cv": {metric: float(np.mean([fold[metric] for fold in folds])) for metric in folds[0]},
+        "cv_std": {metric: float(np.std([fold[metric] for fold in folds])) for metric in folds[0]},
+        "holdout": holdout,
+        "seconds": time.time() - start,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "model_path": model_path,
+    }
+
+
+def run(csv_path="balanced_dataset.csv", cache_dir=feature_cache.CACHE_DIR, candidates=None, workers=None):
+    """Train ``candidates`` (default: all of CANDIDATES) and return ``(best_model, vectorizer, feature_names, results)``."""
+    start = time.time()
+    cache_path, labels, vectorizer, feature_names = feature_cache.load_or_build(csv_path, cache_dir)
+    print(f"✅ Dataset: {len(labels):,} samples, {len(feature_names)} features")
+    weights, groups = feature_cache.load_weights(csv_path)
+    if groups is not None:
+        print(f"⚖️ Weighted rows in {len(np.unique(groups)):,} near-duplicate groups; splits keep groups together")
+
+    candidates = candidates or list(CANDIDATES)
+    workers = workers or min(len(candidates), os.cpu_count() or 1)
+    # Split the cores between concurrent candidates instead of oversubscribing them
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    out_dir = os.path.join(cache_path, "candidates")
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"🏁 Training {len(candidates)} candidates on {workers} workers ({CV_FOLDS}-fold CV)...")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        futures = [
+            pool.submit(run_candidate, name, *CANDIDATES[name], cache_path, labels, feature_names, out_dir, n_jobs,
+                        weights, groups)
+            for name in candidates
+        ]
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            print(f"   {result['name']:<12} cv_auc {result['cv']['roc_auc']:.4f} ±{result['cv_std']['roc_auc']:.4f}  "
+                  f"cv_acc {result['cv']['accuracy']:.2%}  holdout_acc {result['holdout']['accuracy']:.2%}  "
+                  f"{result['seconds']:.1f}s  {result['peak_mb']:.0f}MB")
+
+    best = max(results, key=lambda result: result["cv"]["roc_auc"])
+    print(f"🏆 Winner: {best['name']} (cv_auc {best['cv']['roc_auc']:.4f})")
+    print(f"⏱  Tournament finished in {time.time() - start:.1f}s")
+    return joblib.load(best["model_path"]), vectorizer, feature_names, results
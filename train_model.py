@@ -1,108 +1,75 @@
-import joblib
-import pandas as pd
-import numpy as np
-import re
-import time
-from scipy.sparse import hstack
-from urllib.parse import urlparse
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
-from sklearn.utils import shuffle
+import argparse
+import os
 import sys
 
-# ✅ Load dataset
-try:
-    data = pd.read_csv("balanced_dataset.csv")
-    print(f"✅ balanced_dataset loaded successfully. Total samples: {len(data)}")
-except FileNotFoundError:
-    print("❌ Error: balanced_dataset.csv not found. Please check the file location.")
-    exit()
-
-# ✅ Function to extract URL-based features
-def extract_features(url):
-    return [
-        len(url),  # URL length
-        url.count('.'),  # Number of dots
-        url.count('-'),  # Number of hyphens
-        url.count('@'),  # Number of '@' symbols
-        url.count('?'),  # Number of query parameters
-        url.count('='),  # Number of '=' in URL
-        int(bool(re.search(r'https?', url))),  # HTTPS presence
-        int(bool(re.search(r'\d+\.\d+\.\d+\.\d+', url))),  # IP Address presence
-        urlparse(url).netloc.count('.'),  # Subdomain count
-        len(urlparse(url).netloc)  # Domain length
-    ]
-
-# ✅ Apply feature extraction
-X_basic_features = np.array([extract_features(url) for url in data["url"]])
-
-# ✅ Convert URLs into TF-IDF features
-vectorizer = TfidfVectorizer(max_features=2000)
-X_tfidf = vectorizer.fit_transform(data["url"])
-
-# ✅ Debugging: Check the shapes of the individual features
-print(f"🔢 Numeric Features Shape: {X_basic_features.shape}")
-print(f"📊 TF-IDF Features Shape: {X_tfidf.shape}")
-
-# ✅ Convert only non-sparse features to float64
-X_basic_features = X_basic_features.astype(np.float64)
-
-# ✅ Stack features efficiently
-X = hstack((X_basic_features, X_tfidf))
-
-# ✅ Debugging: Check the combined feature shape
-print(f"🛠 Final Combined Features Shape: {X.shape}")
-
-# ✅ Get feature names for LightGBM
-all_feature_names = (
-    ["url_length", "num_dots", "num_hyphens", "num_at", "num_question", 
-     "num_equals", "https_presence", "ip_presence", "subdomain_count", "domain_length"] 
-    + vectorizer.get_feature_names_out().tolist()
-)
-
-# ✅ Debugging: Print the total number of features
-print("✅ Feature extraction completed. Total features:", X.shape[1])
-
-# ✅ Extract labels
-y = data["label"]
-
-# ✅ Shuffle dataset for better generalization
-X, y = shuffle(X, y, random_state=42)
-
-# ✅ Split data (80% Train, 20% Test)
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# ✅ Convert to DataFrame for LightGBM
-X_train_df = pd.DataFrame(X_train.toarray(), columns=all_feature_names)
-X_test_df = pd.DataFrame(X_test.toarray(), columns=all_feature_names)
-
-# ✅ Train XGBoost Classifier
-xgb_model = XGBClassifier(n_estimators=200, learning_rate=0.05, random_state=42, n_jobs=-1)
-xgb_model.fit(X_train, y_train)
-y_pred_xgb = xgb_model.predict(X_test)
-acc_xgb = accuracy_score(y_test, y_pred_xgb)
-print(f"🔥 XGBoost Accuracy: {acc_xgb:.2%}")
-
-# ✅ Train LightGBM Classifier (WITH feature names)
-lgb_model = LGBMClassifier(n_estimators=200, learning_rate=0.05, random_state=42, 
-                           force_row_wise=True, verbose=-1, n_jobs=-1)
-lgb_model.fit(X_train_df, y_train)  # ✅ Now trained with feature names
-y_pred_lgb = lgb_model.predict(X_test_df)
-acc_lgb = accuracy_score(y_test, y_pred_lgb)
-print(f"🚀 LightGBM Accuracy: {acc_lgb:.2%}")
-
-# ✅ Save the best model
-best_model = xgb_model if acc_xgb > acc_lgb else lgb_model
-joblib.dump(best_model, "best_model.pkl")
-print(f"🏆 Best Model Saved as best_model.pkl")
-
-# ✅ Save vectorizer
-joblib.dump(vectorizer, "vectorizer.pkl")
-print("✅ Vectorizer saved as vectorizer.pkl.")
+import joblib
 
-# ✅ Save feature names
-joblib.dump(all_feature_names, "feature_names.pkl")
-print("✅ Feature names saved as feature_names.pkl.")
+import model_bundle
+
+
+def save_artifacts(best_model, vectorizer, all_feature_names, cascade=None):
+    # ✅ Save the best model
+    joblib.dump(best_model, "best_model.pkl")
+    print(f"🏆 Best Model Saved as best_model.pkl")
+
+    # ✅ Save vectorizer
+    joblib.dump(vectorizer, "vectorizer.pkl")
+    print("✅ Vectorizer saved as vectorizer.pkl.")
+
+    # ✅ Save feature names
+    joblib.dump(all_feature_names, "feature_names.pkl")
+    print("✅ Feature names saved as feature_names.pkl.")
+
+    # ✅ Save the versioned bundle app.py and predict.py load
+    manifest = model_bundle.save(best_model, vectorizer, all_feature_names, cascade=cascade)
+    print(f"📦 Model bundle {manifest['version']} saved to {model_bundle.BUNDLE_DIR}/")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the URL threat model.")
+    parser.add_argument("--data", default="balanced_dataset.csv", help="Labeled CSV with url,label columns, or a label store .db")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Out-of-core mode: read the CSV in chunks and train from an on-disk feature cache")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk in streaming mode")
+    parser.add_argument("--cache-dir", help="Feature cache directory (default: training_cache when streaming, "
+                                              "feature_cache otherwise)")
+    parser.add_argument("--candidates", nargs="+", help="Tournament candidates to train (default: all)")
+    parser.add_argument("--workers", type=int, help="Candidates trained in parallel (default: one per CPU)")
+    parser.add_argument("--no-cascade", action="store_true",
+                        help="Skip fitting the numeric first stage used by CASCADE=1 serving")
+    args = parser.parse_args()
+
+    if args.streaming:
+        import streaming_train
+        result = streaming_train.train(args.data, args.cache_dir or "training_cache", args.chunksize)
+    else:
+        import feature_cache
+        import tournament
+        if not os.path.exists(args.data):
+            print(f"❌ Error: {args.data} not found. Please check the file location.")
+            sys.exit(1)
+        unknown = set(args.candidates or []) - set(tournament.CANDIDATES)
+        if unknown:
+            parser.error(f"unknown candidates {sorted(unknown)}; choose from {list(tournament.CANDIDATES)}")
+        *result, _ = tournament.run(args.data, args.cache_dir or feature_cache.CACHE_DIR,
+                                    args.candidates, args.workers)
+
+    cascade_model = None
+    if not args.no_cascade:
+        import cascade
+        import feature_cache
+        from predict import THRESHOLD
+        print("🪜 Fitting the cascade's numeric first stage...")
+        if args.streaming:
+            # A bounded sample of the streamed rows, on the streaming model's own hash split
+            import streaming_train
+            urls, labels, split = streaming_train.cascade_sample(args.data, args.cache_dir or "training_cache",
+                                                                 args.chunksize, cascade.SAMPLE_ROWS)
+            cascade_model, report = cascade.fit(urls, labels, result[0], result[1], THRESHOLD, split=split)
+        else:
+            urls, labels = feature_cache.load_dataset(args.data)
+            weights, groups = feature_cache.load_weights(args.data)
+            cascade_model, report = cascade.fit(urls, labels, result[0], result[1], THRESHOLD,
+                                                weights=weights, groups=groups)
+        cascade.print_fit(report)
+    save_artifacts(*result, cascade=cascade_model)
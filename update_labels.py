@@ -1,27 +1,28 @@
-import pandas as pd
-
-# Load the old dataset (already labeled)
-old_df = pd.read_csv("dataset.csv")
-
-# Load the new dataset (7000+ URLs)
-new_df = pd.read_csv("new_dataset.csv")
-
-# Convert "type" to "label"
-# - 1 = malicious (phishing, malware, defacement, etc.)
-# - 0 = safe (benign)
-malicious_types = ["phishing", "malware", "defacement"]
-new_df["label"] = new_df["type"].apply(lambda x: 1 if x in malicious_types else 0)
-
-# Drop the "type" column (we only need "url" and "label")
-new_df = new_df.drop(columns=["type"])
-
-# Merge new data with old dataset
-updated_df = pd.concat([old_df, new_df], ignore_index=True)
-
-# Remove duplicates (if any)
-updated_df = updated_df.drop_duplicates(subset="url", keep="last")
-
-# Save the updated dataset
-updated_df.to_csv("dataset.csv", index=False)
-
-print("Dataset updated successfully! Total URLs:", len(updated_df))
+import argparse
+import os
+
+from label_store import DB_PATH, LabelStore
+
+parser = argparse.ArgumentParser(description="Merge a labeled URL feed into the label store.")
+parser.add_argument("feed", nargs="?", default="new_dataset.csv", help="Feed CSV with url and type (or label) columns")
+parser.add_argument("--db", default=DB_PATH, help="Label store database")
+parser.add_argument("--export", metavar="CSV", help="Also write the merged snapshot to this CSV (e.g. dataset.csv)")
+args = parser.parse_args()
+
+store = LabelStore(args.db)
+
+# Seed an empty store from the existing dataset.csv. Its labels count as
+# older than any feed, so feed labels win conflicts as they always have.
+if len(store) == 0 and os.path.exists("dataset.csv"):
+    added, _ = store.ingest_csv("dataset.csv", observed_at=0)
+    print(f"📥 Seeded label store from dataset.csv: {added:,} URLs")
+
+# Merge the new feed: only new URLs and changed labels are written.
+# "type" is mapped to label: 1 = malicious (phishing, malware, defacement), 0 = safe
+added, relabeled = store.ingest_csv(args.feed)
+print(f"✅ Dataset updated successfully! New URLs: {added:,}, relabeled: {relabeled:,}, total URLs: {len(store):,}")
+
+if args.export:
+    version = store.export_csv(args.export)
+    print(f"💾 Snapshot {version} exported to {args.export}")
+store.close()
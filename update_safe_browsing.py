@@ -0,0 +1,178 @@
+"""Keep the local Safe Browsing lists in SAFE_BROWSING_DB up to date.
+
+Run it as its own process next to the web workers, which only read the
+store:
+
+    python update_safe_browsing.py --loop
+
+Each round sends the stored client states to ``threatListUpdates:fetch``
+and applies the full or partial updates that come back. Partial updates
+remove by index and then merge the additions. The SHA-256 checksum is then
+verified, and a mismatch resets that list's state so the next round
+fetches it in full. Offline, the store can be filled from a saved API
+response (--fixture) or from a list of "THREAT_TYPE expression" lines
+(--expressions).
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+import numpy as np
+
+import local_safe_browsing as sb
+from upstream import UPSTREAMS
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Wait between rounds when the API does not ask for a longer one
+UPDATE_INTERVAL = float(os.getenv("SAFE_BROWSING_UPDATE_INTERVAL", 30 * 60))
+
+
+def remove(prefixes, long, indices):
+    """Drop ``indices`` from the keys and shift the positions of the long prefixes after them."""
+    indices = np.unique(np.asarray(indices, dtype=np.int64))
+    removed = set(indices.tolist())
+    return (np.delete(prefixes, indices),
+            {int(p - np.searchsorted(indices, p)): full for p, full in long.items() if p not in removed})
+
+
+def merge(prefixes, long, additions):
+    """Keys and long prefixes of ``prefixes`` plus ``additions`` (``prefixes_from_raw`` pairs), in
+    lexicographic order of the full prefixes: by 4-byte key, a 4-byte prefix first, then longer ones."""
+    keys = np.concatenate([prefixes] + [added for added, _ in additions])
+    full = dict(long)
+    offset = len(prefixes)
+    for added, raw in additions:
+        if raw is not None:
+            full.update((offset + i, prefix) for i, prefix in enumerate(raw))
+        offset += len(added)
+    tiebreak = np.zeros(len(keys), dtype=np.int64)
+    for rank, position in enumerate(sorted(full, key=full.get), start=1):
+        tiebreak[position] = rank
+    order = np.lexsort((tiebreak, keys))
+    new_position = np.empty(len(order), dtype=np.int64)
+    new_position[order] = np.arange(len(order))
+    return keys[order], {int(new_position[p]): prefix for p, prefix in full.items()}
+
+
+def apply_update(root, response):
+    """Apply a ``threatListUpdates:fetch`` response to the store in ``root``.
+
+    Returns ``{list name: prefix count}`` for the lists that verified. A
+    list that fails verification keeps its old arrays but is marked
+    unverified, so the store is not fresh until a full update repairs it.
+    """
+    state = sb.read_state(root)
+    arrays, applied = {}, {}
+    for update in response.get("listUpdateResponses", []):
+        name = sb.list_name(update["threatType"], update["platformType"], update["threatEntryType"])
+        entry = state["lists"].get(name, {})
+        if update.get("responseType") == "FULL_UPDATE" or not entry.get("file"):
+            prefixes, long = np.empty(0, dtype=np.uint32), {}
+        else:
+            prefixes, long = np.array(sb.load_prefixes(root, entry, mmap_mode=None)), sb.load_long(root, entry)
+
+        for removal in update.get("removals", []):
+            prefixes, long = remove(prefixes, long, removal["rawIndices"]["indices"])
+        additions = [sb.prefixes_from_raw(base64.b64decode(a["rawHashes"]["rawHashes"]), a["rawHashes"]["prefixSize"])
+                     for a in update.get("additions", [])]
+        prefixes, long = merge(prefixes, long, additions)
+
+        expected = update.get("checksum", {}).get("sha256")
+        if expected and sb.checksum(prefixes, long) != expected:
+            print(f"⚠ {name}: checksum mismatch, requesting a full update next round")
+            state["lists"].setdefault(name, {}).update(state="", updated=0)
+            continue
+        state["lists"].setdefault(name, {})["state"] = update.get("newClientState", "")
+        arrays[name] = (prefixes, long)
+        applied[name] = len(prefixes)
+
+    sb.write_lists(root, state, arrays)
+    return applied
+
+
+def fetch_request(root):
+    state = sb.read_state(root)
+    return {
+        "client": sb.CLIENT,
+        "listUpdateRequests": [
+            {
+                "threatType": threat_type,
+                "platformType": platform_type,
+                "threatEntryType": entry_type,
+                "state": state["lists"].get(sb.list_name(threat_type, platform_type, entry_type), {}).get("state", ""),
+                "constraints": {"supportedCompressions": ["RAW"]},
+            }
+            for threat_type, platform_type, entry_type in sb.THREAT_LISTS
+        ],
+    }
+
+
+def fixture_response(listed):
+    """FULL_UPDATE response listing ``{threat_type: [expression, ...]}`` on ANY_PLATFORM/URL."""
+    updates = []
+    for threat_type, expressions in listed.items():
+        prefixes = np.unique(sb.prefix_keys([sb.full_hash(e) for e in expressions]))
+        updates.append({
+            "threatType": threat_type,
+            "platformType": "ANY_PLATFORM",
+            "threatEntryType": "URL",
+            "responseType": "FULL_UPDATE",
+            "additions": [{"compressionType": "RAW", "rawHashes": {
+                "prefixSize": sb.PREFIX_SIZE,
+                "rawHashes": base64.b64encode(prefixes.astype(">u4").tobytes()).decode(),
+            }}],
+            "newClientState": base64.b64encode(f"fixture-{threat_type}".encode()).decode(),
+            "checksum": {"sha256": sb.checksum(prefixes)},
+        })
+    return {"listUpdateResponses": updates, "minimumWaitDuration": f"{UPDATE_INTERVAL}s"}
+
+
+def read_expressions(path):
+    listed = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                threat_type, expression = line.split(None, 1)
+                listed.setdefault(threat_type, []).append(expression.strip())
+    return listed
+
+
+def update_once(root):
+    """Fetch and apply one round of updates. Returns seconds to wait before the next."""
+    response = UPSTREAMS["google_safe_browsing"].post(f"{sb.UPDATE_URL}?key={GOOGLE_API_KEY}",
+                                                      json=fetch_request(root))
+    response.raise_for_status()
+    body = response.json()
+    applied = apply_update(root, body)
+    print("✅ Safe Browsing lists updated: " + ", ".join(f"{n} {c:,}" for n, c in applied.items()))
+    return max(float(body.get("minimumWaitDuration", "0s").rstrip("s")), UPDATE_INTERVAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the local Safe Browsing hash-prefix lists.")
+    parser.add_argument("--db", default=sb.DB_DIR or "safe_browsing_db", help="Store directory (SAFE_BROWSING_DB)")
+    parser.add_argument("--fixture", metavar="JSON", help="Apply a saved threatListUpdates:fetch response")
+    parser.add_argument("--expressions", metavar="TXT", help="Load 'THREAT_TYPE expression' lines as a full update")
+    parser.add_argument("--loop", action="store_true", help="Keep updating at the interval the API asks for")
+    args = parser.parse_args()
+
+    if args.fixture or args.expressions:
+        if args.fixture:
+            with open(args.fixture) as f:
+                response = json.load(f)
+        else:
+            response = fixture_response(read_expressions(args.expressions))
+        applied = apply_update(args.db, response)
+        print(f"📥 Loaded fixture into {args.db}: " + ", ".join(f"{n} {c:,}" for n, c in applied.items()))
+    elif args.loop:
+        while True:
+            try:
+                wait = update_once(args.db)
+            except Exception as e:
+                print(f"❌ Safe Browsing update failed: {e}")
+                wait = 60
+            time.sleep(wait)
+    else:
+        update_once(args.db)
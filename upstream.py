@@ -0,0 +1,259 @@
+"""Shared HTTP client layer for the reputation upstreams.
+
+Every provider call goes through an ``Upstream``, which keeps:
+
+- a pooled keep-alive session, so repeated lookups reuse TCP+TLS connections
+- connect and read timeouts, so a hung upstream cannot hold a worker forever
+- bounded retries with jittered exponential backoff, for connection errors,
+  timeouts and 429/5xx answers
+- a circuit breaker: after BREAKER_FAILURES failed calls in a row the
+  provider is skipped for BREAKER_RESET seconds, then one trial call
+  decides whether it is healthy again
+- a latency histogram of every attempt, served by /upstream/stats
+
+``request`` is for the sync app (requests) and ``arequest`` for the asyncio
+one (aiohttp); both share the same breaker, histogram and retry policy.
+"""
+import asyncio
+import bisect
+import os
+import random
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10.0))
+# Text generation is much slower than a reputation lookup
+GENAI_READ_TIMEOUT = float(os.getenv("GENAI_READ_TIMEOUT", 30.0))
+
+# Retries after the first attempt; backoff before retry n is uniform in [0, min(cap, base * 2**n)]
+MAX_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF", 0.2))
+BACKOFF_CAP = float(os.getenv("UPSTREAM_BACKOFF_CAP", 2.0))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", 30.0))
+
+# Open connections kept per upstream host
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 100))
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is unbounded)
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class UpstreamError(Exception):
+    """The upstream could not be reached, even after retries."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The provider's circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+                # Let exactly one trial call through
+                self.state = "half_open"
+                return
+            if self.state != "closed":
+                self.rejected += 1
+                raise CircuitOpenError("circuit open")
+
+    def record(self, success):
+        with self._lock:
+            if success:
+                self.state = "closed"
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures,
+                    "rejected": self.rejected}
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every attempt."""
+
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        index = bisect.bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.total_ms += ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile ``q`` (None before any observation)."""
+        with self._lock:
+            counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets_ms + (float("inf"),), counts):
+            seen += count
+            if seen >= q * total:
+                return bound
+
+    def stats(self):
+        with self._lock:
+            counts, total_ms = list(self.counts), self.total_ms
+        labels = [str(bound) for bound in self.buckets_ms] + ["+Inf"]
+        return {
+            "count": sum(counts),
+            "sum_ms": round(total_ms, 3),
+            "buckets_ms": dict(zip(labels, counts)),
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+        }
+
+
+class Upstream:
+    """One provider's pooled session, timeouts, retry policy, breaker and histogram."""
+
+    def __init__(self, name, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=MAX_RETRIES,
+                 backoff=BACKOFF_BASE, backoff_cap=BACKOFF_CAP, breaker=None, pool_size=POOL_SIZE):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.outcomes = {"ok": 0, "retried": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry ``attempt`` (0-based), honouring a short Retry-After."""
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_cap)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt))
+
+    def _count(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def _finish(self, success):
+        self.breaker.record(success)
+        self._count("ok" if success else "failed")
+
+    def request(self, method, url, **kwargs):
+        """``requests`` call with retries. Returns the last response (possibly a 5xx)
+        or raises UpstreamError if no response arrived at all."""
+        self.breaker.acquire()
+        kwargs.setdefault("timeout", self.timeout)
+        success = False
+        try:
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                try:
+                    response, error = self.session.request(method, url, **kwargs), None
+                except requests.RequestException as e:
+                    response, error = None, e
+                self.latency.observe(time.perf_counter() - started)
+
+                if response is not None and response.status_code not in RETRY_STATUSES:
+                    success = True
+                    return response
+                if attempt == self.retries:
+                    break
+                self._count("retried")
+                retry_after = response.headers.get("Retry-After") if response is not None else None
+                time.sleep(self.backoff_delay(attempt, retry_after))
+
+            if response is not None:
+                return response
+            raise UpstreamError(f"{self.name}: {error}") from error
+        finally:
+            self._finish(success)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    async def arequest(self, session, method, url, **kwargs):
+        """The same policy on an aiohttp ``session``. The body is read before
+        returning, so ``await response.json()`` works after the connection is released."""
+        self.breaker.acquire()
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]))
+        success = False
+        try:
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                try:
+                    async with session.request(method, url, **kwargs) as response:
+                        await response.read()
+                    error = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    response, error = None, e
+                self.latency.observe(time.perf_counter() - started)
+
+                if response is not None and response.status not in RETRY_STATUSES:
+                    success = True
+                    return response
+                if attempt == self.retries:
+                    break
+                self._count("retried")
+                retry_after = response.headers.get("Retry-After") if response is not None else None
+                await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+
+            if response is not None:
+                return response
+            raise UpstreamError(f"{self.name}: {error!r}") from error
+        finally:
+            self._finish(success)
+
+    def stats(self):
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        return {"breaker": self.breaker.stats(), "outcomes": outcomes, "latency": self.latency.stats()}
+
+
+UPSTREAMS = {
+    "google_safe_browsing": Upstream("google_safe_browsing"),
+    # vt_queue reschedules a failed step itself, inside its rate limit
+    "virustotal": Upstream("virustotal", retries=0),
+    "huggingface": Upstream("huggingface", read_timeout=GENAI_READ_TIMEOUT),
+}
+
+
+def stats():
+    return {name: upstream.stats() for name, upstream in UPSTREAMS.items()}
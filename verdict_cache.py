@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+# Seconds each layer of a verdict stays fresh. External reputations change
+# faster than the model's opinion of a URL string, so they expire sooner.
+DEFAULT_TTLS = {
+    "ml": float(os.getenv("VERDICT_CACHE_TTL_ML", 24 * 3600)),
+    "gsb": float(os.getenv("VERDICT_CACHE_TTL_GSB", 30 * 60)),
+    "vt": float(os.getenv("VERDICT_CACHE_TTL_VT", 6 * 3600)),
+    "genai": float(os.getenv("VERDICT_CACHE_TTL_GENAI", 7 * 24 * 3600)),
+}
+DEFAULT_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_SIZE", 100_000))
+# Seconds between deletions of expired rows from the shared SQLite store
+PRUNE_INTERVAL = float(os.getenv("VERDICT_CACHE_PRUNE_INTERVAL", 10 * 60))
+
+# Layers keyed on the exact URL string. The model scores the raw string,
+# and "HTTP://Example.com" and "http://example.com/" can score differently,
+# so a normalized key would hand one spelling the other's score.
+EXACT_KEY_LAYERS = ("ml",)
+
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+
+def normalize_url(url):
+    """Cache key for ``url``: lowercase scheme and host, no default port or fragment.
+
+    The path, query and userinfo are kept as-is since they carry most of
+    the phishing signal.
+    """
+    url = url.strip()
+    try:
+        scheme, netloc, path, query, _ = urlsplit(url)
+    except ValueError:
+        return url
+    if not netloc:
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    scheme = scheme.lower()
+    userinfo, _, host = netloc.rpartition("@")
+    host = host.lower()
+    default_port = _DEFAULT_PORTS.get(scheme)
+    if default_port and host.endswith(default_port):
+        host = host[:-len(default_port)]
+    host = host.rstrip(".")
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    return urlunsplit((scheme, netloc, path or "/", query, ""))
+
+
+class SqliteBackend:
+    """Shared second-level store, so gunicorn workers on one host share hits.
+
+    Expired rows are deleted at startup and then by the first ``set`` after
+    each ``prune_interval``, so long-running workers keep the file bounded.
+    """
+
+    def __init__(self, path, prune_interval=PRUNE_INTERVAL):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "layer TEXT NOT NULL, key TEXT NOT NULL, expires REAL NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (layer, key))"
+            )
+            self.prune(time.time())
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, layer, key, now):
+        row = self._connect().execute(
+            "SELECT expires, value FROM verdicts WHERE layer = ? AND key = ? AND expires > ?",
+            (layer, key, now),
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, layer, key, expires, value, now=None):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO verdicts (layer, key, expires, value) VALUES (?, ?, ?, ?)",
+            (layer, key, expires, json.dumps(value)),
+        )
+        now = time.time() if now is None else now
+        if now - self._pruned_at >= self.prune_interval:
+            self.prune(now)
+
+    def prune(self, now):
+        self._pruned_at = now
+        self._connect().execute("DELETE FROM verdicts WHERE expires <= ?", (now,))
+
+
+class VerdictCache:
+    """Bounded LRU cache of per-layer verdicts with a TTL for each layer.
+
+    Layers are independent: a URL can have a fresh ML score while its
+    VirusTotal verdict has expired. ``None`` is never stored, so ``get``
+    returning ``None`` always means a miss.
+
+    ``namespaces`` maps a layer to a prefix for its keys. The ml layer is
+    namespaced by the model bundle version, so scores from a previous
+    bundle (still in the shared backend after a rollout) are never served.
+    """
+
+    def __init__(self, ttls=None, max_entries=DEFAULT_MAX_ENTRIES, backend=None, clock=time.time, namespaces=None):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.namespaces = dict(namespaces or {})
+        self.max_entries = max_entries
+        self.backend = backend
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {layer: 0 for layer in self.ttls}
+        self.misses = {layer: 0 for layer in self.ttls}
+        self.backend_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _key(self, layer, url):
+        namespace = self.namespaces.get(layer)
+        key = url if layer in EXACT_KEY_LAYERS else normalize_url(url)
+        return f"{namespace}|{key}" if namespace else key
+
+    def get(self, layer, url):
+        key = self._key(layer, url)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get((layer, key))
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end((layer, key))
+                    self.hits[layer] += 1
+                    return value
+                del self._entries[(layer, key)]
+                self.expirations += 1
+
+        if self.backend is not None:
+            try:
+                stored = self.backend.get(layer, key, now)
+            except sqlite3.Error:
+                stored = None
+            if stored is not None:
+                with self._lock:
+                    self._put((layer, key), stored)
+                    self.hits[layer] += 1
+                    self.backend_hits += 1
+                return stored[1]
+
+        with self._lock:
+            self.misses[layer] += 1
+        return None
+
+    def set(self, layer, url, value):
+        if value is None:
+            return
+        key = self._key(layer, url)
+        now = self.clock()
+        expires = now + self.ttls[layer]
+        with self._lock:
+            self._put((layer, key), (expires, value))
+        if self.backend is not None:
+            try:
+                self.backend.set(layer, key, expires, value, now)
+            except sqlite3.Error:
+                pass
+
+    def _put(self, cache_key, entry):
+        self._entries[cache_key] = entry
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "backend_hits": self.backend_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def from_env(namespaces=None):
+    """Build the cache configured by the environment (VERDICT_CACHE_DB enables the shared backend)."""
+    db_path = os.getenv("VERDICT_CACHE_DB")
+    return VerdictCache(backend=SqliteBackend(db_path) if db_path else None, namespaces=namespaces)
@@ -0,0 +1,258 @@
+"""Background VirusTotal lookups, so /analyze never waits on VirusTotal.
+
+Scanning a URL on VirusTotal is asynchronous: the submission returns an
+analysis id, and the verdict appears tens of seconds later. Instead of
+submitting and polling inside the request, /analyze asks the queue for the
+URL's verdict. A known verdict is returned at once. Otherwise the URL is
+queued and reported as "pending", and a worker thread takes each job
+through these steps:
+
+1. fetch the existing URL report (``GET /urls/{id}``), which answers most
+   well-known URLs with a single call
+2. if VirusTotal has never seen the URL, submit it (``POST /urls``)
+3. poll ``GET /analyses/{id}`` every VT_POLL_INTERVAL seconds until it is
+   completed
+
+Finished verdicts go into the verdict cache's "vt" layer, where later
+requests and ``GET /analyze/virustotal`` find them. Calls are spaced to
+VT_RATE_PER_MIN (4/min is the public API quota), and a 429 pauses the queue.
+With several gunicorn workers each one runs its own queue, so divide the
+quota between them. Set VERDICT_CACHE_DB so they share finished verdicts.
+"""
+import base64
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from providers import VT_API_KEY, VT_API_URL
+from upstream import UPSTREAMS, UpstreamError
+
+# Calls per minute at most; 0 means no limit (a premium quota)
+VT_RATE_PER_MIN = float(os.getenv("VT_RATE_PER_MIN", 4))
+VT_POLL_INTERVAL = float(os.getenv("VT_POLL_INTERVAL", 30))
+VT_MAX_POLLS = int(os.getenv("VT_MAX_POLLS", 10))
+# Attempts at a step that errors before the job is given up
+VT_MAX_ERRORS = int(os.getenv("VT_MAX_ERRORS", 3))
+# Jobs queued or in flight at once; further URLs are reported "queue_full"
+VT_QUEUE_SIZE = int(os.getenv("VT_QUEUE_SIZE", 10_000))
+# Seconds before a failed URL may be queued again
+VT_RETRY_FAILED_AFTER = float(os.getenv("VT_RETRY_FAILED_AFTER", 600))
+
+
+def url_id(url):
+    """VirusTotal's identifier for a URL: unpadded URL-safe base64."""
+    return base64.urlsafe_b64encode(url.encode()).decode().rstrip("=")
+
+
+class Job:
+    __slots__ = ("url", "step", "analysis_id", "polls", "errors", "failed_at", "error")
+
+    def __init__(self, url):
+        self.url = url
+        self.step = "report"
+        self.analysis_id = None
+        self.polls = 0
+        self.errors = 0
+        self.failed_at = None
+        self.error = None
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited for {retry_after}s")
+        self.retry_after = retry_after
+
+
+class VirusTotalQueue:
+    """Per-process job queue storing finished verdicts in ``cache`` under ``layer``."""
+
+    def __init__(self, cache, layer="vt", rate_per_min=VT_RATE_PER_MIN, poll_interval=VT_POLL_INTERVAL,
+                 max_polls=VT_MAX_POLLS, max_errors=VT_MAX_ERRORS, max_jobs=VT_QUEUE_SIZE,
+                 retry_failed_after=VT_RETRY_FAILED_AFTER, api_url=VT_API_URL, api_key=VT_API_KEY):
+        self.cache = cache
+        self.layer = layer
+        if rate_per_min < 0:
+            raise ValueError(f"rate_per_min must be 0 (no limit) or positive, not {rate_per_min}")
+        self.interval = 60.0 / rate_per_min if rate_per_min else 0.0
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+        self.max_errors = max_errors
+        self.max_jobs = max_jobs
+        self.retry_failed_after = retry_failed_after
+        self.api_url = api_url
+        self.headers = {"x-apikey": api_key}
+        self.upstream = UPSTREAMS["virustotal"]
+
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._next_call = 0.0
+        self._worker = None
+        self._worker_pid = None
+        self._stopped = False
+        self.completed = 0
+        self.failed = 0
+        self.calls = 0
+
+    # -- request side -----------------------------------------------------
+
+    def status(self, url, enqueue=True):
+        """``(status, verdict)`` for ``url``; status is "completed", "pending",
+        "failed", "queue_full" or "unknown" (not cached and ``enqueue`` is off)."""
+        cached = self.cache.get(self.layer, url)
+        if cached is not None:
+            return "completed", cached
+        with self._cond:
+            job = self._jobs.get(url)
+            if job is not None and job.failed_at is not None:
+                if time.monotonic() - job.failed_at < self.retry_failed_after:
+                    return "failed", None
+                del self._jobs[url]
+                job = None
+            if job is not None:
+                return "pending", None
+            if not enqueue:
+                return "unknown", None
+            if len(self._jobs) >= self.max_jobs:
+                self._prune_failed()
+            if len(self._jobs) >= self.max_jobs:
+                return "queue_full", None
+            self._jobs[url] = Job(url)
+            self._schedule(url, time.monotonic())
+            self._ensure_worker()
+        return "pending", None
+
+    def report(self, url, enqueue=True):
+        """Status payload served by ``GET /analyze/virustotal``."""
+        status, verdict = self.status(url, enqueue)
+        return {"url": url, "virustotal_status": status, "virustotal": verdict}
+
+    def stats(self):
+        with self._cond:
+            return {
+                "jobs": len(self._jobs),
+                "due": len(self._heap),
+                "completed": self.completed,
+                "failed": self.failed,
+                "calls": self.calls,
+            }
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    # -- worker side ------------------------------------------------------
+
+    def _prune_failed(self):
+        now = time.monotonic()
+        for url in [url for url, job in self._jobs.items()
+                    if job.failed_at is not None and now - job.failed_at >= self.retry_failed_after]:
+            del self._jobs[url]
+
+    def _schedule(self, url, due):
+        heapq.heappush(self._heap, (due, next(self._seq), url))
+        self._cond.notify()
+
+    def _ensure_worker(self):
+        # Threads do not survive gunicorn's fork, so start one per worker process on first use
+        if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+            self._worker_pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="vt-queue", daemon=True)
+            self._worker.start()
+
+    def _next_job(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    job = self._jobs.get(heapq.heappop(self._heap)[2])
+                    if job is not None and job.failed_at is None:
+                        return job
+                    continue
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            delay = self._next_call - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_call = max(time.monotonic(), self._next_call) + self.interval
+            try:
+                due = self._advance(job)
+            except RateLimited as e:
+                # Quota used up: nothing goes out until it refills
+                self._next_call = time.monotonic() + e.retry_after
+                due = self._next_call
+            except Exception as e:
+                job.errors += 1
+                job.error = str(e)
+                backoff = (self.interval or 1.0) * 2 ** job.errors
+                due = None if job.errors >= self.max_errors else time.monotonic() + backoff
+            with self._cond:
+                if due is None:
+                    self._finish_failed(job)
+                elif due is not False:
+                    self._schedule(job.url, due)
+
+    def _call(self, method, path, **kwargs):
+        self.calls += 1
+        response = self.upstream.request(method, f"{self.api_url}{path}", headers=self.headers, **kwargs)
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("Retry-After", 60))
+            except ValueError:
+                retry_after = 60.0
+            raise RateLimited(retry_after)
+        return response
+
+    def _advance(self, job):
+        """Run the job's next step; returns when to run it again, False once finished, None to give up."""
+        if job.step == "report":
+            response = self._call("GET", f"/urls/{url_id(job.url)}")
+            if response.status_code == 200:
+                stats = response.json()["data"]["attributes"].get("last_analysis_stats")
+                if stats:
+                    return self._complete(job, stats)
+            elif response.status_code != 404:
+                raise UpstreamError(f"URL report returned {response.status_code}")
+            job.step = "submit"
+            return time.monotonic()
+
+        if job.step == "submit":
+            response = self._call("POST", "/urls", data={"url": job.url})
+            if response.status_code != 200:
+                raise UpstreamError(f"URL submission returned {response.status_code}")
+            job.analysis_id = response.json()["data"]["id"]
+            job.step = "poll"
+            return time.monotonic() + self.poll_interval
+
+        response = self._call("GET", f"/analyses/{job.analysis_id}")
+        if response.status_code != 200:
+            raise UpstreamError(f"analysis returned {response.status_code}")
+        attributes = response.json()["data"]["attributes"]
+        if attributes.get("status") == "completed":
+            return self._complete(job, attributes.get("stats", {}))
+        job.polls += 1
+        if job.polls >= self.max_polls:
+            job.error = f"analysis not completed after {job.polls} polls"
+            return None
+        return time.monotonic() + self.poll_interval
+
+    def _complete(self, job, stats):
+        self.cache.set(self.layer, job.url, stats.get("malicious", 0) > 0)
+        with self._cond:
+            self._jobs.pop(job.url, None)
+            self.completed += 1
+        return False
+
+    def _finish_failed(self, job):
+        job.failed_at = time.monotonic()
+        self.failed += 1